@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AirportConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'airport'
+
+    def ready(self):
+        # Connect cache invalidation signals
+        from . import signals  # noqa: F401
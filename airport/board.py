@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Flight
+
+
+AIRPORT_BOARD_CACHE_KEY = "airport:board:{airport_id}"
+# Board is dropped on every flight save, timeout is only a safety net
+# (flight moved to another airport, departed flights falling off)
+BOARD_CACHE_TIMEOUT = 60
+BOARD_MAX_FLIGHTS = 50
+# Recently departed/arrived flights stay on the board for a while
+BOARD_PAST_WINDOW = timedelta(hours=1)
+
+
+def _board_rows(queryset, time_field, other_airport):
+    """
+    Flat rows for one side of the board, one query
+    """
+    since = timezone.now() - BOARD_PAST_WINDOW
+    rows = list(
+        queryset
+        .filter(**{f"{time_field}__gte": since})
+        .order_by(time_field, 'id')
+        .values(
+            'id',
+            'flight_number',
+            'status',
+            'departure_time',
+            'arrival_time',
+            airport=F(f"{other_airport}__iata_code"),
+            city=F(f"{other_airport}__city__name"),
+            airline=F('airplane__airline__name'),
+            aircraft=F('airplane__name'),
+        )[:BOARD_MAX_FLIGHTS]
+    )
+    for row in rows:
+        row['status_display'] = str(Flight.Status(row['status']).label)
+    return rows
+
+
+def build_airport_board(airport):
+    return {
+        'airport': airport.id,
+        'iata_code': airport.iata_code,
+        'generated_at': timezone.now(),
+        'departures': _board_rows(
+            airport.departing_flights.all(), 'departure_time', 'arrival_airport'
+        ),
+        'arrivals': _board_rows(
+            airport.arriving_flights.all(), 'arrival_time', 'departure_airport'
+        ),
+    }
+
+
+def get_cached_board(airport_id):
+    return cache.get(AIRPORT_BOARD_CACHE_KEY.format(airport_id=airport_id))
+
+
+def cache_board(board):
+    cache.set(
+        AIRPORT_BOARD_CACHE_KEY.format(airport_id=board['airport']),
+        board,
+        BOARD_CACHE_TIMEOUT
+    )
+
+
+def invalidate_airport_boards(*airport_ids):
+    cache.delete_many([
+        AIRPORT_BOARD_CACHE_KEY.format(airport_id=airport_id)
+        for airport_id in airport_ids
+    ])
@@ -0,0 +1,298 @@
+import bisect
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Flight
+
+
+logger = logging.getLogger("airport")
+
+# Shared between workers: every flight change bumps the version and
+# stores the changed flight id under that version
+CONNECTIONS_VERSION_KEY = "connections:version"
+CONNECTIONS_CHANGE_KEY = "connections:change:{version}"
+CHANGE_LOG_TIMEOUT = 60 * 60
+
+# Too many pending changes -> full rebuild is cheaper than replaying
+MAX_PENDING_CHANGES = 1000
+# Periodic full rebuild drops departed flights from memory
+FULL_REBUILD_INTERVAL = 6 * 60 * 60
+# How many onward flights are tried on every route of a partial itinerary
+MAX_ONWARD_FLIGHTS = 5
+
+INDEXED_STATUSES = (
+    Flight.Status.SCHEDULED,
+    Flight.Status.DELAYED,
+    Flight.Status.BOARDING,
+)
+
+
+class ConnectionIndex:
+    """
+    Time-expanded flight graph kept in memory of every worker.
+
+    Leg is a tuple (departure_ts, arrival_ts, flight_id, from_id, to_id),
+    so lists of legs sort by departure time.
+    - departures: airport id -> legs sorted by departure
+    - routes: (from id, to id) -> legs sorted by departure
+    - next_airports / previous_airports: airport id -> airports with a route
+      from / to it (routes emptied by changes stay until the next rebuild)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._built_at = 0
+        self._legs = {}
+        self._departures = defaultdict(list)
+        self._routes = defaultdict(list)
+        self._next_airports = defaultdict(set)
+        self._previous_airports = defaultdict(set)
+
+    # --- Change tracking ---
+    @staticmethod
+    def record_change(flight_id):
+        """
+        Tell all workers that a flight was created, updated or deleted
+        """
+        cache.add(CONNECTIONS_VERSION_KEY, 0, None)
+        version = cache.incr(CONNECTIONS_VERSION_KEY)
+        cache.set(
+            CONNECTIONS_CHANGE_KEY.format(version=version),
+            flight_id,
+            CHANGE_LOG_TIMEOUT
+        )
+
+    @staticmethod
+    def record_changes(flight_ids):
+        """
+        Same for many flights at once (bulk writes). More than
+        MAX_PENDING_CHANGES of them make workers rebuild instead
+        """
+        flight_ids = list(flight_ids)
+        if not flight_ids:
+            return
+        cache.add(CONNECTIONS_VERSION_KEY, 0, None)
+        version = cache.incr(CONNECTIONS_VERSION_KEY, len(flight_ids))
+        if len(flight_ids) <= MAX_PENDING_CHANGES:
+            cache.set_many(
+                {
+                    CONNECTIONS_CHANGE_KEY.format(version=version - offset): flight_id
+                    for offset, flight_id in enumerate(flight_ids)
+                },
+                CHANGE_LOG_TIMEOUT
+            )
+
+    def ensure_fresh(self):
+        with self._lock:
+            current = cache.get(CONNECTIONS_VERSION_KEY, 0)
+
+            if (
+                self._version is None
+                or current < self._version
+                or current - self._version > MAX_PENDING_CHANGES
+                or time.time() - self._built_at > FULL_REBUILD_INTERVAL
+            ):
+                self._rebuild(current)
+                return
+
+            if current == self._version:
+                return
+
+            keys = [
+                CONNECTIONS_CHANGE_KEY.format(version=version)
+                for version in range(self._version + 1, current + 1)
+            ]
+            changes = cache.get_many(keys)
+            if len(changes) != len(keys):
+                # Part of the change log expired
+                self._rebuild(current)
+                return
+
+            self._reload(set(changes.values()))
+            self._version = current
+
+    # --- Building ---
+    @staticmethod
+    def _flight_rows(queryset):
+        return (
+            queryset
+            .filter(status__in=INDEXED_STATUSES)
+            .order_by()
+            .values_list(
+                'departure_time', 'arrival_time', 'id',
+                'departure_airport_id', 'arrival_airport_id'
+            )
+        )
+
+    @staticmethod
+    def _to_leg(row):
+        departure_time, arrival_time, flight_id, from_id, to_id = row
+        return (
+            departure_time.timestamp(),
+            arrival_time.timestamp(),
+            flight_id,
+            from_id,
+            to_id,
+        )
+
+    def _rebuild(self, version):
+        started = time.monotonic()
+        since = timezone.now() - timedelta(days=1)
+        rows = self._flight_rows(Flight.objects.filter(departure_time__gte=since))
+
+        legs = {}
+        departures = defaultdict(list)
+        routes = defaultdict(list)
+        for row in rows.iterator(chunk_size=10000):
+            leg = self._to_leg(row)
+            legs[leg[2]] = leg
+            departures[leg[3]].append(leg)
+            routes[(leg[3], leg[4])].append(leg)
+
+        for bucket in departures.values():
+            bucket.sort()
+        next_airports = defaultdict(set)
+        previous_airports = defaultdict(set)
+        for (from_id, to_id), bucket in routes.items():
+            bucket.sort()
+            next_airports[from_id].add(to_id)
+            previous_airports[to_id].add(from_id)
+
+        self._legs, self._departures, self._routes = legs, departures, routes
+        self._next_airports, self._previous_airports = next_airports, previous_airports
+        self._version = version
+        self._built_at = time.time()
+
+        logger.info(
+            f"Connection index rebuilt: {len(legs)} flights "
+            f"in {(time.monotonic() - started) * 1000:.0f} ms"
+        )
+
+    def _reload(self, flight_ids):
+        for flight_id in flight_ids:
+            self._remove(flight_id)
+
+        rows = self._flight_rows(Flight.objects.filter(id__in=flight_ids))
+        for row in rows:
+            self._add(self._to_leg(row))
+
+    def _add(self, leg):
+        self._legs[leg[2]] = leg
+        bisect.insort(self._departures[leg[3]], leg)
+        bisect.insort(self._routes[(leg[3], leg[4])], leg)
+        self._next_airports[leg[3]].add(leg[4])
+        self._previous_airports[leg[4]].add(leg[3])
+
+    def _remove(self, flight_id):
+        leg = self._legs.pop(flight_id, None)
+        if leg is None:
+            return
+
+        for bucket in (self._departures[leg[3]], self._routes[(leg[3], leg[4])]):
+            position = bisect.bisect_left(bucket, leg)
+            if position < len(bucket) and bucket[position] == leg:
+                del bucket[position]
+
+    # --- Search ---
+    @staticmethod
+    def _window(legs, earliest, latest, limit=None):
+        """
+        Legs departing in [earliest, latest]
+        """
+        if not legs:
+            return []
+
+        start = bisect.bisect_left(legs, (earliest,))
+        end = bisect.bisect_right(legs, (latest, float('inf')))
+        if limit is not None:
+            end = min(end, start + limit)
+        return legs[start:end]
+
+    def search(
+        self,
+        origin_id,
+        destination_id,
+        depart_from,
+        depart_until,
+        max_connections=2,
+        min_connection=45 * 60,
+        max_connection=24 * 60 * 60,
+        limit=20,
+    ):
+        """
+        Itineraries (tuples of legs) from origin to destination,
+        earliest arrival first. Connection times are in seconds.
+        """
+        self.ensure_fresh()
+
+        # _reload() changes the sorted lists in place, do not read them half-updated
+        with self._lock:
+            itineraries = self._search(
+                origin_id, destination_id,
+                depart_from.timestamp(), depart_until.timestamp(),
+                max_connections, min_connection, max_connection,
+            )
+
+        # Earliest arrival, then fewer legs, then shorter trip
+        itineraries.sort(key=lambda legs: (legs[-1][1], len(legs), -legs[0][0]))
+        return itineraries[:limit]
+
+    def _search(
+        self, origin_id, destination_id, earliest, latest,
+        max_connections, min_connection, max_connection,
+    ):
+        routes = self._routes
+        itineraries = []
+        # Second hubs of two-connection itineraries need a route to destination
+        feeders = self._previous_airports.get(destination_id, set()) - {origin_id}
+
+        # Direct flights
+        for leg in self._window(routes.get((origin_id, destination_id)), earliest, latest):
+            itineraries.append((leg,))
+
+        if max_connections >= 1:
+            for first in self._window(self._departures.get(origin_id), earliest, latest):
+                hub = first[4]
+                if hub in (origin_id, destination_id):
+                    continue
+
+                onward_from = first[1] + min_connection
+                onward_until = first[1] + max_connection
+
+                # One connection
+                for second in self._window(
+                    routes.get((hub, destination_id)),
+                    onward_from, onward_until, MAX_ONWARD_FLIGHTS
+                ):
+                    itineraries.append((first, second))
+
+                if max_connections < 2:
+                    continue
+
+                # Two connections: every route from the hub to an airport
+                # with a flight to destination, however busy the hub is
+                for second_hub in self._next_airports.get(hub, set()) & feeders:
+                    for second in self._window(
+                        routes.get((hub, second_hub)),
+                        onward_from, onward_until, MAX_ONWARD_FLIGHTS
+                    ):
+                        for third in self._window(
+                            routes[(second_hub, destination_id)],
+                            second[1] + min_connection,
+                            second[1] + max_connection,
+                            MAX_ONWARD_FLIGHTS
+                        ):
+                            itineraries.append((first, second, third))
+
+        return itineraries
+
+
+# One index per worker process
+flight_graph = ConnectionIndex()
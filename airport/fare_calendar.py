@@ -0,0 +1,100 @@
+import calendar
+from datetime import date, datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db.models import Count, Min, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Flight
+
+
+# Route version is part of the calendar key, bumping it drops all months
+FARE_CALENDAR_VERSION_KEY = "fare-calendar:version:{from_id}:{to_id}"
+FARE_CALENDAR_CACHE_KEY = "fare-calendar:{from_id}:{to_id}:{month}:v{version}"
+FARE_CALENDAR_CACHE_TIMEOUT = 60 * 60
+
+
+def _route_version(from_id, to_id):
+    key = FARE_CALENDAR_VERSION_KEY.format(from_id=from_id, to_id=to_id)
+    cache.add(key, 1, None)
+    return cache.get(key, 1)
+
+
+def invalidate_fare_calendar(*routes):
+    """
+    routes: (departure_airport_id, arrival_airport_id) pairs
+    """
+    for from_id, to_id in set(routes):
+        key = FARE_CALENDAR_VERSION_KEY.format(from_id=from_id, to_id=to_id)
+        cache.add(key, 1, None)
+        cache.incr(key)
+
+
+def invalidate_fare_calendar_for_flights(flight_ids):
+    invalidate_fare_calendar(*Flight.objects.filter(id__in=flight_ids).values_list(
+        'departure_airport_id', 'arrival_airport_id'
+    ))
+
+
+def build_fare_calendar(from_airport, to_airport, month):
+    """
+    Lowest fare and flights with free seats per day, one grouped query
+    """
+    days_in_month = calendar.monthrange(month.year, month.month)[1]
+    start = timezone.make_aware(datetime.combine(month, time.min))
+    end = start + timedelta(days=days_in_month)
+
+    rows = (
+        Flight.objects
+        .with_available_seats()
+        .filter(
+            departure_airport=from_airport,
+            arrival_airport=to_airport,
+            departure_time__gte=start,
+            departure_time__lt=end,
+        )
+        .exclude(status=Flight.Status.CANCELLED)
+        .annotate(day=TruncDate('departure_time'))
+        .order_by()
+        .values('day')
+        .annotate(
+            flights=Count('id'),
+            flights_with_seats=Count('id', filter=Q(available_seats__gt=0)),
+            lowest_price=Min('price', filter=Q(available_seats__gt=0)),
+        )
+    )
+    by_day = {row['day']: row for row in rows}
+
+    days = []
+    for day_number in range(1, days_in_month + 1):
+        day = date(month.year, month.month, day_number)
+        row = by_day.get(day, {})
+        lowest_price = row.get('lowest_price')
+        days.append({
+            'date': day,
+            'lowest_price': str(lowest_price) if lowest_price is not None else None,
+            'flights': row.get('flights', 0),
+            'flights_with_seats': row.get('flights_with_seats', 0),
+        })
+
+    return {
+        'from': from_airport.iata_code,
+        'to': to_airport.iata_code,
+        'month': month.strftime('%Y-%m'),
+        'days': days,
+    }
+
+
+def get_fare_calendar(from_airport, to_airport, month):
+    key = FARE_CALENDAR_CACHE_KEY.format(
+        from_id=from_airport.id,
+        to_id=to_airport.id,
+        month=month.strftime('%Y-%m'),
+        version=_route_version(from_airport.id, to_airport.id),
+    )
+    fare_calendar = cache.get(key)
+    if fare_calendar is None:
+        fare_calendar = build_fare_calendar(from_airport, to_airport, month)
+        cache.set(key, fare_calendar, FARE_CALENDAR_CACHE_TIMEOUT)
+    return fare_calendar
@@ -14,6 +14,25 @@ class FlightFilter(django_filters.FilterSet):
         lookup_expr="icontains"
     )
 
+    # Filter on 'available_seats' annotation (FlightQuerySet.with_available_seats).
+    # SQL only: seat holds live in the cache and are not subtracted here,
+    # so a flight may pass with fewer seats shown than asked for
+    available_seats__gte = django_filters.NumberFilter(
+        field_name="available_seats",
+        lookup_expr="gte",
+        help_text="Unsold seats, seat holds are not counted.",
+    )
+
+    has_seats = django_filters.BooleanFilter(
+        method="filter_has_seats",
+        help_text="Has unsold seats, seat holds are not counted.",
+    )
+
+    def filter_has_seats(self, queryset, name, value):
+        if value:
+            return queryset.filter(available_seats__gt=0)
+        return queryset.filter(available_seats__lte=0)
+
     class Meta:
         model = Flight
         fields = {
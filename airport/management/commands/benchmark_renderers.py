@@ -0,0 +1,87 @@
+import gzip
+import io
+import itertools
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from airport.serializers import FlightSerializer
+from core.renderers import MessagePackParser, MessagePackRenderer, ORJSONParser, ORJSONRenderer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares render/parse time and payload size of the DRF JSON, orjson "
+        "and MessagePack renderers on one page of serialized flights."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--flights", type=int, default=1000, help="Flights on the page")
+        parser.add_argument("--rounds", type=int, default=20, help="Timed renders per renderer")
+
+    def build_page(self, count):
+        """
+        Same data the flight list returns; existing flights are repeated
+        when the database has fewer than requested
+        """
+        from airport.views import FlightViewSet
+
+        flights = list(FlightViewSet.queryset.order_by("departure_time", "id")[:count])
+        if not flights:
+            raise CommandError("No flights in the database, create some first.")
+
+        started = time.perf_counter()
+        rows = FlightSerializer(flights, many=True).data
+        serialize_ms = (time.perf_counter() - started) * 1000
+
+        page = [dict(row) for row in itertools.islice(itertools.cycle(rows), count)]
+        return (
+            {"count": len(page), "next": None, "previous": None, "results": page},
+            len(rows),
+            serialize_ms,
+        )
+
+    @staticmethod
+    def timed(func, rounds):
+        func()  # warm up
+        started = time.perf_counter()
+        for _ in range(rounds):
+            result = func()
+        return (time.perf_counter() - started) * 1000 / rounds, result
+
+    def handle(self, *args, **options):
+        page, db_rows, serialize_ms = self.build_page(options["flights"])
+        rounds = options["rounds"]
+
+        self.stdout.write(
+            f"{page['count']} flights ({db_rows} distinct from the DB, serialized in "
+            f"{serialize_ms:.1f} ms), {rounds} rounds\n"
+        )
+        self.stdout.write(
+            f"{'renderer':<22}{'render ms':>11}{'parse ms':>10}{'bytes':>11}{'gzip bytes':>12}"
+        )
+
+        candidates = (
+            ("DRF JSONRenderer", JSONRenderer(), JSONParser()),
+            ("ORJSONRenderer", ORJSONRenderer(), ORJSONParser()),
+            ("MessagePackRenderer", MessagePackRenderer(), MessagePackParser()),
+        )
+        baseline = None
+        for name, renderer, parser in candidates:
+            # Defaults bind this round's objects, not the loop variables
+            render_ms, payload = self.timed(
+                lambda renderer=renderer: renderer.render(page, renderer.media_type), rounds
+            )
+            parse_ms, _ = self.timed(
+                lambda parser=parser, payload=payload: parser.parse(io.BytesIO(payload)), rounds
+            )
+            baseline = baseline or render_ms
+
+            self.stdout.write(
+                f"{name:<22}{render_ms:>11.2f}{parse_ms:>10.2f}"
+                f"{len(payload):>11}{len(gzip.compress(payload)):>12}"
+                f"   x{baseline / render_ms:.1f}"
+            )
+
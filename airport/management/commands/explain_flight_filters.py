@@ -0,0 +1,97 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from airport.filters import FlightFilter
+from airport.models import City, Flight
+
+
+# Tables that should never be read with a sequential scan on big data
+WATCHED_TABLES = ("airport_flight", "airport_city", "airport_airport")
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs EXPLAIN ANALYZE on the standard FlightFilter combinations "
+        "to check that query plans are index-backed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--departure-city", help="City name for departure_city filter")
+        parser.add_argument("--arrival-city", help="City name for arrival_city filter")
+        parser.add_argument(
+            "--no-analyze",
+            action="store_true",
+            help="Only EXPLAIN, do not execute the queries",
+        )
+        parser.add_argument(
+            "--page-size",
+            type=int,
+            default=10,
+            help="LIMIT applied like the API pagination does",
+        )
+
+    def get_combinations(self, departure_city, arrival_city):
+        now = timezone.now()
+        window = {
+            "departure_time__gte": now.isoformat(),
+            "departure_time__lte": (now + timedelta(days=30)).isoformat(),
+        }
+        return {
+            "departure_city": {"departure_city": departure_city},
+            "arrival_city": {"arrival_city": arrival_city},
+            "route": {"departure_city": departure_city, "arrival_city": arrival_city},
+            "status": {"status": Flight.Status.SCHEDULED},
+            "departure_window": window,
+            "route_in_window": {
+                "departure_city": departure_city,
+                "arrival_city": arrival_city,
+                **window,
+            },
+            "status_in_window": {"status": Flight.Status.SCHEDULED, **window},
+        }
+
+    def handle(self, *args, **options):
+        # Same queryset as the API uses
+        from airport.views import FlightViewSet
+
+        cities = list(City.objects.values_list("name", flat=True)[:2])
+        departure_city = options["departure_city"] or (cities[0] if cities else "Kyiv")
+        arrival_city = options["arrival_city"] or (cities[-1] if cities else "Warsaw")
+
+        combinations = self.get_combinations(departure_city, arrival_city)
+        not_indexed = []
+
+        for name, params in combinations.items():
+            filterset = FlightFilter(data=params, queryset=FlightViewSet.queryset)
+            if not filterset.is_valid():
+                self.stdout.write(self.style.ERROR(f"{name}: invalid filter {filterset.errors}"))
+                continue
+
+            queryset = filterset.qs[:options["page_size"]]
+            plan = queryset.explain(analyze=not options["no_analyze"])
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n=== {name}: {params}"))
+            self.stdout.write(plan)
+
+            seq_scans = [
+                table for table in WATCHED_TABLES
+                if f"Seq Scan on {table}" in plan
+            ]
+            if seq_scans:
+                not_indexed.append(name)
+                self.stdout.write(
+                    self.style.WARNING(f"-> Sequential scan on: {', '.join(seq_scans)}")
+                )
+
+        if not_indexed:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"\nPlans with sequential scans: {', '.join(not_indexed)}. "
+                    "On small tables this is expected, the planner prefers "
+                    "seq scans until indexes become cheaper."
+                )
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS("\nAll plans are index-backed."))
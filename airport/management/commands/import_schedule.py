@@ -0,0 +1,85 @@
+import json
+import sys
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+
+from airport.schedule_import import (
+    IMPORT_BATCH_SIZE, SCHEDULE_FORMATS, guess_format, import_schedule, read_schedule
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates or updates flights (by flight_number) from a CSV or NDJSON "
+        "schedule, loaded through COPY into a staging table and one upsert."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Schedule file, '-' for stdin")
+        parser.add_argument(
+            "--format",
+            choices=SCHEDULE_FORMATS,
+            help="File format (default: from the extension)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help="Rows validated and copied at a time",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Validate and upsert, then roll everything back",
+        )
+        parser.add_argument(
+            "--report",
+            help="Write rejected rows to this file (JSON)",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or guess_format(path)
+        if fmt is None:
+            raise CommandError("Cannot tell the format from the file name, pass --format.")
+
+        try:
+            # stdin belongs to the caller, only a file opened here is closed
+            stream = (
+                nullcontext(sys.stdin) if path == "-"
+                else open(path, encoding="utf-8-sig", newline="")
+            )
+        except OSError as e:
+            raise CommandError(f"Cannot open {path}: {e}") from e
+
+        with stream as schedule:
+            result = import_schedule(
+                read_schedule(schedule, fmt),
+                batch_size=options["batch_size"],
+                dry_run=options["dry_run"],
+            )
+
+        rejected = result["rejected"]
+        for row in rejected[:20]:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"  line {row['line']} ({row['flight_number'] or '-'}): "
+                    f"{' '.join(row['errors'])}"
+                )
+            )
+        if len(rejected) > 20:
+            self.stdout.write(self.style.WARNING(f"  ... and {len(rejected) - 20} more"))
+
+        if options["report"]:
+            with open(options["report"], "w", encoding="utf-8") as report:
+                json.dump(rejected, report, indent=2)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Import {'checked (dry run)' if options['dry_run'] else 'complete'}. "
+                f"{result['total']} rows: {result['created']} created, "
+                f"{result['updated']} updated, {result['unchanged']} unchanged, "
+                f"{len(rejected)} rejected."
+            )
+        )
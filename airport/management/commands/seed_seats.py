@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from airport.models import AirplaneType, Seat
+from airport.signals import seats_changed
 from django.db import transaction
 
 
@@ -40,21 +41,27 @@ class Command(BaseCommand):
                 self.stdout.write(f"Found existing AirplaneType: {type_name}")
 
             # 3. Creating space for this type of aircraft
-            seats_created_for_type = 0
-            for row_num in config["rows"]:
-                for seat_char in config["seats"]:
+            existing = set(
+                plane_type.seats.values_list('row', 'seat')
+            )
+            new_seats = [
+                Seat(
+                    airplane_type=plane_type,
+                    row=row_num,
+                    seat=seat_char,
+                    seat_type=config["default_type"]
+                )
+                for row_num in config["rows"]
+                for seat_char in config["seats"]
+                if (row_num, seat_char) not in existing
+            ]
 
-                    # 4. Used get_or_create for seats
-                    seat, seat_created = Seat.objects.get_or_create(
-                        airplane_type=plane_type,
-                        row=row_num,
-                        seat=seat_char,
-                        defaults={'seat_type': config["default_type"]}
-                    )
+            # 4. One INSERT for all missing seats, bulk_create sends no signals
+            Seat.objects.bulk_create(new_seats)
+            seats_changed(plane_type.id)
 
-                    if seat_created:
-                        seats_created_for_type += 1
-                        total_seats_created += 1
+            seats_created_for_type = len(new_seats)
+            total_seats_created += seats_created_for_type
 
             if seats_created_for_type > 0:
                 self.stdout.write(
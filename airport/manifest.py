@@ -0,0 +1,32 @@
+from booking.models import Ticket
+
+
+# Column name in the manifest -> ORM path it is read from
+MANIFEST_COLUMNS = {
+    'row': 'seat__row',
+    'seat': 'seat__seat',
+    'cabin': 'seat__seat_type',
+    'first_name': 'passenger_first_name',
+    'last_name': 'passenger_last_name',
+    'ticket_status': 'status',
+    'order': 'order_id',
+    'order_status': 'order__status',
+}
+MANIFEST_FIELDS = tuple(MANIFEST_COLUMNS)
+
+
+def get_manifest_rows(flight_id, chunk_size=1000):
+    """
+    Passengers of the flight sorted by seat, one joined query.
+    Tickets come from ticket_manifest_idx (flight + covered columns),
+    seats and orders by primary key
+    """
+    rows = (
+        Ticket.objects
+        .filter(flight_id=flight_id)
+        .exclude(status=Ticket.Status.CANCELLED)
+        .order_by('seat__row', 'seat__seat')
+        .values_list(*MANIFEST_COLUMNS.values())
+        .iterator(chunk_size=chunk_size)
+    )
+    return (dict(zip(MANIFEST_FIELDS, row)) for row in rows)
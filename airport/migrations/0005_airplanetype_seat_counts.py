@@ -0,0 +1,59 @@
+# Generated by Django 5.2.7 on 2026-10-17 04:10
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_existing_seats(apps, schema_editor):
+    AirplaneType = apps.get_model('airport', 'AirplaneType')
+    Seat = apps.get_model('airport', 'Seat')
+
+    def count_seats(**filters):
+        seats = (
+            Seat.objects
+            .filter(airplane_type=OuterRef('pk'), **filters)
+            .order_by()
+            .values('airplane_type')
+            .annotate(total=Count('id'))
+            .values('total')
+        )
+        return Coalesce(Subquery(seats), Value(0))
+
+    AirplaneType.objects.update(
+        capacity=count_seats(),
+        economy_seats=count_seats(seat_type='ECONOMY'),
+        business_seats=count_seats(seat_type='BUSINESS'),
+        first_seats=count_seats(seat_type='FIRST'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport', '0004_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='airplanetype',
+            name='business_seats',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='airplanetype',
+            name='capacity',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='airplanetype',
+            name='economy_seats',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='airplanetype',
+            name='first_seats',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_existing_seats, migrations.RunPython.noop),
+    ]
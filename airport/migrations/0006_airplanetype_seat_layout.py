@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-17 05:10
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport', '0005_airplanetype_seat_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='airplanetype',
+            name='seat_layout',
+            field=models.CharField(blank=True, default='', max_length=20, validators=[django.core.validators.RegexValidator('^[A-Z]+( [A-Z]+)*$', 'Letters in blocks split by spaces.')]),
+        ),
+    ]
@@ -1,4 +1,8 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.core.validators import RegexValidator
 from django.db import models
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Upper
 from django.utils.translation import gettext_lazy as _
 
 class Country(models.Model):
@@ -27,6 +31,13 @@ class City(models.Model):
         unique_together = ('name', 'country')
         ordering = ["name"]
         verbose_name_plural = "cities"
+        indexes = [
+            # Trigram index on UPPER(name), this is what icontains filters on
+            GinIndex(
+                OpClass(Upper('name'), name='gin_trgm_ops'),
+                name='city_name_trgm_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.country})"
@@ -46,6 +57,18 @@ class Airport(models.Model):
         related_name="airports"
     )
 
+    class Meta:
+        indexes = [
+            GinIndex(
+                OpClass(Upper('name'), name='gin_trgm_ops'),
+                name='airport_name_trgm_idx'
+            ),
+            GinIndex(
+                OpClass(Upper('iata_code'), name='gin_trgm_ops'),
+                name='airport_iata_trgm_idx'
+            ),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.iata_code}) - {self.city.name}, {self.city.country.name}"
 
@@ -67,20 +90,55 @@ class Airline(models.Model):
         return self.name
 
 
+class AirplaneTypeQuerySet(models.QuerySet):
+    def refresh_seat_counts(self):
+        """
+        Recount stored capacity and per-cabin seat counts in one UPDATE
+        """
+        def count_seats(**filters):
+            seats = (
+                Seat.objects
+                .filter(airplane_type=OuterRef('pk'), **filters)
+                .order_by()
+                .values('airplane_type')
+                .annotate(total=Count('id'))
+                .values('total')
+            )
+            return Coalesce(Subquery(seats), Value(0))
+
+        return self.update(
+            capacity=count_seats(),
+            economy_seats=count_seats(seat_type=Seat.SeatType.ECONOMY),
+            business_seats=count_seats(seat_type=Seat.SeatType.BUSINESS),
+            first_seats=count_seats(seat_type=Seat.SeatType.FIRST),
+        )
+
+
 class AirplaneType(models.Model):
     """
     New model for type of airplane
     """
     name = models.CharField(max_length=100, unique=True)
 
+    # Stored seat counts, kept in sync with seats (see signals.py)
+    capacity = models.PositiveIntegerField(default=0, editable=False)
+    economy_seats = models.PositiveIntegerField(default=0, editable=False)
+    business_seats = models.PositiveIntegerField(default=0, editable=False)
+    first_seats = models.PositiveIntegerField(default=0, editable=False)
+    # Seat letters between aisles, e.g. "ABC DEF" or "ABC DEFG HJK".
+    # Empty: guessed from the number of seats in a row
+    seat_layout = models.CharField(
+        max_length=20,
+        blank=True,
+        default='',
+        validators=[RegexValidator(r'^[A-Z]+( [A-Z]+)*$', "Letters in blocks split by spaces.")],
+    )
+
+    objects = AirplaneTypeQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
-    @property
-    def capacity(self):
-        """Dynamic capacity count"""
-        return self.seats.count()
-
 
 class Seat(models.Model):
     """
@@ -132,6 +190,41 @@ class Airplane(models.Model):
         return f"{self.model} ({self.capacity})"
 
 
+class FlightQuerySet(models.QuerySet):
+    def with_available_seats(self):
+        """
+        Annotate 'available_seats' for every flight in one query
+        """
+        from booking.models import FlightInventory, Ticket
+
+        # Inventory counters: one small row per cabin
+        inventory = (
+            FlightInventory.objects
+            .filter(flight=OuterRef('pk'))
+            .order_by()
+            .values('flight')
+            .annotate(free=Sum(F('total') - F('sold') - F('held')))
+            .values('free')
+        )
+        # Fallback for flights without inventory yet
+        booked = (
+            Ticket.objects
+            .filter(flight=OuterRef('pk'))
+            .exclude(status=Ticket.Status.CANCELLED)
+            .order_by()
+            .values('flight')
+            .annotate(total=Count('id'))
+            .values('total')
+        )
+        return self.annotate(
+            available_seats=Coalesce(
+                Subquery(inventory),
+                F('airplane__airplane_type__capacity')
+                - Coalesce(Subquery(booked), Value(0))
+            )
+        )
+
+
 class Flight(models.Model):
     """
     Flight class
@@ -168,9 +261,31 @@ class Flight(models.Model):
     )
     price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
+    objects = FlightQuerySet.as_manager()
 
     class Meta:
         ordering = ['departure_time']
+        indexes = [
+            # City filters + ORDER BY departure_time
+            models.Index(
+                fields=['departure_airport', 'departure_time'],
+                name='flight_dep_airport_time_idx'
+            ),
+            models.Index(
+                fields=['arrival_airport', 'departure_time'],
+                name='flight_arr_airport_time_idx'
+            ),
+            # ?status= + ORDER BY departure_time
+            models.Index(
+                fields=['status', 'departure_time'],
+                name='flight_status_time_idx'
+            ),
+            # Keyset pagination (departure_time, id)
+            models.Index(
+                fields=['departure_time', 'id'],
+                name='flight_time_id_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.flight_number}: {self.departure_airport} to {self.arrival_airport}"
@@ -180,8 +295,12 @@ class Flight(models.Model):
         """
         Dynamic seats count
         """
+        # Already annotated by FlightQuerySet.with_available_seats()
+        if hasattr(self, 'available_seats'):
+            return self.available_seats
+
         total_capacity = self.airplane.airplane_type.capacity
-        booked_tickets = self.tickets.count()
+        booked_tickets = self.tickets.exclude(status='CANCELLED').count()
         return total_capacity - booked_tickets
 
 
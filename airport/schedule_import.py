@@ -0,0 +1,308 @@
+import csv
+import io
+import json
+import logging
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Airplane, Airport, Flight
+
+
+logger = logging.getLogger("airport")
+
+SCHEDULE_FORMATS = ('csv', 'ndjson')
+# Columns of a schedule file and Flight fields they go to, in COPY order.
+# Airports are given by IATA code, airplanes by name
+FLIGHT_FIELDS = (
+    'flight_number',
+    'departure_airport',
+    'arrival_airport',
+    'departure_time',
+    'arrival_time',
+    'airplane',
+    'status',
+    'price',
+)
+STAGING_TABLE = 'flight_schedule_staging'
+IMPORT_BATCH_SIZE = 5000
+
+
+def guess_format(filename):
+    """
+    'csv' or 'ndjson' from the file extension, None if unknown
+    """
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension == 'csv':
+        return 'csv'
+    if extension in ('ndjson', 'jsonl'):
+        return 'ndjson'
+    return None
+
+
+def read_schedule(stream, fmt):
+    """
+    (line number, row dict or None, parse error) for every record of a
+    text stream. CSV needs a header row with FLIGHT_FIELDS
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, "Expected a JSON object."
+            continue
+        yield line_number, row, None
+
+
+def _text(row, name):
+    value = row.get(name)
+    return str(value).strip() if value is not None else ''
+
+
+def _parse_time(value):
+    moment = parse_datetime(value)
+    if moment is not None and timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class ScheduleValidator:
+    """
+    Turns schedule rows into Flight column values. Airports and airplanes
+    are resolved from dicts loaded once, not queried per row
+    """
+
+    def __init__(self):
+        self.airports = {
+            code.upper(): airport_id
+            for airport_id, code in Airport.objects.values_list('id', 'iata_code')
+        }
+        self.airplanes = {}
+        for airplane_id, name in Airplane.objects.values_list('id', 'name'):
+            # Same name twice: rows cannot tell them apart
+            self.airplanes[name] = None if name in self.airplanes else airplane_id
+
+        self.statuses = set(Flight.Status.values)
+        self.max_number_length = Flight._meta.get_field('flight_number').max_length
+        self.seen_numbers = set()
+
+    def validate(self, row):
+        """
+        (values tuple in FLIGHT_FIELDS order, None) or (None, errors)
+        """
+        errors = []
+
+        flight_number = _text(row, 'flight_number').upper()
+        if not flight_number:
+            errors.append("flight_number is required.")
+        elif len(flight_number) > self.max_number_length:
+            errors.append(f"flight_number is longer than {self.max_number_length} characters.")
+        elif flight_number in self.seen_numbers:
+            errors.append(f"flight_number {flight_number} is repeated in the file.")
+
+        airport_ids = []
+        for name in ('departure_airport', 'arrival_airport'):
+            code = _text(row, name).upper()
+            airport_id = self.airports.get(code)
+            if airport_id is None:
+                errors.append(f"{name}: unknown airport '{code}'.")
+            airport_ids.append(airport_id)
+        if airport_ids[0] is not None and airport_ids[0] == airport_ids[1]:
+            errors.append("departure_airport and arrival_airport are the same.")
+
+        times = []
+        for name in ('departure_time', 'arrival_time'):
+            moment = _parse_time(_text(row, name))
+            if moment is None:
+                errors.append(f"{name}: expected an ISO 8601 date and time.")
+            times.append(moment)
+        if None not in times and times[1] <= times[0]:
+            errors.append("arrival_time must be after departure_time.")
+
+        airplane = _text(row, 'airplane')
+        airplane_id = self.airplanes.get(airplane)
+        if airplane not in self.airplanes:
+            errors.append(f"airplane: unknown airplane '{airplane}'.")
+        elif airplane_id is None:
+            errors.append(f"airplane: several airplanes are named '{airplane}'.")
+
+        status = _text(row, 'status').upper() or Flight.Status.SCHEDULED
+        if status not in self.statuses:
+            errors.append(f"status: '{status}' is not one of {', '.join(sorted(self.statuses))}.")
+
+        try:
+            price = Decimal(_text(row, 'price') or '0').quantize(Decimal('0.01'))
+            if price < 0 or price >= Decimal('1e8'):
+                raise InvalidOperation
+        except InvalidOperation:
+            errors.append("price: expected a non-negative amount.")
+            price = None
+
+        if errors:
+            return None, errors
+
+        self.seen_numbers.add(flight_number)
+        return (
+            flight_number, airport_ids[0], airport_ids[1],
+            times[0], times[1], airplane_id, status, price,
+        ), None
+
+
+def _columns():
+    return [Flight._meta.get_field(name) for name in FLIGHT_FIELDS]
+
+
+def _create_staging_table(cursor):
+    definitions = ', '.join(
+        f"{connection.ops.quote_name(field.column)} {field.db_type(connection)}"
+        for field in _columns()
+    )
+    cursor.execute(f"CREATE TEMPORARY TABLE {STAGING_TABLE} ({definitions}) ON COMMIT DROP")
+
+
+def _drop_staging_table(cursor):
+    # ON COMMIT DROP waits for the outermost commit: another import
+    # in the same transaction creates the table again
+    cursor.execute(f"DROP TABLE {STAGING_TABLE}")
+
+
+def _copy_batch(cursor, values):
+    """
+    One COPY ... FROM STDIN of validated rows into the staging table
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in values:
+        writer.writerow(
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in row
+        )
+    buffer.seek(0)
+
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in _columns())
+    cursor.copy_expert(
+        f"COPY {STAGING_TABLE} ({columns}) FROM STDIN WITH (FORMAT csv)",
+        buffer,
+    )
+
+
+def _upsert(cursor):
+    """
+    Staging -> Flight keyed on flight_number, rows that did not change
+    are left alone. Returns [(id, created, departure_airport_id, arrival_airport_id)]
+    """
+    table = connection.ops.quote_name(Flight._meta.db_table)
+    columns = [connection.ops.quote_name(field.column) for field in _columns()]
+    number = connection.ops.quote_name(Flight._meta.get_field('flight_number').column)
+    changed = [column for column in columns if column != number]
+
+    departure = connection.ops.quote_name(Flight._meta.get_field('departure_airport').column)
+    arrival = connection.ops.quote_name(Flight._meta.get_field('arrival_airport').column)
+
+    cursor.execute(f"""
+        INSERT INTO {table} AS flight ({', '.join(columns)})
+        SELECT {', '.join(columns)} FROM {STAGING_TABLE}
+        ON CONFLICT ({number}) DO UPDATE SET
+            {', '.join(f'{column} = EXCLUDED.{column}' for column in changed)}
+        WHERE ({', '.join(f'flight.{column}' for column in changed)})
+            IS DISTINCT FROM ({', '.join(f'EXCLUDED.{column}' for column in changed)})
+        RETURNING flight.id, (flight.xmax = 0), flight.{departure}, flight.{arrival}
+    """)
+    return cursor.fetchall()
+
+
+def _previous_routes(cursor):
+    """
+    Routes of existing flights that are in the staging table: boards and
+    fare calendars of the old airports change as well
+    """
+    table = connection.ops.quote_name(Flight._meta.db_table)
+    number = connection.ops.quote_name(Flight._meta.get_field('flight_number').column)
+    departure = connection.ops.quote_name(Flight._meta.get_field('departure_airport').column)
+    arrival = connection.ops.quote_name(Flight._meta.get_field('arrival_airport').column)
+
+    cursor.execute(f"""
+        SELECT DISTINCT flight.{departure}, flight.{arrival}
+        FROM {table} AS flight JOIN {STAGING_TABLE} USING ({number})
+    """)
+    return cursor.fetchall()
+
+
+def import_schedule(records, batch_size=IMPORT_BATCH_SIZE, dry_run=False):
+    """
+    Validate schedule records (from read_schedule) in batches, COPY valid
+    ones into a staging table and upsert them into Flight in one statement.
+    Rejected rows are reported, they do not stop the import.
+    Everything runs in one transaction, dry_run rolls it back
+    """
+    from .signals import flights_changed
+
+    validator = ScheduleValidator()
+    result = {'total': 0, 'created': 0, 'updated': 0, 'unchanged': 0, 'rejected': []}
+
+    def reject(line, row, errors):
+        result['rejected'].append({
+            'line': line,
+            'flight_number': _text(row or {}, 'flight_number'),
+            'errors': errors,
+        })
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        _create_staging_table(cursor)
+
+        batch = []
+        valid = 0
+        for line, row, error in records:
+            result['total'] += 1
+            if error:
+                reject(line, row, [error])
+                continue
+
+            values, errors = validator.validate(row)
+            if errors:
+                reject(line, row, errors)
+                continue
+
+            batch.append(values)
+            if len(batch) >= batch_size:
+                _copy_batch(cursor, batch)
+                valid += len(batch)
+                batch = []
+        if batch:
+            _copy_batch(cursor, batch)
+            valid += len(batch)
+
+        routes = set(_previous_routes(cursor))
+        written = _upsert(cursor)
+        _drop_staging_table(cursor)
+
+        result['created'] = sum(1 for _, created, _, _ in written if created)
+        result['updated'] = len(written) - result['created']
+        result['unchanged'] = valid - len(written)
+
+        if written:
+            routes |= {(departure, arrival) for _, _, departure, arrival in written}
+            flights_changed([flight_id for flight_id, *_ in written], routes)
+
+        if dry_run:
+            transaction.set_rollback(True)
+
+    logger.info(
+        f"Schedule import{' (dry run)' if dry_run else ''}: {result['total']} rows, "
+        f"{result['created']} created, {result['updated']} updated, "
+        f"{result['unchanged']} unchanged, {len(result['rejected'])} rejected."
+    )
+    return result
@@ -0,0 +1,68 @@
+from django.core.cache import cache
+
+from booking.holds import get_held_seat_ids
+from booking.models import Ticket
+from .models import Seat
+
+
+SEAT_LAYOUT_CACHE_KEY = "seatmap:layout:{airplane_type_id}"
+
+
+def get_seat_layout(airplane_type_id):
+    """
+    Static seat grid of an airplane type.
+    Cached until a seat of this type is changed (see signals.py)
+    """
+    key = SEAT_LAYOUT_CACHE_KEY.format(airplane_type_id=airplane_type_id)
+    layout = cache.get(key)
+
+    if layout is None:
+        layout = list(
+            Seat.objects
+            .filter(airplane_type_id=airplane_type_id)
+            .order_by('row', 'seat')
+            .values('id', 'row', 'seat', 'seat_type')
+        )
+        cache.set(key, layout, None)
+
+    return layout
+
+
+def invalidate_seat_layout(airplane_type_id):
+    cache.delete(SEAT_LAYOUT_CACHE_KEY.format(airplane_type_id=airplane_type_id))
+
+
+def get_taken_seat_ids(flight_id):
+    """
+    Live occupancy overlay, one query on tickets of the flight
+    """
+    return set(
+        Ticket.objects
+        .filter(flight_id=flight_id)
+        .exclude(status=Ticket.Status.CANCELLED)
+        .values_list('seat_id', flat=True)
+    )
+
+
+def build_seat_map(flight):
+    """
+    Cached layout + occupancy and hold overlays for one flight
+    """
+    layout = get_seat_layout(flight.airplane.airplane_type_id)
+    taken = get_taken_seat_ids(flight.id)
+    held = get_held_seat_ids(flight.id, [seat['id'] for seat in layout]) - taken
+
+    seats = [
+        {**seat, 'taken': seat['id'] in taken, 'held': seat['id'] in held}
+        for seat in layout
+    ]
+    taken_count = sum(1 for seat in seats if seat['taken'] or seat['held'])
+
+    return {
+        'flight': flight.id,
+        'flight_number': flight.flight_number,
+        'airplane_type': flight.airplane.airplane_type_id,
+        'capacity': len(seats),
+        'available': len(seats) - taken_count,
+        'seats': seats,
+    }
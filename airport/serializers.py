@@ -1,15 +1,20 @@
 from rest_framework import serializers
+
+from booking.holds import count_held_seats
+from core.serializers import SparseFieldsMixin
+from .board import BOARD_MAX_FLIGHTS
 from .models import Country, City, Airport, Airline, Airplane, Flight, AirplaneType, Seat
+from .schedule_import import SCHEDULE_FORMATS, guess_format
 
 
 # --- Country ---
-class CountrySerializer(serializers.ModelSerializer):
+class CountrySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Country
         fields = ('id', 'name')
 
 
-class CitySerializer(serializers.ModelSerializer):
+class CitySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     GET cities
     """
@@ -32,7 +37,7 @@ class CityCreateSerializer(serializers.ModelSerializer):
 
 
 # --- Airport ---
-class AirportListSerializer(serializers.ModelSerializer):
+class AirportListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     (GET) without iata_code
     """
@@ -42,7 +47,7 @@ class AirportListSerializer(serializers.ModelSerializer):
         model = Airport
         fields = ('id', 'name', 'city')
 
-class AirportDetailSerializer(serializers.ModelSerializer):
+class AirportDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     # Show city object
     city = CitySerializer(read_only=True)
 
@@ -57,8 +62,15 @@ class AirportCreateSerializer(serializers.ModelSerializer):
         fields = ('name', 'iata_code', 'city')
 
 
+class AirportBoardSerializer(serializers.Serializer):
+    """
+    Query params for GET airports/{id}/board/
+    """
+    limit = serializers.IntegerField(min_value=1, max_value=BOARD_MAX_FLIGHTS, default=10)
+
+
 # --- Airline ---
-class AirlineSerializer(serializers.ModelSerializer):
+class AirlineSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for (GET) airlines
     """
@@ -78,19 +90,30 @@ class AirlineCreateSerializer(serializers.ModelSerializer):
         fields = ('name', 'home_base')
 
 
-class AirplaneTypeSerializer(serializers.ModelSerializer):
+class AirplaneTypeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     GET/POST for AirlineType
     """
-    # Add from @property
-    capacity =serializers.IntegerField(read_only=True)
-
     class Meta:
         model = AirplaneType
-        fields = ('id', 'name', 'capacity')
+        fields = (
+            'id',
+            'name',
+            'capacity',
+            'economy_seats',
+            'business_seats',
+            'first_seats',
+            'seat_layout'
+        )
+        read_only_fields = (
+            'capacity',
+            'economy_seats',
+            'business_seats',
+            'first_seats'
+        )
 
 
-class SeatSerializer(serializers.ModelSerializer):
+class SeatSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     GET serializer
     """
@@ -101,7 +124,7 @@ class SeatSerializer(serializers.ModelSerializer):
         fields = ('id', 'airplane_type', 'row', 'seat', 'seat_type')
 
 
-class AirplaneSerializer(serializers.ModelSerializer):
+class AirplaneSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for (GET) planes
     """
@@ -125,7 +148,20 @@ class AirplaneCreateSerializer(serializers.ModelSerializer):
 
 
 # Serializers for Flights
-class FlightSerializer(serializers.ModelSerializer):
+class FlightListSerializer(serializers.ListSerializer):
+    """
+    Held seats of all flights of the page in one cache round trip
+    """
+    def to_representation(self, data):
+        flights = list(data.all() if hasattr(data, 'all') else data)
+        if 'available_seats' in self.child.fields:
+            held = count_held_seats([flight.id for flight in flights])
+            for flight in flights:
+                flight.held_seats = held.get(flight.id, 0)
+        return super().to_representation(flights)
+
+
+class FlightSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for GET all flights information
     """
@@ -133,9 +169,12 @@ class FlightSerializer(serializers.ModelSerializer):
     arrival_airport = AirportDetailSerializer(read_only=True)
     airplane = AirplaneSerializer(read_only=True)
     status = serializers.CharField(source='get_status_display') # Show "Scheduled" instead of "SCHEDULED"
+    # Only present on querysets annotated with with_available_seats()
+    available_seats = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Flight
+        list_serializer_class = FlightListSerializer
         fields = (
             'id',
             'flight_number',
@@ -145,9 +184,21 @@ class FlightSerializer(serializers.ModelSerializer):
             'arrival_time',
             'airplane',
             'status',
-            'price'
+            'price',
+            'available_seats'
         )
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if data.get('available_seats') is not None:
+            # Seat holds live in the cache, inventory does not count them.
+            # FlightFilter does not subtract them (it filters in SQL)
+            held = getattr(instance, 'held_seats', None)
+            if held is None:
+                held = count_held_seats([instance.id]).get(instance.id, 0)
+            data['available_seats'] = max(data['available_seats'] - held, 0)
+        return data
+
 class FlightCreateSerializer(serializers.ModelSerializer):
     """
     Serializer for POST/PUT flights
@@ -164,3 +215,61 @@ class FlightCreateSerializer(serializers.ModelSerializer):
             'status',
             'price'
         )
+
+
+class ScheduleImportSerializer(serializers.Serializer):
+    """
+    Upload for POST flights/import/
+    """
+    file = serializers.FileField()
+    format = serializers.ChoiceField(choices=SCHEDULE_FORMATS, required=False)
+    dry_run = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        data['format'] = data.get('format') or guess_format(data['file'].name)
+        if data['format'] is None:
+            raise serializers.ValidationError(
+                {'format': 'Cannot tell the format from the file name, pass it explicitly.'}
+            )
+        return data
+
+
+class RouteQuerySerializer(serializers.Serializer):
+    """
+    ?from=KBP&to=WAW query params (IATA codes)
+    """
+    def get_fields(self):
+        fields = super().get_fields()
+        # 'from' and 'to' are python keywords, so add them here
+        fields['from'] = serializers.SlugRelatedField(
+            slug_field='iata_code', queryset=Airport.objects.all()
+        )
+        fields['to'] = serializers.SlugRelatedField(
+            slug_field='iata_code', queryset=Airport.objects.all()
+        )
+        return fields
+
+
+class ConnectionSearchSerializer(RouteQuerySerializer):
+    """
+    Query params for GET flights/connections/
+    """
+    date = serializers.DateField()
+    max_connections = serializers.IntegerField(min_value=0, max_value=2, default=2)
+    min_connection = serializers.IntegerField(min_value=0, default=45)       # minutes
+    max_connection = serializers.IntegerField(min_value=1, default=24 * 60)  # minutes
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=20)
+
+    def validate(self, data):
+        if data['min_connection'] > data['max_connection']:
+            raise serializers.ValidationError(
+                {'min_connection': 'Must not be greater than max_connection.'}
+            )
+        return data
+
+
+class FareCalendarSerializer(RouteQuerySerializer):
+    """
+    Query params for GET flights/fare-calendar/
+    """
+    month = serializers.DateField(input_formats=['%Y-%m'])   # ?month=2026-11
@@ -0,0 +1,135 @@
+import threading
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from booking.inventory import refresh_inventory_totals
+from core.versioning import bump_model_version
+from .models import Airline, Airplane, AirplaneType, Airport, City, Country, Flight, Seat
+from .seatmap import invalidate_seat_layout
+from .connections import flight_graph
+from .board import invalidate_airport_boards
+from .fare_calendar import invalidate_fare_calendar
+
+
+def seats_changed(airplane_type_id):
+    """
+    Sync everything derived from seats of an airplane type.
+    Call it directly after bulk writes, they do not send signals
+    """
+    AirplaneType.objects.filter(pk=airplane_type_id).refresh_seat_counts()
+    refresh_inventory_totals(
+        Flight.objects.filter(airplane__airplane_type_id=airplane_type_id)
+    )
+    invalidate_seat_layout(airplane_type_id)
+    # Seat counts are written with update(), which sends no signals
+    bump_model_version(AirplaneType)
+    bump_model_version(Seat)
+
+
+def flights_changed(flight_ids, routes):
+    """
+    Sync everything derived from flights after bulk writes (no signals).
+    routes: (departure_airport_id, arrival_airport_id) before and after
+    """
+    refresh_inventory_totals(Flight.objects.filter(id__in=flight_ids))
+    airport_ids = {airport_id for route in routes for airport_id in route}
+
+    def on_commit():
+        flight_graph.record_changes(flight_ids)
+        invalidate_airport_boards(*airport_ids)
+        invalidate_fare_calendar(*routes)
+        bump_model_version(Flight)
+
+    transaction.on_commit(on_commit)
+
+
+# Models behind ETag/Last-Modified of the API (see ConditionalGetMixin)
+VERSIONED_MODELS = (Country, City, Airport, Airline, AirplaneType, Airplane, Flight)
+
+
+@receiver([post_save, post_delete])
+def model_version_changed(sender, **kwargs):
+    """
+    Any write through the ORM (API, admin, shell) makes cached responses
+    stale once committed. Bulk writes call bump_model_version themselves
+    """
+    if sender in VERSIONED_MODELS:
+        transaction.on_commit(lambda: bump_model_version(sender))
+
+
+# Airplane types whose seats changed and are not synced yet,
+# per thread (so per connection) and database alias
+_pending_seat_layouts = threading.local()
+
+
+def _pending_airplane_type_ids(using):
+    if not hasattr(_pending_seat_layouts, 'by_alias'):
+        _pending_seat_layouts.by_alias = defaultdict(set)
+    return _pending_seat_layouts.by_alias[using]
+
+
+def sync_seat_layouts(using):
+    """
+    on_commit callback of every seat change. The first one to run syncs
+    all airplane types changed so far, once per type however many seats
+    were saved; the others find nothing left. Types of a rolled back
+    transaction wait for the next commit, syncing them again is harmless
+    """
+    pending = _pending_airplane_type_ids(using)
+    while pending:
+        airplane_type_id = pending.pop()
+        with transaction.atomic(using=using):
+            seats_changed(airplane_type_id)
+
+
+@receiver([post_save, post_delete], sender=Seat)
+def seat_layout_changed(sender, instance, using, **kwargs):
+    if not transaction.get_connection(using).in_atomic_block:
+        seats_changed(instance.airplane_type_id)
+        return
+
+    _pending_airplane_type_ids(using).add(instance.airplane_type_id)
+    # A callback per change: the ones of a rolled back savepoint are dropped
+    transaction.on_commit(lambda: sync_seat_layouts(using), using=using)
+
+
+@receiver(pre_save, sender=Flight)
+def remember_flight_route(sender, instance, **kwargs):
+    """
+    Keep the route before the save: a moved flight leaves boards and
+    fare calendar of its old airports stale too
+    """
+    instance._previous_route = None
+    if instance.pk and not kwargs.get('raw'):
+        instance._previous_route = (
+            Flight.objects
+            .filter(pk=instance.pk)
+            .values_list('departure_airport_id', 'arrival_airport_id')
+            .first()
+        )
+
+
+@receiver([post_save, post_delete], sender=Flight)
+def flight_changed(sender, instance, **kwargs):
+    """
+    Once the change is committed:
+    - update connection index of all workers
+    - drop departures/arrivals boards of old and new airports
+    - drop fare calendar of old and new route
+    """
+    flight_id = instance.id
+    routes = {(instance.departure_airport_id, instance.arrival_airport_id)}
+    previous = getattr(instance, '_previous_route', None)
+    if previous:
+        routes.add(previous)
+    airport_ids = {airport_id for route in routes for airport_id in route}
+
+    def on_commit():
+        flight_graph.record_change(flight_id)
+        invalidate_airport_boards(*airport_ids)
+        invalidate_fare_calendar(*routes)
+
+    transaction.on_commit(on_commit)
@@ -1,3 +1,346 @@
-from django.test import TestCase
+import io
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from users.models import User
+from .board import BOARD_MAX_FLIGHTS
+from .connections import ConnectionIndex
+from .models import Airline, Airplane, AirplaneType, Airport, City, Country, Flight, Seat
+from .schedule_import import FLIGHT_FIELDS, import_schedule, read_schedule
+
+
+def create_network(*codes):
+    """
+    Airports with the given IATA codes and one airplane to fly between them
+    """
+    country = Country.objects.create(name="Ukraine")
+    city = City.objects.create(name="Kyiv", country=country)
+    airports = {
+        code: Airport.objects.create(name=f"Airport {code}", iata_code=code, city=city)
+        for code in codes
+    }
+    airline = Airline.objects.create(name="UIA", home_base=airports[codes[0]])
+    airplane_type = AirplaneType.objects.create(name="Boeing 737")
+    airplane = Airplane.objects.create(name="UR-PSA", airplane_type=airplane_type, airline=airline)
+    return airports, airplane
+
+
+def create_flight(number, origin, destination, airplane, departure, hours=2):
+    return Flight.objects.create(
+        flight_number=number,
+        departure_airport=origin,
+        arrival_airport=destination,
+        departure_time=departure,
+        arrival_time=departure + timedelta(hours=hours),
+        airplane=airplane,
+        price=100,
+    )
+
+
+class AirportTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("bob", "bob@example.com", "password")
+        self.client.force_authenticate(self.user)
+        self.airports, self.airplane = create_network("KBP", "WAW", "LWO")
+        self.departure = (timezone.now() + timedelta(days=2)).replace(
+            hour=8, minute=0, second=0, microsecond=0
+        )
+
+
+class FlightListTests(AirportTestCase):
+    def test_cursor_pages_round_trip(self):
+        flights = [
+            create_flight(
+                f"PS{number:03}", self.airports["KBP"], self.airports["WAW"],
+                self.airplane, self.departure + timedelta(hours=number)
+            )
+            for number in range(12)
+        ]
+
+        first = self.client.get(reverse("flight-list"), {"pagination": "cursor"})
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [flight["id"] for flight in first.data["results"]],
+            [flight.id for flight in flights[:10]]
+        )
+        self.assertIsNone(first.data["previous"])
+
+        second = self.client.get(first.data["next"])
+        self.assertEqual(
+            [flight["id"] for flight in second.data["results"]],
+            [flight.id for flight in flights[10:]]
+        )
+        self.assertIsNone(second.data["next"])
+
+        back = self.client.get(second.data["previous"])
+        self.assertEqual(back.data["results"], first.data["results"])
+
+    def test_unknown_sparse_field_is_rejected(self):
+        response = self.client.get(reverse("flight-list"), {"fields": "id,bogus"})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("fields", response.data)
+
+
+class ConditionalGetTests(AirportTestCase):
+    def test_etag_changes_after_write(self):
+        url = reverse("country-list")
+        etag = self.client.get(url)["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Country.objects.create(name="Poland")
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_write_in_the_same_second_is_not_hidden_by_last_modified(self):
+        url = reverse("country-list")
+        last_modified = self.client.get(url)["Last-Modified"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Country.objects.create(name="Poland")
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["Last-Modified"], last_modified)
+
+
+class AirportBoardTests(AirportTestCase):
+    def test_moved_flight_leaves_the_board_of_its_old_airport(self):
+        flight = create_flight(
+            "PS101", self.airports["KBP"], self.airports["WAW"], self.airplane, self.departure
+        )
+        url = reverse("airport-board", args=[self.airports["KBP"].id])
+        self.assertEqual(len(self.client.get(url).data["departures"]), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            flight.departure_airport = self.airports["LWO"]
+            flight.save()
+
+        self.assertEqual(self.client.get(url).data["departures"], [])
+
+    def test_limit_out_of_range_is_rejected(self):
+        url = reverse("airport-board", args=[self.airports["KBP"].id])
+
+        for limit in ("0", "-1", str(BOARD_MAX_FLIGHTS + 1), "ten"):
+            response = self.client.get(url, {"limit": limit})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, limit)
+        self.assertEqual(
+            self.client.get(url, {"limit": BOARD_MAX_FLIGHTS}).status_code, status.HTTP_200_OK
+        )
+
+
+class FareCalendarTests(AirportTestCase):
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            Seat.objects.create(airplane_type=self.airplane.airplane_type, row=1, seat="A")
+
+    def calendar(self):
+        response = self.client.get(reverse("flight-fare-calendar"), {
+            "from": "KBP", "to": "WAW", "month": self.departure.strftime("%Y-%m")
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["days"][self.departure.day - 1]
+
+    def test_lowest_fare_of_the_day(self):
+        create_flight("PS101", self.airports["KBP"], self.airports["WAW"], self.airplane, self.departure)
+        cheap = create_flight(
+            "PS102", self.airports["KBP"], self.airports["WAW"], self.airplane,
+            self.departure + timedelta(hours=4)
+        )
+        Flight.objects.filter(id=cheap.id).update(price=80)
+
+        day = self.calendar()
+
+        self.assertEqual(day["date"], self.departure.date())
+        self.assertEqual((day["lowest_price"], day["flights"], day["flights_with_seats"]), ("80.00", 2, 2))
+
+    def test_price_change_drops_the_cached_month(self):
+        flight = create_flight(
+            "PS101", self.airports["KBP"], self.airports["WAW"], self.airplane, self.departure
+        )
+        self.assertEqual(self.calendar()["lowest_price"], "100.00")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            flight.price = 120
+            flight.save()
+
+        self.assertEqual(self.calendar()["lowest_price"], "120.00")
+
+
+@mock.patch("airport.views.flight_graph", new_callable=ConnectionIndex)
+class ConnectionSearchTests(AirportTestCase):
+    def search(self, **params):
+        return self.client.get(reverse("flight-connections"), {
+            "from": "KBP", "to": "LWO", "date": self.departure.date().isoformat(), **params
+        })
+
+    def test_itinerary_with_one_connection(self, graph):
+        first = create_flight(
+            "PS101", self.airports["KBP"], self.airports["WAW"], self.airplane, self.departure
+        )
+        second = create_flight(
+            "PS102", self.airports["WAW"], self.airports["LWO"], self.airplane,
+            first.arrival_time + timedelta(hours=1)
+        )
+
+        response = self.search()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]["connections"], 1)
+        self.assertEqual(
+            [flight["id"] for flight in response.data[0]["flights"]], [first.id, second.id]
+        )
+
+    def test_two_connections_through_a_busy_hub(self, graph):
+        gdansk = Airport.objects.create(
+            name="Airport GDN", iata_code="GDN", city=self.airports["KBP"].city
+        )
+        first = create_flight(
+            "PS101", self.airports["KBP"], self.airports["WAW"], self.airplane, self.departure
+        )
+        # Plenty of departures from the hub leave before the useful one
+        Flight.objects.bulk_create([
+            Flight(
+                flight_number=f"PS2{number:02}",
+                departure_airport=self.airports["WAW"],
+                arrival_airport=self.airports["KBP"],
+                departure_time=first.arrival_time + timedelta(hours=1, minutes=number),
+                arrival_time=first.arrival_time + timedelta(hours=3, minutes=number),
+                airplane=self.airplane,
+                price=100,
+            )
+            for number in range(60)
+        ])
+        second = create_flight(
+            "PS301", self.airports["WAW"], gdansk, self.airplane,
+            first.arrival_time + timedelta(hours=3)
+        )
+        third = create_flight(
+            "PS302", gdansk, self.airports["LWO"], self.airplane,
+            second.arrival_time + timedelta(hours=1)
+        )
+
+        response = self.search()
+
+        self.assertEqual(
+            [[flight["id"] for flight in itinerary["flights"]] for itinerary in response.data],
+            [[first.id, second.id, third.id]],
+        )
+
+    def test_deleted_flight_is_skipped(self, graph):
+        flight = create_flight(
+            "PS101", self.airports["KBP"], self.airports["LWO"], self.airplane, self.departure
+        )
+        self.assertEqual(len(self.search().data), 1)
+
+        # Deleted without the index hearing about it
+        Flight.objects.filter(id=flight.id).delete()
+
+        response = self.search()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [])
+
+    def test_min_connection_above_max_is_rejected(self, graph):
+        response = self.search(min_connection=120, max_connection=60)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("min_connection", response.data)
+
+
+class ScheduleImportTests(TransactionTestCase):
+    """
+    Import uses a temporary table dropped on commit, so every import
+    needs a real transaction of its own
+    """
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.force_login(self.admin)
+        self.airports, self.airplane = create_network("KBP", "WAW")
+        self.departure = timezone.now() + timedelta(days=2)
+
+    def row(self, number, origin="KBP", price="100.00"):
+        return [
+            number, origin, "WAW",
+            self.departure.isoformat(), (self.departure + timedelta(hours=2)).isoformat(),
+            self.airplane.name, "SCHEDULED", price,
+        ]
+
+    def upload(self, *rows, **extra):
+        content = "\n".join(",".join(row) for row in [FLIGHT_FIELDS, *rows])
+        return self.client.post(
+            reverse("flight-import-schedule"),
+            {"file": SimpleUploadedFile("schedule.csv", content.encode()), **extra},
+        )
+
+    def test_counts_created_rejected_updated_and_unchanged(self):
+        response = self.upload(self.row("PS101"), self.row("PS102"), self.row("PS103", origin="XXX"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            (response.data["total"], response.data["created"], response.data["updated"]), (3, 2, 0)
+        )
+        self.assertEqual(len(response.data["rejected"]), 1)
+        self.assertEqual(response.data["rejected"][0]["line"], 4)
+        self.assertEqual(response.data["rejected"][0]["flight_number"], "PS103")
+
+        response = self.upload(self.row("PS101", price="150.00"), self.row("PS102"))
+
+        self.assertEqual(
+            (response.data["created"], response.data["updated"], response.data["unchanged"]), (0, 1, 1)
+        )
+        self.assertEqual(Flight.objects.get(flight_number="PS101").price, 150)
+        self.assertEqual(Flight.objects.count(), 2)
+
+    def test_dry_run_writes_nothing(self):
+        response = self.upload(self.row("PS101"), dry_run=True)
+
+        self.assertEqual(response.data["created"], 1)
+        self.assertFalse(Flight.objects.exists())
+
+    def test_two_imports_in_one_transaction(self):
+        def schedule(*rows):
+            content = "\n".join(",".join(row) for row in [FLIGHT_FIELDS, *rows])
+            return read_schedule(io.StringIO(content), "csv")
+
+        with transaction.atomic():
+            import_schedule(schedule(self.row("PS101")))
+            result = import_schedule(schedule(self.row("PS102")))
+
+        self.assertEqual(result["created"], 1)
+        self.assertEqual(Flight.objects.count(), 2)
+
+    def test_command_reads_stdin_and_leaves_it_open(self):
+        stdin = io.StringIO("\n".join(",".join(row) for row in [FLIGHT_FIELDS, self.row("PS101")]))
+
+        with mock.patch("sys.stdin", stdin):
+            call_command("import_schedule", "-", format="csv", stdout=io.StringIO())
+
+        self.assertFalse(stdin.closed)
+        self.assertTrue(Flight.objects.filter(flight_number="PS101").exists())
+
+    def test_only_admins_can_import(self):
+        self.client.force_login(User.objects.create_user("bob", "bob@example.com", "password"))
+
+        response = self.upload(self.row("PS101"))
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(Flight.objects.exists())
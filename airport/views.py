@@ -1,14 +1,26 @@
 from django.shortcuts import render
+import io
 import logging
-from django.http import Http404
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+from django.http import Http404, StreamingHttpResponse
 from rest_framework import viewsets, permissions, serializers, exceptions
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 
 from .ai_services import AI_Assistant
 from .models import Country, City, Airline, Airplane, Airport, Flight, AirplaneType, Seat
 from .filters import FlightFilter
-from core.mixins import AuditLoggingMixin
+from .seatmap import build_seat_map
+from .manifest import MANIFEST_FIELDS, get_manifest_rows
+from .schedule_import import import_schedule, read_schedule
+from .connections import flight_graph
+from .board import build_airport_board, cache_board, get_cached_board
+from .fare_calendar import get_fare_calendar
+from core.mixins import AuditLoggingMixin, ConditionalGetMixin, SparseFieldsViewMixin
+from core.pagination import OptionalKeysetPagination
+from core.renderers import CSVRenderer, NDJSONRenderer, StreamingJSONRenderer
 from .serializers import (
     CountrySerializer,
     CitySerializer,
@@ -17,6 +29,7 @@ from .serializers import (
     AirportDetailSerializer,
     AirportListSerializer,
     AirportCreateSerializer,
+    AirportBoardSerializer,
 
     AirlineCreateSerializer,
     AirlineSerializer,
@@ -27,21 +40,26 @@ from .serializers import (
     AirplaneCreateSerializer,
 
     FlightSerializer,
-    FlightCreateSerializer
+    FlightCreateSerializer,
+    ConnectionSearchSerializer,
+    FareCalendarSerializer,
+    ScheduleImportSerializer
 )
 
 
 logger = logging.getLogger("airport")
 
 
-class CountryViewSet(AuditLoggingMixin, viewsets.ModelViewSet):
+class CountryViewSet(AuditLoggingMixin, ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = Country.objects.all()
     serializer_class = CountrySerializer
+    etag_models = (Country,)
     logger = logger
 
 
-class CityViewSet(AuditLoggingMixin, viewsets.ModelViewSet):
+class CityViewSet(AuditLoggingMixin, ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = City.objects.select_related('country')
+    etag_models = (City, Country)
     logger = logger
 
     def get_serializer_class(self):
@@ -64,8 +82,9 @@ class CityViewSet(AuditLoggingMixin, viewsets.ModelViewSet):
             "ai_guide": guide_text
         })
 
-class AirportViewSet(AuditLoggingMixin, viewsets.ModelViewSet):
+class AirportViewSet(AuditLoggingMixin, ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = Airport.objects.select_related('city__country')
+    etag_models = (Airport, City, Country)
     logger = logger
 
     def get_serializer_class(self):
@@ -77,10 +96,32 @@ class AirportViewSet(AuditLoggingMixin, viewsets.ModelViewSet):
 
         return AirportCreateSerializer
 
+    @action(detail=True, methods=['GET'], url_path='board')
+    def board(self, request, pk=None):
+        """
+        GET /api/v1/airports/{id}/board/?limit=10
+        Next departing and arriving flights, served from per-airport cache
+        """
+        params = AirportBoardSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        limit = params.validated_data['limit']
+
+        board = get_cached_board(pk)
+        if board is None:
+            board = build_airport_board(self.get_object())
+            cache_board(board)
+
+        return Response({
+            **board,
+            'departures': board['departures'][:limit],
+            'arrivals': board['arrivals'][:limit],
+        })
+
 
 
-class AirlineViewSet(AuditLoggingMixin, viewsets.ModelViewSet):
-    queryset = Airline.objects.all()
+class AirlineViewSet(AuditLoggingMixin, ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
+    queryset = Airline.objects.select_related('home_base__city__country')
+    etag_models = (Airline, Airport, City, Country)
     logger = logger
 
     def get_serializer_class(self):
@@ -89,14 +130,16 @@ class AirlineViewSet(AuditLoggingMixin, viewsets.ModelViewSet):
         return AirlineSerializer
 
 
-class AirplaneTypeViewSet(AuditLoggingMixin, viewsets.ModelViewSet):
+class AirplaneTypeViewSet(AuditLoggingMixin, ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = AirplaneType.objects.all()
     serializer_class = AirplaneTypeSerializer
     permission_classes = [permissions.IsAdminUser]
+    # Capacity is counted from seats
+    etag_models = (AirplaneType, Seat)
     logger = logger
 
 
-class SeatViewSet(viewsets.ReadOnlyModelViewSet):
+class SeatViewSet(SparseFieldsViewMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Seat.objects.all()
     serializer_class = SeatSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -104,8 +147,11 @@ class SeatViewSet(viewsets.ReadOnlyModelViewSet):
     logger = logger
 
 
-class AirplaneViewSet(AuditLoggingMixin, viewsets.ModelViewSet):
-    queryset = Airplane.objects.select_related('airline', 'airplane_type')
+class AirplaneViewSet(AuditLoggingMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
+    queryset = Airplane.objects.select_related(
+        'airline__home_base__city__country',
+        'airplane_type'
+    )
     logger = logger
 
     def get_serializer_class(self):
@@ -114,15 +160,17 @@ class AirplaneViewSet(AuditLoggingMixin, viewsets.ModelViewSet):
         return AirplaneCreateSerializer
 
 
-class FlightViewSet(AuditLoggingMixin, viewsets.ModelViewSet):
-    queryset = Flight.objects.select_related(
+class FlightViewSet(AuditLoggingMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
+    queryset = Flight.objects.with_available_seats().select_related(
         'departure_airport__city__country',
         'arrival_airport__city__country',
-        'airplane__airline',
+        'airplane__airline__home_base__city__country',
         'airplane__airplane_type'
     )
 
     filterset_class = FlightFilter
+    pagination_class = OptionalKeysetPagination
+    keyset_ordering = ('departure_time', 'id')
 
     logger = logger
 
@@ -131,5 +179,135 @@ class FlightViewSet(AuditLoggingMixin, viewsets.ModelViewSet):
             return FlightSerializer
         return FlightCreateSerializer
 
+    def get_queryset(self):
+        if self.action == 'seatmap':
+            # Seat map needs only the airplane, skip the heavy joins
+            return Flight.objects.select_related('airplane')
+        if self.action == 'manifest':
+            return Flight.objects.only('id', 'flight_number')
+        return super().get_queryset()
 
+    @action(detail=True, methods=['GET'], url_path='seatmap')
+    def seatmap(self, request, pk=None):
+        """
+        GET /api/v1/flights/{id}/seatmap/
+        Whole seat grid of the flight, each seat marked free, held or taken
+        """
+        flight = self.get_object()
+        return Response(build_seat_map(flight))
+
+    @action(
+        detail=True,
+        methods=['GET'],
+        url_path='manifest',
+        permission_classes=[permissions.IsAdminUser],
+        renderer_classes=[StreamingJSONRenderer, CSVRenderer, NDJSONRenderer],
+    )
+    def manifest(self, request, pk=None):
+        """
+        GET /api/v1/flights/{id}/manifest/?format=json|csv|ndjson
+        Passenger list sorted by seat (for admins), streamed from the DB
+        """
+        flight = self.get_object()
+        renderer = request.accepted_renderer
+
+        response = StreamingHttpResponse(
+            renderer.stream(get_manifest_rows(flight.id), MANIFEST_FIELDS),
+            content_type=renderer.media_type,
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="manifest-{flight.flight_number}.{renderer.format}"'
+        )
+        return response
+
+    @action(
+        detail=False,
+        methods=['POST'],
+        url_path='import',
+        permission_classes=[permissions.IsAdminUser],
+        parser_classes=[MultiPartParser],
+        serializer_class=ScheduleImportSerializer,
+    )
+    def import_schedule(self, request):
+        """
+        POST /api/v1/flights/import/ (multipart: file, format, dry_run)
+        Create or update flights from a CSV or NDJSON schedule (for admins).
+        Returns counts and the rejected rows
+        """
+        params = ScheduleImportSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+
+        stream = io.TextIOWrapper(data['file'].file, encoding='utf-8-sig', newline='')
+        try:
+            result = import_schedule(
+                read_schedule(stream, data['format']),
+                dry_run=data['dry_run'],
+            )
+        except UnicodeDecodeError as exc:
+            raise exceptions.ValidationError({'file': 'The file must be UTF-8 text.'}) from exc
+
+        logger.info(
+            f"{self.get_user_str()} imported schedule {data['file'].name}: "
+            f"{result['created']} created, {result['updated']} updated, "
+            f"{len(result['rejected'])} rejected"
+        )
+        return Response(result)
+
+    @action(detail=False, methods=['GET'], url_path='connections')
+    def connections(self, request):
+        """
+        GET /api/v1/flights/connections/?from=KBP&to=WAW&date=2026-11-01
+        Direct flights and itineraries with up to two connections
+        """
+        params = ConnectionSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+
+        depart_from = timezone.make_aware(datetime.combine(data['date'], time.min))
+        itineraries = flight_graph.search(
+            origin_id=data['from'].id,
+            destination_id=data['to'].id,
+            depart_from=depart_from,
+            depart_until=depart_from + timedelta(days=1),
+            max_connections=data['max_connections'],
+            min_connection=data['min_connection'] * 60,
+            max_connection=data['max_connection'] * 60,
+            limit=data['limit'],
+        )
+
+        # Load all flights of the found itineraries in one query
+        flight_ids = {leg[2] for legs in itineraries for leg in legs}
+        flights = self.get_queryset().in_bulk(flight_ids)
+
+        results = []
+        for legs in itineraries:
+            # Index of this worker may still have a flight deleted since
+            if any(leg[2] not in flights for leg in legs):
+                continue
+            departure, arrival = flights[legs[0][2]], flights[legs[-1][2]]
+            results.append({
+                'departure_time': departure.departure_time,
+                'arrival_time': arrival.arrival_time,
+                'duration_minutes': int(
+                    (arrival.arrival_time - departure.departure_time).total_seconds() // 60
+                ),
+                'connections': len(legs) - 1,
+                'flights': FlightSerializer(
+                    [flights[leg[2]] for leg in legs], many=True
+                ).data,
+            })
+
+        return Response(results)
+
+    @action(detail=False, methods=['GET'], url_path='fare-calendar')
+    def fare_calendar(self, request):
+        """
+        GET /api/v1/flights/fare-calendar/?from=KBP&to=WAW&month=2026-11
+        Lowest fare and number of flights with free seats for every day
+        """
+        params = FareCalendarSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
 
+        return Response(get_fare_calendar(data['from'], data['to'], data['month']))
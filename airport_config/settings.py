@@ -46,6 +46,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'rest_framework',
     'django_filters',
@@ -154,6 +155,19 @@ REST_FRAMEWORK = {
 
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 
+    # orjson for JSON, MessagePack only when asked for (core/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'core.renderers.MessagePackRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+        'core.renderers.MessagePackParser',
+    ],
+
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
 
@@ -162,6 +176,34 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Shared cache: seat holds, versions, boards. Redis when REDIS_URL is set,
+# otherwise per-process local memory (dev and tests only)
+REDIS_URL = os.getenv('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Unpaid orders are cancelled after this (booking/expiry.py)
+ORDER_PENDING_TIMEOUT_MINUTES = int(os.getenv('ORDER_PENDING_TIMEOUT_MINUTES', 30))
+
+# Seat holds (booking/holds.py)
+SEAT_HOLD_MINUTES = int(os.getenv('SEAT_HOLD_MINUTES', 10))
+SEAT_HOLD_MAX_MINUTES = int(os.getenv('SEAT_HOLD_MAX_MINUTES', 20))
+SEAT_HOLD_MAX_SEATS = 9
+# All active holds of one user on one flight together
+SEAT_HOLD_MAX_SEATS_PER_FLIGHT = int(os.getenv('SEAT_HOLD_MAX_SEATS_PER_FLIGHT', 9))
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=7),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=30),
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Order, Ticket
+from .models import FlightInventory, Order, StripeEvent, Ticket
 
 
 class TicketInline(admin.TabularInline):
@@ -17,8 +17,10 @@ class TicketInline(admin.TabularInline):
         "passenger_first_name",
         "passenger_last_name",
         "seat",
+        "price",
         "status"
     )
+    readonly_fields = ("price",)
 
 
 @admin.register(Order)
@@ -46,6 +48,7 @@ class TicketAdmin(admin.ModelAdmin):
         "get_passenger_name",
         "flight",
         "seat",
+        "price",
         "status"
     )
     list_filter = ("status", "flight__departure_time")
@@ -65,4 +68,20 @@ class TicketAdmin(admin.ModelAdmin):
 
     @admin.display(description="Passenger")
     def get_passenger_name(self, obj):
-        return f"{obj.passenger_first_name} {obj.passenger_last_name}"
\ No newline at end of file
+        return f"{obj.passenger_first_name} {obj.passenger_last_name}"
+
+
+@admin.register(FlightInventory)
+class FlightInventoryAdmin(admin.ModelAdmin):
+    list_display = ("flight", "cabin", "total", "sold", "held")
+    list_filter = ("cabin",)
+    search_fields = ("flight__flight_number",)
+    autocomplete_fields = ("flight",)
+
+
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    list_display = ("event_id", "type", "received_at", "processed_at", "error")
+    list_filter = ("type", "processed_at")
+    search_fields = ("event_id",)
+    readonly_fields = ("event_id", "type", "payload", "received_at", "processed_at", "error")
@@ -0,0 +1,420 @@
+import csv
+import io
+import itertools
+import random
+import string
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+
+from airport.connections import flight_graph
+from airport.models import (
+    Airline, Airplane, AirplaneType, Airport, City, Country, Flight, Seat
+)
+from airport.signals import seats_changed
+from core.versioning import bump_model_version
+from .inventory import reconcile_inventory
+from .models import Order, Ticket, Transaction
+
+
+# name, rows, seat letters, first class rows, business rows (after first)
+AIRPLANE_BLUEPRINTS = (
+    ("Regional 76", 19, "ABCD", 0, 2),
+    ("Narrow-body 150", 25, "ABCDEF", 0, 3),
+    ("Narrow-body 186", 31, "ABCDEF", 0, 4),
+    ("Wide-body 300", 30, "ABCDEFGHJK", 2, 5),
+    ("Wide-body 400", 40, "ABCDEFGHJK", 2, 6),
+    ("Double-deck 550", 55, "ABCDEFGHJK", 2, 8),
+)
+NAME_SYLLABLES = (
+    "ka", "lo", "ve", "ri", "sa", "mon", "dra", "tel", "vi", "no",
+    "ber", "ga", "lis", "to", "ran", "mi", "zu", "pe", "cor", "ta",
+)
+FIRST_NAMES = (
+    "Olena", "Andrii", "Maria", "Taras", "Anna", "Ivan", "Sofia", "Petro",
+    "Emma", "Lucas", "Mia", "Noah", "Zofia", "Jakub", "Lena", "Marco",
+)
+LAST_NAMES = (
+    "Shevchenko", "Kovalenko", "Bondarenko", "Tkachenko", "Kravets", "Melnyk",
+    "Nowak", "Kowalski", "Muller", "Schmidt", "Rossi", "Garcia", "Smith", "Brown",
+)
+ORDER_SIZES = ((1, 50), (2, 25), (3, 15), (4, 10))
+ORDER_STATUSES = (
+    (Order.Status.PAID, 75),
+    (Order.Status.PENDING, 5),
+    (Order.Status.CANCELLED, 20),
+)
+USERNAME_PREFIX = "passenger"
+# Orders are placed in a window ending this long before the first flight
+# day: with the default --start (tomorrow) they and their payments (up to
+# 20 minutes later) are in the past, and the window depends on --start only
+BOOKING_WINDOW = timedelta(days=90)
+BOOKED_BEFORE_START = timedelta(days=1, minutes=30)
+MIN_BOOKING_LEAD = timedelta(hours=1)
+
+
+def _weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+def _make_name(rng, taken, syllables=(2, 3)):
+    while True:
+        name = "".join(
+            rng.choice(NAME_SYLLABLES) for _ in range(rng.randint(*syllables))
+        ).capitalize()
+        if name not in taken:
+            taken.add(name)
+            return name
+
+
+def _free_codes(rng, length, count, taken):
+    """
+    count random uppercase codes (IATA-like) that are not taken yet
+    """
+    codes = ["".join(letters) for letters in itertools.product(string.ascii_uppercase, repeat=length)]
+    rng.shuffle(codes)
+    free = [code for code in codes if code not in taken][:count]
+    if len(free) < count:
+        raise ValueError(f"Only {len(free)} free {length}-letter codes left, {count} needed.")
+    return free
+
+
+def copy_rows(cursor, model, fields, rows):
+    """
+    COPY ... FROM STDIN of rows (tuples in 'fields' order) into the model table
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(
+            r'\N' if value is None
+            else value.isoformat() if isinstance(value, datetime)
+            else value
+            for value in row
+        )
+    buffer.seek(0)
+
+    columns = ", ".join(
+        connection.ops.quote_name(model._meta.get_field(name).column) for name in fields
+    )
+    cursor.copy_expert(
+        f"COPY {connection.ops.quote_name(model._meta.db_table)} ({columns}) "
+        f"FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+        buffer,
+    )
+
+
+def reserve_ids(model, count):
+    """
+    First of 'count' consecutive ids taken from the table sequence,
+    rows can then be written with known ids (COPY returns nothing)
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [model._meta.db_table])
+        sequence = cursor.fetchone()[0]
+        cursor.execute("SELECT setval(%s, nextval(%s) + %s - 1)", [sequence, sequence, count])
+        last = cursor.fetchone()[0]
+    return last - count + 1
+
+
+def generate_world(rng, countries, cities_per_country, airlines, fleet_size, users, batch_size):
+    """
+    Countries, cities with one airport each, airplane types with seat
+    layouts, airlines with fleets and users. Returns ids the flights and
+    bookings are built from
+    """
+    taken = set(Country.objects.values_list("name", flat=True))
+    country_objs = Country.objects.bulk_create(
+        [Country(name=_make_name(rng, taken)) for _ in range(countries)],
+        batch_size=batch_size,
+    )
+
+    city_objs = []
+    for country in country_objs:
+        taken = set()
+        city_objs += [
+            City(name=_make_name(rng, taken), country=country)
+            for _ in range(cities_per_country)
+        ]
+    City.objects.bulk_create(city_objs, batch_size=batch_size)
+
+    codes = _free_codes(
+        rng, 3, len(city_objs), set(Airport.objects.values_list("iata_code", flat=True))
+    )
+    airport_objs = Airport.objects.bulk_create(
+        [
+            Airport(name=f"{city.name} International", iata_code=code, city=city)
+            for city, code in zip(city_objs, codes)
+        ],
+        batch_size=batch_size,
+    )
+    airport_ids = [airport.id for airport in airport_objs]
+
+    layouts = {}
+    for name, rows, letters, first_rows, business_rows in AIRPLANE_BLUEPRINTS:
+        airplane_type, _ = AirplaneType.objects.get_or_create(name=f"{name} (generated)")
+        if not airplane_type.seats.exists():
+            Seat.objects.bulk_create([
+                Seat(
+                    airplane_type=airplane_type,
+                    row=row,
+                    seat=letter,
+                    seat_type=(
+                        Seat.SeatType.FIRST if row <= first_rows
+                        else Seat.SeatType.BUSINESS if row <= first_rows + business_rows
+                        else Seat.SeatType.ECONOMY
+                    ),
+                )
+                for row in range(1, rows + 1)
+                for letter in letters
+            ])
+            # bulk_create sends no signals
+            seats_changed(airplane_type.id)
+        layouts[airplane_type.id] = list(
+            airplane_type.seats.order_by("row", "seat").values_list("id", flat=True)
+        )
+
+    # Two-letter airline codes start flight numbers, skip ones already in use
+    used_prefixes = {
+        number[:2] for number in Flight.objects.values_list("flight_number", flat=True)
+    }
+    airline_codes = _free_codes(rng, 2, airlines, used_prefixes)
+    taken = {name.split()[0] for name in Airline.objects.values_list("name", flat=True)}
+    airline_objs = Airline.objects.bulk_create(
+        [
+            Airline(
+                name=f"{_make_name(rng, taken)} {rng.choice(('Air', 'Airways', 'Airlines'))}",
+                home_base_id=rng.choice(airport_ids),
+            )
+            for _ in range(airlines)
+        ],
+        batch_size=batch_size,
+    )
+
+    type_ids = sorted(layouts)
+    airplane_objs = []
+    for airline, code in zip(airline_objs, airline_codes):
+        airplane_objs += [
+            Airplane(
+                name=f"{code}-{number:04d}",
+                airplane_type_id=rng.choice(type_ids),
+                airline=airline,
+            )
+            for number in range(1, fleet_size + 1)
+        ]
+    Airplane.objects.bulk_create(airplane_objs, batch_size=batch_size)
+
+    User = get_user_model()
+    first_user = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+    user_objs = User.objects.bulk_create(
+        [
+            User(
+                username=f"{USERNAME_PREFIX}{number}",
+                email=f"{USERNAME_PREFIX}{number}@example.com",
+                first_name=rng.choice(FIRST_NAMES),
+                last_name=rng.choice(LAST_NAMES),
+                password="!",   # unusable, tests authenticate directly
+            )
+            for number in range(first_user, first_user + users)
+        ],
+        batch_size=batch_size,
+    )
+
+    return {
+        "airport_ids": airport_ids,
+        "airlines": [
+            (
+                code,
+                airline.home_base_id,
+                [airplane for airplane in airplane_objs if airplane.airline_id == airline.id],
+            )
+            for airline, code in zip(airline_objs, airline_codes)
+        ],
+        "layouts": layouts,
+        "user_ids": [user.id for user in user_objs],
+    }
+
+
+def generate_flights(rng, world, start, days, flights_per_day, batch_size):
+    """
+    flights_per_day flights a day from 'start', half of them out of the
+    airline home base. Returns [(id, airplane type id, price, departure_time)]
+    """
+    airport_ids = world["airport_ids"]
+    route_minutes = {}
+    route_prices = {}
+    numbers = {}
+
+    flight_objs = []
+    for day in range(days):
+        midnight = start + timedelta(days=day)
+        for _ in range(flights_per_day):
+            code, home_base, fleet = rng.choice(world["airlines"])
+            airplane = rng.choice(fleet)
+            origin = home_base if rng.random() < 0.5 else rng.choice(airport_ids)
+            destination = rng.choice([airport for airport in airport_ids if airport != origin])
+
+            route = (origin, destination)
+            if route not in route_minutes:
+                route_minutes[route] = rng.randint(50, 720)
+                route_prices[route] = rng.randint(40, 900)
+
+            numbers[code] = numbers.get(code, 0) + 1
+            departure = midnight + timedelta(minutes=rng.randrange(0, 24 * 60, 5))
+            flight_objs.append(Flight(
+                flight_number=f"{code}{numbers[code]:04d}",
+                departure_airport_id=origin,
+                arrival_airport_id=destination,
+                departure_time=departure,
+                arrival_time=departure + timedelta(minutes=route_minutes[route]),
+                airplane=airplane,
+                status=Flight.Status.CANCELLED if rng.random() < 0.01 else Flight.Status.SCHEDULED,
+                price=(Decimal(route_prices[route]) * Decimal(rng.uniform(0.8, 1.3))).quantize(
+                    Decimal("0.01")
+                ),
+            ))
+
+    Flight.objects.bulk_create(flight_objs, batch_size=batch_size)
+    return [
+        (flight.id, flight.airplane.airplane_type_id, flight.price, flight.departure_time)
+        for flight in flight_objs
+    ]
+
+
+# Set once per process, workers inherit them on fork
+_booking_context = {}
+
+
+def init_booking_worker(context):
+    _booking_context.update(context)
+
+
+def generate_bookings(task):
+    """
+    Orders, tickets and transactions of one chunk of flights, written with
+    COPY in one transaction. Ids come from ranges reserved for the chunk
+    and the random generator is seeded per chunk, so the result does not
+    depend on how many workers run or in which order
+    """
+    chunk_index, flights, order_id, ticket_id, transaction_id = task
+    context = _booking_context
+    rng = random.Random(f"{context['seed']}:{chunk_index}")
+    layouts = context["layouts"]
+    user_ids = context["user_ids"]
+
+    first_booking = context["start"] - BOOKING_WINDOW
+    last_booking = context["start"] - BOOKED_BEFORE_START
+
+    orders, tickets, transactions = [], [], []
+    for flight_id, airplane_type_id, price, departure in flights:
+        booking_minutes = int(
+            (min(departure - MIN_BOOKING_LEAD, last_booking) - first_booking).total_seconds() // 60
+        )
+        layout = layouts[airplane_type_id]
+        load = min(max(rng.gauss(context["load_factor"], 0.15), 0), 1)
+        seats = rng.sample(layout, int(len(layout) * load))
+
+        position = 0
+        while position < len(seats):
+            size = _weighted(rng, ORDER_SIZES)
+            order_seats = seats[position:position + size]
+            position += size
+
+            status = _weighted(rng, ORDER_STATUSES)
+            created_at = first_booking + timedelta(minutes=rng.randint(0, booking_minutes))
+            orders.append((order_id, rng.choice(user_ids), created_at, status))
+
+            ticket_status = (
+                Ticket.Status.CANCELLED if status == Order.Status.CANCELLED
+                else Ticket.Status.BOOKED
+            )
+            for seat_id in order_seats:
+                tickets.append((
+                    ticket_id, order_id, flight_id,
+                    rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES),
+                    seat_id, price, ticket_status,
+                ))
+                ticket_id += 1
+
+            tx_status = {
+                Order.Status.PAID: Transaction.Status.SUCCESS,
+                Order.Status.PENDING: Transaction.Status.PENDING,
+                Order.Status.CANCELLED: Transaction.Status.FAILED,
+            }[status]
+            # Some cancelled/pending orders never reached the payment page
+            if status == Order.Status.PAID or rng.random() < 0.5:
+                paid_at = created_at + timedelta(minutes=rng.randint(1, 20))
+                transactions.append((
+                    transaction_id, order_id, price * len(order_seats), "usd", tx_status,
+                    f"pi_gen{transaction_id}" if status == Order.Status.PAID else None,
+                    Transaction.CheckoutStatus.READY, f"cs_gen{transaction_id}", "", "",
+                    created_at, paid_at,
+                ))
+                transaction_id += 1
+
+            order_id += 1
+
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            copy_rows(cursor, Order, ("id", "user", "created_at", "status"), orders)
+            copy_rows(
+                cursor, Ticket,
+                ("id", "order", "flight", "passenger_first_name", "passenger_last_name",
+                 "seat", "price", "status"),
+                tickets,
+            )
+            copy_rows(
+                cursor, Transaction,
+                ("id", "order", "amount", "currency", "status", "provider_transaction_id",
+                 "checkout_status", "checkout_session_id", "checkout_url", "checkout_error",
+                 "created_at", "updated_at"),
+                transactions,
+            )
+    finally:
+        if context.get("close_connection"):
+            connection.close()
+
+    return len(orders), len(tickets), len(transactions)
+
+
+def plan_booking_tasks(flights, layouts, chunk_flights):
+    """
+    Chunks of flights with id ranges big enough for any load factor:
+    at most one order, ticket and transaction per seat
+    """
+    chunks = [flights[start:start + chunk_flights] for start in range(0, len(flights), chunk_flights)]
+    sizes = [sum(len(layouts[flight[1]]) for flight in chunk) for chunk in chunks]
+    total = sum(sizes)
+
+    bases = {model: reserve_ids(model, total) if total else 0 for model in (Order, Ticket, Transaction)}
+    tasks = []
+    offset = 0
+    for index, (chunk, size) in enumerate(zip(chunks, sizes)):
+        tasks.append((
+            index, chunk,
+            bases[Order] + offset, bases[Ticket] + offset, bases[Transaction] + offset,
+        ))
+        offset += size
+    return tasks
+
+
+def finish_dataset(flight_ids, batch_size=1000):
+    """
+    Bulk writes sent no signals: count inventory of the new flights and
+    tell caches and the connection index that the data changed
+    """
+    for start in range(0, len(flight_ids), batch_size):
+        with transaction.atomic():
+            reconcile_inventory(flight_ids[start:start + batch_size])
+
+    flight_graph.record_changes(flight_ids)
+    for model in (Country, City, Airport, Airline, AirplaneType, Airplane, Seat, Flight):
+        bump_model_version(model)
+
+    with connection.cursor() as cursor:
+        for model in (Flight, Order, Ticket, Transaction):
+            cursor.execute(f"ANALYZE {connection.ops.quote_name(model._meta.db_table)}")
+
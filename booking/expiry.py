@@ -0,0 +1,86 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import CharField, Exists, OuterRef, Q
+from django.db.models.fields.json import KT
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .inventory import release_tickets
+from .models import Order, StripeEvent, Ticket, Transaction
+from .payments import CHECKOUT_SESSION_MINUTES
+
+
+logger = logging.getLogger("booking")
+
+# Stripe ends a session at checkout_expires_at and sends its webhook soon
+# after, the order is kept this long past the expiry
+SESSION_WEBHOOK_GRACE = timedelta(hours=1)
+# Queued checkout no worker has claimed yet: no session exists, a lagging
+# worker gets this long from the checkout call
+CHECKOUT_QUEUE_GRACE = timedelta(minutes=CHECKOUT_SESSION_MINUTES) + timedelta(hours=1)
+
+
+def open_checkout(now):
+    """
+    Pending transactions whose session can still be paid, or whose
+    webhook may still come
+    """
+    return Q(status=Transaction.Status.PENDING) & (
+        Q(checkout_expires_at__gte=now - SESSION_WEBHOOK_GRACE)
+        | Q(checkout_expires_at__isnull=True, created_at__gte=now - CHECKOUT_QUEUE_GRACE)
+    )
+
+
+def expire_pending_orders(batch_size=500, older_than=None):
+    """
+    Cancel one batch of abandoned PENDING orders and give their seats back.
+    Orders with an open checkout session or an unprocessed Stripe event
+    are kept. SKIP LOCKED: sweepers on several nodes take different orders,
+    and orders busy in checkout are left alone. Returns ids of cancelled orders
+    """
+    now = timezone.now()
+    older_than = older_than or timedelta(minutes=settings.ORDER_PENDING_TIMEOUT_MINUTES)
+
+    checkout = Transaction.objects.filter(open_checkout(now), order=OuterRef('pk'))
+    # Metadata values come back from Stripe as strings, compare as text
+    inbox = (
+        StripeEvent.objects
+        .filter(processed_at__isnull=True)
+        .annotate(order_ref=KT('payload__data__object__metadata__order_id'))
+        .filter(order_ref=Cast(OuterRef('pk'), CharField()))
+    )
+
+    with transaction.atomic():
+        order_ids = list(
+            Order.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=Order.Status.PENDING, created_at__lt=now - older_than)
+            .exclude(Exists(checkout))
+            .exclude(Exists(inbox))
+            .order_by('created_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        # A worker may have claimed a checkout since: the row lock waits for
+        # its claim to commit and the filter is checked on the new version
+        claimed = set(
+            Transaction.objects
+            .select_for_update()
+            .filter(open_checkout(now), order_id__in=order_ids)
+            .values_list('order_id', flat=True)
+        )
+        order_ids = [order_id for order_id in order_ids if order_id not in claimed]
+        if not order_ids:
+            return []
+
+        # Inventory first: it reads the order status to tell sold from held
+        release_tickets(Ticket.objects.filter(order_id__in=order_ids))
+        Transaction.objects.filter(
+            order_id__in=order_ids, status=Transaction.Status.PENDING
+        ).update(status=Transaction.Status.FAILED, updated_at=now)
+        Order.objects.filter(id__in=order_ids).update(status=Order.Status.CANCELLED)
+
+    logger.warning(f"Expired {len(order_ids)} unpaid orders: {order_ids}")
+    return order_ids
@@ -0,0 +1,42 @@
+import django_filters
+from .models import Order, Ticket, Transaction
+
+
+class OrderFilter(django_filters.FilterSet):
+    class Meta:
+        model = Order
+        fields = {
+            "status": ["exact"],                    # ?status=PAID
+            "created_at": ["gte", "lt"],            # ?created_at__gte=2026-10-01
+        }
+
+
+class TicketFilter(django_filters.FilterSet):
+    # Tickets have no timestamp of their own, the order's one is used
+    created_at__gte = django_filters.DateTimeFilter(
+        field_name="order__created_at",
+        lookup_expr="gte"
+    )
+
+    created_at__lt = django_filters.DateTimeFilter(
+        field_name="order__created_at",
+        lookup_expr="lt"
+    )
+
+    class Meta:
+        model = Ticket
+        fields = {
+            "status": ["exact"],
+            "flight": ["exact"],                    # ?flight=12
+            "flight__departure_time": ["gte", "lt"],
+        }
+
+
+class TransactionFilter(django_filters.FilterSet):
+    class Meta:
+        model = Transaction
+        fields = {
+            "status": ["exact"],
+            "refund_required": ["exact"],           # ?refund_required=true
+            "created_at": ["gte", "lt"],
+        }
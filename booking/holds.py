@@ -0,0 +1,188 @@
+import secrets
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Ticket
+
+
+SEAT_HOLD_KEY = "seat-hold:{flight_id}:{seat_id}"
+HOLD_KEY = "seat-hold-token:{token}"
+# Active holds of a flight: token -> (user id, number of seats, expires timestamp)
+FLIGHT_HOLDS_KEY = "seat-holds:{flight_id}"
+FLIGHT_HOLDS_LOCK_TIMEOUT = 5
+
+
+class SeatsUnavailable(Exception):
+    def __init__(self, flight_id, seat_ids):
+        self.flight_id = flight_id
+        self.seat_ids = sorted(seat_ids)
+        super().__init__(
+            f"Seats {self.seat_ids} on flight {flight_id} are taken or held by another customer."
+        )
+
+
+class HoldsBusy(Exception):
+    def __init__(self, flight_id):
+        self.flight_id = flight_id
+        super().__init__(f"Seat holds of flight {flight_id} are busy, try again in a moment.")
+
+
+class HoldLimitExceeded(Exception):
+    def __init__(self, flight_id, held, limit):
+        self.flight_id = flight_id
+        self.held = held
+        self.limit = limit
+        super().__init__(
+            f"You already hold {held} seats on flight {flight_id}, the limit is {limit}."
+        )
+
+
+def _seat_key(flight_id, seat_id):
+    return SEAT_HOLD_KEY.format(flight_id=flight_id, seat_id=seat_id)
+
+
+def _drop_seat_keys(flight_id, seat_ids, token):
+    """
+    Delete seat keys that still point to this hold
+    """
+    keys = [_seat_key(flight_id, seat_id) for seat_id in seat_ids]
+    owned = [key for key, value in cache.get_many(keys).items() if value == token]
+    cache.delete_many(owned)
+
+
+def _active(holds):
+    now = time.time()
+    return {
+        token: hold for token, hold in holds.items()
+        if hold[2] > now
+    }
+
+
+@contextmanager
+def _flight_holds(flight_id):
+    """
+    Active holds of a flight, changes are saved on exit.
+    A short cache lock keeps concurrent holds from losing each other,
+    HoldsBusy if it cannot be taken in time
+    """
+    key = FLIGHT_HOLDS_KEY.format(flight_id=flight_id)
+    lock_key = f"{key}:lock"
+    owner = secrets.token_urlsafe(8)
+    # The lock of a dead request expires before the deadline
+    deadline = time.monotonic() + FLIGHT_HOLDS_LOCK_TIMEOUT
+    while not cache.add(lock_key, owner, FLIGHT_HOLDS_LOCK_TIMEOUT):
+        if time.monotonic() > deadline:
+            raise HoldsBusy(flight_id)
+        time.sleep(0.01)
+
+    try:
+        holds = _active(cache.get(key, {}))
+        yield holds
+        cache.set(key, holds, settings.SEAT_HOLD_MAX_MINUTES * 60)
+    finally:
+        # Expired while we were slow: the lock may belong to another request now
+        if cache.get(lock_key) == owner:
+            cache.delete(lock_key)
+
+
+def count_held_seats(flight_ids):
+    """
+    {flight id: seats held right now}, one round trip to the cache
+    """
+    keys = {FLIGHT_HOLDS_KEY.format(flight_id=flight_id): flight_id for flight_id in flight_ids}
+    return {
+        keys[key]: sum(count for _, count, _ in _active(holds).values())
+        for key, holds in cache.get_many(list(keys)).items()
+    }
+
+
+def create_hold(user_id, flight_id, seat_ids, minutes=None):
+    """
+    Hold seats of a flight for a few minutes.
+    One cache.add() per seat: the first customer wins, the rest get
+    SeatsUnavailable without touching the database tickets table for writes.
+    A user holds at most SEAT_HOLD_MAX_SEATS_PER_FLIGHT seats of a flight
+    """
+    minutes = minutes or settings.SEAT_HOLD_MINUTES
+    timeout = minutes * 60
+    seat_ids = sorted(set(seat_ids))
+
+    taken = set(
+        Ticket.objects
+        .filter(flight_id=flight_id, seat_id__in=seat_ids)
+        .exclude(status=Ticket.Status.CANCELLED)
+        .values_list('seat_id', flat=True)
+    )
+    if taken:
+        raise SeatsUnavailable(flight_id, taken)
+
+    token = secrets.token_urlsafe(16)
+    expires_at = timezone.now() + timedelta(minutes=minutes)
+    limit = settings.SEAT_HOLD_MAX_SEATS_PER_FLIGHT
+
+    with _flight_holds(flight_id) as holds:
+        held = sum(count for user, count, _ in holds.values() if user == user_id)
+        if held + len(seat_ids) > limit:
+            raise HoldLimitExceeded(flight_id, held, limit)
+
+        added, conflicts = [], []
+        for seat_id in seat_ids:
+            if cache.add(_seat_key(flight_id, seat_id), token, timeout):
+                added.append(seat_id)
+            else:
+                conflicts.append(seat_id)
+
+        if conflicts:
+            _drop_seat_keys(flight_id, added, token)
+            raise SeatsUnavailable(flight_id, conflicts)
+
+        holds[token] = (user_id, len(seat_ids), expires_at.timestamp())
+
+    hold = {
+        'token': token,
+        'user': user_id,
+        'flight': flight_id,
+        'seats': seat_ids,
+        'expires_at': expires_at,
+    }
+    cache.set(HOLD_KEY.format(token=token), hold, timeout)
+    return hold
+
+
+def get_hold(token):
+    """
+    Hold by token, None once it expired or was released
+    """
+    if not token:
+        return None
+    return cache.get(HOLD_KEY.format(token=token))
+
+
+def release_hold(token):
+    hold = get_hold(token)
+    if hold is None:
+        return False
+
+    with _flight_holds(hold['flight']) as holds:
+        holds.pop(token, None)
+    _drop_seat_keys(hold['flight'], hold['seats'], token)
+    cache.delete(HOLD_KEY.format(token=token))
+    return True
+
+
+def get_held_seat_ids(flight_id, seat_ids, exclude_tokens=()):
+    """
+    Seats held right now, skipping holds listed in exclude_tokens.
+    One round trip to the cache
+    """
+    keys = {_seat_key(flight_id, seat_id): seat_id for seat_id in seat_ids}
+    return {
+        keys[key]
+        for key, token in cache.get_many(list(keys)).items()
+        if token not in exclude_tokens
+    }
@@ -0,0 +1,236 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count
+
+from airport.fare_calendar import invalidate_fare_calendar_for_flights
+from airport.models import Flight, Seat
+from .models import FlightInventory, Order, Ticket
+
+
+CABIN_TOTAL_FIELDS = {
+    Seat.SeatType.ECONOMY: 'airplane__airplane_type__economy_seats',
+    Seat.SeatType.BUSINESS: 'airplane__airplane_type__business_seats',
+    Seat.SeatType.FIRST: 'airplane__airplane_type__first_seats',
+}
+
+
+class NotEnoughSeats(Exception):
+    def __init__(self, flight_id, cabin, requested, available):
+        self.flight_id = flight_id
+        self.cabin = cabin
+        self.requested = requested
+        self.available = available
+        super().__init__(
+            f"Not enough {cabin.lower()} seats on flight {flight_id}: "
+            f"requested {requested}, available {available}."
+        )
+
+
+def build_inventory_rows(flight_ids):
+    """
+    Inventory rows counted from scratch:
+    totals from airplane types, sold/held from active tickets
+    """
+    flights = (
+        Flight.objects
+        .filter(id__in=flight_ids)
+        .values_list('id', *CABIN_TOTAL_FIELDS.values())
+    )
+
+    counts = Counter()
+    tickets = (
+        Ticket.objects
+        .filter(flight_id__in=flight_ids)
+        .exclude(status=Ticket.Status.CANCELLED)
+        .order_by()
+        .values('flight_id', 'seat__seat_type', 'order__status')
+        .annotate(total=Count('id'))
+    )
+    for row in tickets:
+        counter = 'sold' if row['order__status'] == Order.Status.PAID else 'held'
+        counts[(row['flight_id'], row['seat__seat_type'], counter)] += row['total']
+
+    rows = []
+    for flight_id, *totals in flights:
+        for cabin, total in zip(CABIN_TOTAL_FIELDS, totals):
+            rows.append(FlightInventory(
+                flight_id=flight_id,
+                cabin=cabin,
+                total=total,
+                sold=counts[(flight_id, cabin, 'sold')],
+                held=counts[(flight_id, cabin, 'held')],
+            ))
+    return rows
+
+
+def reconcile_inventory(flight_ids):
+    """
+    Overwrite inventory of the flights with freshly counted rows.
+    Rows are locked before counting: a booking in flight commits first
+    and is counted, instead of being overwritten with stale numbers
+    """
+    with transaction.atomic():
+        ensure_inventory(flight_ids)
+        list(
+            FlightInventory.objects
+            .select_for_update()
+            .filter(flight_id__in=flight_ids)
+            .order_by('id')
+            .values_list('id', flat=True)
+        )
+        rows = build_inventory_rows(flight_ids)
+        FlightInventory.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['flight', 'cabin'],
+            update_fields=['total', 'sold', 'held'],
+        )
+    return rows
+
+
+def ensure_inventory(flight_ids):
+    """
+    Create inventory of flights that have none yet
+    """
+    existing = set(
+        FlightInventory.objects
+        .filter(flight_id__in=flight_ids)
+        .values_list('flight_id', flat=True)
+    )
+    missing = set(flight_ids) - existing
+    if missing:
+        FlightInventory.objects.bulk_create(
+            build_inventory_rows(missing),
+            ignore_conflicts=True
+        )
+
+
+def refresh_inventory_totals(flights):
+    """
+    Update totals after the airplane (type) of flights changed
+    """
+    rows = [
+        FlightInventory(flight_id=flight_id, cabin=cabin, total=total)
+        for flight_id, *totals in flights.values_list('id', *CABIN_TOTAL_FIELDS.values())
+        for cabin, total in zip(CABIN_TOTAL_FIELDS, totals)
+    ]
+    FlightInventory.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['flight', 'cabin'],
+        update_fields=['total'],
+    )
+
+
+def _lock_rows(keys):
+    """
+    SELECT ... FOR UPDATE of (flight, cabin) rows, in id order against deadlocks
+    """
+    flight_ids = {flight_id for flight_id, _ in keys}
+    cabins = {cabin for _, cabin in keys}
+    rows = (
+        FlightInventory.objects
+        .select_for_update()
+        .filter(flight_id__in=flight_ids, cabin__in=cabins)
+        .order_by('id')
+    )
+    return {(row.flight_id, row.cabin): row for row in rows}
+
+
+def reserve_seats(seat_counts):
+    """
+    Hold seats for a new order, seat_counts: {(flight_id, cabin): count}.
+    Must run inside transaction.atomic(), rows stay locked until commit
+    """
+    ensure_inventory({flight_id for flight_id, _ in seat_counts})
+    rows = _lock_rows(seat_counts)
+
+    sold_out = set()
+    for (flight_id, cabin), count in seat_counts.items():
+        row = rows.get((flight_id, cabin))
+        available = row.available if row else 0
+        if available < count:
+            raise NotEnoughSeats(flight_id, cabin, count, available)
+        row.held += count
+        if row.available == 0:
+            sold_out.add(flight_id)
+
+    FlightInventory.objects.bulk_update(
+        [rows[key] for key in seat_counts], ['held']
+    )
+    _availability_changed(sold_out)
+
+
+def _availability_changed(flight_ids):
+    """
+    A cabin ran out of seats or got seats back: fare calendar shows that
+    """
+    if flight_ids:
+        transaction.on_commit(lambda: invalidate_fare_calendar_for_flights(flight_ids))
+
+
+def _ticket_counts(tickets):
+    """
+    {(flight_id, cabin, order_status): count} of active tickets
+    """
+    rows = (
+        tickets
+        .exclude(status=Ticket.Status.CANCELLED)
+        .order_by()
+        .values('flight_id', 'seat__seat_type', 'order__status')
+        .annotate(total=Count('id'))
+    )
+    return {
+        (row['flight_id'], row['seat__seat_type'], row['order__status']): row['total']
+        for row in rows
+    }
+
+
+def release_tickets(tickets):
+    """
+    Cancel tickets and give their seats back to inventory, set-based.
+    Call before the order status is changed, it decides sold vs held
+    """
+    counts = _ticket_counts(tickets)
+    if not counts:
+        return 0
+
+    rows = _lock_rows({(flight_id, cabin) for flight_id, cabin, _ in counts})
+    reopened = set()
+    for (flight_id, cabin, order_status), count in counts.items():
+        row = rows.get((flight_id, cabin))
+        if row is None:
+            continue
+        if row.available == 0:
+            reopened.add(flight_id)
+        if order_status == Order.Status.PAID:
+            row.sold = max(row.sold - count, 0)
+        else:
+            row.held = max(row.held - count, 0)
+
+    FlightInventory.objects.bulk_update(rows.values(), ['sold', 'held'])
+    _availability_changed(reopened)
+    return tickets.exclude(status=Ticket.Status.CANCELLED).update(
+        status=Ticket.Status.CANCELLED
+    )
+
+
+def confirm_tickets(tickets):
+    """
+    Move seats of tickets from held to sold once the order is paid.
+    Call before the order status is changed to PAID
+    """
+    counts = _ticket_counts(tickets)
+    if not counts:
+        return
+
+    rows = _lock_rows({(flight_id, cabin) for flight_id, cabin, _ in counts})
+    for (flight_id, cabin, order_status), count in counts.items():
+        row = rows.get((flight_id, cabin))
+        if row is None or order_status == Order.Status.PAID:
+            continue
+        row.held = max(row.held - count, 0)
+        row.sold += count
+
+    FlightInventory.objects.bulk_update(rows.values(), ['sold', 'held'])
@@ -0,0 +1,70 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from booking.expiry import expire_pending_orders
+
+
+logger = logging.getLogger("booking")
+
+
+class Command(BaseCommand):
+    help = "Cancels PENDING orders that were not paid in time and releases their seats."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Orders per transaction",
+        )
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            help="Minutes since order creation (default ORDER_PENDING_TIMEOUT_MINUTES)",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep sweeping instead of exiting when nothing is left",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=60,
+            help="Seconds between sweeps with --loop",
+        )
+
+    def handle(self, *args, **options):
+        older_than = (
+            timedelta(minutes=options["older_than"])
+            if options["older_than"] is not None else None
+        )
+
+        total = 0
+        while True:
+            close_old_connections()
+            try:
+                expired = expire_pending_orders(options["batch_size"], older_than)
+            except Exception as e:
+                if not options["loop"]:
+                    raise
+                # One failed sweep must not stop the sweeper, try again next time
+                logger.error(f"Order sweep failed: {e}", exc_info=True)
+                close_old_connections()
+                time.sleep(options["sleep"])
+                continue
+            total += len(expired)
+
+            if expired:
+                self.stdout.write(f"  -> {len(expired)} orders cancelled")
+                continue
+
+            if not options["loop"]:
+                break
+            time.sleep(options["sleep"])
+
+        self.stdout.write(self.style.SUCCESS(f"Sweep complete. {total} orders cancelled."))
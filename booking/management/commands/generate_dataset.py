@@ -0,0 +1,144 @@
+import multiprocessing
+import random
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+
+from booking.dataset import (
+    finish_dataset, generate_bookings, generate_flights, generate_world,
+    init_booking_worker, plan_booking_tasks,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates a reproducible synthetic world for performance tests: countries, "
+        "airports, airlines, fleets, seat layouts, flights and their orders, tickets "
+        "and transactions. Same --seed and --start on the same database give the same data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=42, help="Random seed")
+        parser.add_argument(
+            "--start",
+            type=lambda value: datetime.strptime(value, "%Y-%m-%d").date(),
+            help="First day of flights, YYYY-MM-DD (default: tomorrow)",
+        )
+        parser.add_argument("--countries", type=int, default=10)
+        parser.add_argument("--cities-per-country", type=int, default=5, help="One airport each")
+        parser.add_argument("--airlines", type=int, default=8)
+        parser.add_argument("--fleet-size", type=int, default=25, help="Airplanes per airline")
+        parser.add_argument("--users", type=int, default=10000)
+        parser.add_argument("--days", type=int, default=90, help="Days of flights")
+        parser.add_argument("--flights-per-day", type=int, default=100)
+        parser.add_argument(
+            "--load-factor",
+            type=float,
+            default=0.7,
+            help="Average share of seats booked on a flight",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Processes writing orders/tickets/transactions",
+        )
+        parser.add_argument(
+            "--chunk-flights",
+            type=int,
+            default=200,
+            help="Flights whose bookings are written in one transaction",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000, help="bulk_create batch size")
+
+    def stage(self, name, started):
+        self.stdout.write(f"  -> {name} in {time.perf_counter() - started:.1f}s")
+        return time.perf_counter()
+
+    def handle(self, *args, **options):
+        if options["countries"] * options["cities_per_country"] < 2:
+            raise CommandError("Need at least two airports (--countries x --cities-per-country).")
+        for name in ("users", "airlines", "fleet_size", "workers", "chunk_flights"):
+            if options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} must be at least 1.")
+
+        seed = options["seed"]
+        start_date = options["start"] or timezone.localdate() + timedelta(days=1)
+        start = timezone.make_aware(datetime.combine(start_date, datetime.min.time()))
+        rng = random.Random(seed)
+
+        self.stdout.write(f"Generating dataset, seed {seed}, flights from {start_date}...")
+        began = started = time.perf_counter()
+
+        with transaction.atomic():
+            world = generate_world(
+                rng,
+                countries=options["countries"],
+                cities_per_country=options["cities_per_country"],
+                airlines=options["airlines"],
+                fleet_size=options["fleet_size"],
+                users=options["users"],
+                batch_size=options["batch_size"],
+            )
+        started = self.stage(
+            f"{len(world['airport_ids'])} airports, {len(world['airlines'])} airlines, "
+            f"{len(world['user_ids'])} users",
+            started,
+        )
+
+        with transaction.atomic():
+            flights = generate_flights(
+                rng, world, start, options["days"], options["flights_per_day"],
+                options["batch_size"],
+            )
+        started = self.stage(f"{len(flights)} flights", started)
+
+        tasks = plan_booking_tasks(flights, world["layouts"], options["chunk_flights"])
+        context = {
+            "seed": seed,
+            "layouts": world["layouts"],
+            "user_ids": world["user_ids"],
+            "load_factor": options["load_factor"],
+            "start": start,
+        }
+
+        totals = [0, 0, 0]
+        if options["workers"] == 1:
+            init_booking_worker(context)
+            results = map(generate_bookings, tasks)
+            self.add_up(totals, results, len(tasks))
+        else:
+            # Children must not share the parent's connection
+            connections.close_all()
+            pool_context = multiprocessing.get_context("fork")
+            with pool_context.Pool(
+                options["workers"],
+                initializer=init_booking_worker,
+                initargs=({**context, "close_connection": True},),
+            ) as pool:
+                self.add_up(totals, pool.imap_unordered(generate_bookings, tasks), len(tasks))
+
+        started = self.stage(
+            f"{totals[0]} orders, {totals[1]} tickets, {totals[2]} transactions",
+            started,
+        )
+
+        finish_dataset([flight[0] for flight in flights])
+        self.stage("inventory reconciled, caches invalidated", started)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Dataset complete in {time.perf_counter() - began:.1f}s. "
+                f"Reproduce with --seed {seed} --start {start_date} on the same database."
+            )
+        )
+
+    def add_up(self, totals, results, task_count):
+        for done, counts in enumerate(results, start=1):
+            for position, count in enumerate(counts):
+                totals[position] += count
+            if done % 10 == 0 or done == task_count:
+                self.stdout.write(f"     {done}/{task_count} flight chunks, {totals[1]} tickets")
@@ -0,0 +1,281 @@
+import json
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from airport.models import (
+    Airline, Airplane, AirplaneType, Airport, City, Country, Flight, Seat
+)
+from airport.signals import seats_changed
+from booking.inventory import build_inventory_rows
+from booking.models import FlightInventory, Ticket
+
+
+ORDERS_URL = "/api/v1/orders/"
+HOLDS_URL = "/api/v1/holds/"
+SEAT_LETTERS = "ABCDEF"
+
+
+def percentile(values, percent):
+    """
+    Nearest-rank percentile of sorted values
+    """
+    if not values:
+        return None
+    rank = max(int(round(percent / 100 * len(values))) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs concurrent order creation against one flight and reports throughput, "
+        "latency percentiles, conflict/error rates and overselling checks as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=20, help="Concurrent clients")
+        parser.add_argument("--requests", type=int, default=200, help="Orders attempted in total")
+        parser.add_argument(
+            "--seats",
+            type=int,
+            default=30,
+            help="Seats of the seeded flight (ignored with --flight)",
+        )
+        parser.add_argument(
+            "--tickets-per-order", type=int, default=1, help="Seats asked in one order"
+        )
+        parser.add_argument("--flight", type=int, help="Use an existing flight instead of seeding one")
+        parser.add_argument(
+            "--use-holds",
+            action="store_true",
+            help="Hold the seats first and create the order from the hold",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Random seed of seat choice")
+        parser.add_argument("--output", help="Write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("The load test needs PostgreSQL (row locks, concurrent connections).")
+
+        flight = (
+            Flight.objects.select_related("airplane__airplane_type").get(id=options["flight"])
+            if options["flight"] else self.seed_flight(options["seats"])
+        )
+        seat_ids = list(
+            Seat.objects
+            .filter(airplane_type_id=flight.airplane.airplane_type_id)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        users = self.seed_users(options["workers"])
+
+        self.stdout.write(
+            f"Flight {flight.id} ({flight.flight_number}), {len(seat_ids)} seats, "
+            f"{options['workers']} workers, {options['requests']} orders..."
+        )
+
+        results = []
+        results_lock = threading.Lock()
+        counter = iter(range(options["requests"]))
+        counter_lock = threading.Lock()
+
+        def worker(index):
+            client = APIClient()
+            client.force_authenticate(users[index])
+            rng = random.Random(options["seed"] * 1000 + index)
+            try:
+                while True:
+                    with counter_lock:
+                        if next(counter, None) is None:
+                            return
+                    seats = rng.sample(seat_ids, min(options["tickets_per_order"], len(seat_ids)))
+                    result = self.book(client, flight.id, seats, options["use_holds"])
+                    with results_lock:
+                        results.append(result)
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            list(executor.map(worker, range(options["workers"])))
+        duration = time.perf_counter() - started
+
+        report = self.build_report(flight, len(seat_ids), options, results, duration)
+
+        output = json.dumps(report, indent=2, default=str)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output)
+            self.stdout.write(f"Report written to {options['output']}")
+        else:
+            self.stdout.write(output)
+
+        style = self.style.SUCCESS if report["oversell"]["ok"] else self.style.ERROR
+        self.stdout.write(style(
+            f"{report['outcomes']['created']} orders created, "
+            f"{report['throughput_rps']} req/s, p95 {report['latency_ms']['p95']} ms, "
+            f"oversell check {'passed' if report['oversell']['ok'] else 'FAILED'}."
+        ))
+
+    def book(self, client, flight_id, seats, use_holds):
+        """
+        One attempt: (optional hold) + order, timed end to end
+        """
+        payload = {
+            "tickets": [
+                {
+                    "flight": flight_id,
+                    "seat": seat_id,
+                    "passenger_first_name": "Load",
+                    "passenger_last_name": f"Test{seat_id}",
+                }
+                for seat_id in seats
+            ]
+        }
+        started = time.perf_counter()
+        try:
+            if use_holds:
+                hold = client.post(HOLDS_URL, {"flight": flight_id, "seats": seats}, format="json")
+                if hold.status_code != 201:
+                    return {"status": hold.status_code, "latency": time.perf_counter() - started}
+                payload["holds"] = [hold.json()["token"]]
+
+            response = client.post(ORDERS_URL, payload, format="json")
+            status_code = response.status_code
+        except Exception as e:
+            self.stderr.write(f"Request failed: {e}")
+            status_code = None
+
+        return {"status": status_code, "latency": time.perf_counter() - started}
+
+    def build_report(self, flight, capacity, options, results, duration):
+        latencies = sorted(result["latency"] * 1000 for result in results)
+        created = sum(1 for result in results if result["status"] == 201)
+        # Seat taken/held/sold out answers are expected under contention
+        conflicts = sum(1 for result in results if result["status"] in (400, 409))
+        errors = len(results) - created - conflicts
+        total = len(results) or 1
+
+        return {
+            "generated_at": timezone.now().isoformat(),
+            "config": {
+                key: options[key]
+                for key in ("workers", "requests", "tickets_per_order", "use_holds", "seed")
+            },
+            "flight": flight.id,
+            "capacity": capacity,
+            "duration_s": round(duration, 3),
+            "throughput_rps": round(len(results) / duration, 2) if duration else None,
+            "latency_ms": {
+                "mean": round(statistics.fmean(latencies), 2) if latencies else None,
+                "p50": self.rounded(percentile(latencies, 50)),
+                "p95": self.rounded(percentile(latencies, 95)),
+                "p99": self.rounded(percentile(latencies, 99)),
+                "max": self.rounded(latencies[-1] if latencies else None),
+            },
+            "outcomes": {"created": created, "conflicts": conflicts, "errors": errors},
+            "conflict_rate": round(conflicts / total, 4),
+            "error_rate": round(errors / total, 4),
+            "oversell": self.check_oversell(flight, capacity),
+        }
+
+    @staticmethod
+    def rounded(value):
+        return round(value, 2) if value is not None else None
+
+    def check_oversell(self, flight, capacity):
+        """
+        Active tickets vs capacity, double-booked seats, counters vs tickets
+        """
+        active = Ticket.objects.filter(flight=flight).exclude(status=Ticket.Status.CANCELLED)
+        tickets = active.count()
+        double_booked = list(
+            active.order_by().values("seat_id")
+            .annotate(total=Count("id")).filter(total__gt=1)
+            .values_list("seat_id", flat=True)
+        )
+
+        expected = {row.cabin: row for row in build_inventory_rows([flight.id])}
+        inventory_mismatch = [
+            {
+                "cabin": row.cabin,
+                "stored": {"sold": row.sold, "held": row.held},
+                "counted": {"sold": expected[row.cabin].sold, "held": expected[row.cabin].held},
+            }
+            for row in FlightInventory.objects.filter(flight=flight)
+            if row.cabin in expected
+            and (row.sold, row.held) != (expected[row.cabin].sold, expected[row.cabin].held)
+        ]
+
+        return {
+            "tickets": tickets,
+            "capacity": capacity,
+            "double_booked_seats": double_booked,
+            "inventory_mismatch": inventory_mismatch,
+            "ok": tickets <= capacity and not double_booked and not inventory_mismatch,
+        }
+
+    @transaction.atomic
+    def seed_flight(self, seats):
+        """
+        Fresh flight on its own airplane type with the requested number of seats
+        """
+        country, _ = Country.objects.get_or_create(name="Loadtest")
+        city, _ = City.objects.get_or_create(name="Loadtest", country=country)
+        origin, _ = Airport.objects.get_or_create(
+            iata_code="LTA", defaults={"name": "Loadtest A", "city": city}
+        )
+        destination, _ = Airport.objects.get_or_create(
+            iata_code="LTB", defaults={"name": "Loadtest B", "city": city}
+        )
+        airline, _ = Airline.objects.get_or_create(
+            name="Loadtest Air", defaults={"home_base": origin}
+        )
+
+        airplane_type, created = AirplaneType.objects.get_or_create(name=f"Loadtest {seats}")
+        if created:
+            Seat.objects.bulk_create([
+                Seat(
+                    airplane_type=airplane_type,
+                    row=number // len(SEAT_LETTERS) + 1,
+                    seat=SEAT_LETTERS[number % len(SEAT_LETTERS)],
+                    seat_type=Seat.SeatType.ECONOMY,
+                )
+                for number in range(seats)
+            ])
+            seats_changed(airplane_type.id)
+
+        airplane, _ = Airplane.objects.get_or_create(
+            name=f"LT-{seats}", airplane_type=airplane_type, airline=airline
+        )
+        departure = timezone.now() + timedelta(days=30)
+        return Flight.objects.create(
+            flight_number=f"LT{int(time.time() * 10) % 10 ** 8}",
+            departure_airport=origin,
+            arrival_airport=destination,
+            departure_time=departure,
+            arrival_time=departure + timedelta(hours=2),
+            airplane=airplane,
+            price=100,
+        )
+
+    def seed_users(self, count):
+        User = get_user_model()
+        users = []
+        for index in range(count):
+            user, created = User.objects.get_or_create(username=f"loadtest_{index}")
+            if created:
+                user.set_unusable_password()
+                user.save(update_fields=["password"])
+            users.append(user)
+        return users
@@ -0,0 +1,67 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from booking.payments import process_checkout_batch
+
+
+logger = logging.getLogger("booking")
+
+
+class Command(BaseCommand):
+    help = "Creates Stripe checkout sessions of queued transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10,
+            help="Transactions claimed at once",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0.5,
+            help="Seconds to wait when the queue is empty",
+        )
+        parser.add_argument(
+            "--error-sleep",
+            type=float,
+            default=5.0,
+            help="Seconds to wait after a failed batch",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Drain the queue and exit instead of polling",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Creating checkout sessions...")
+
+        total = 0
+        while True:
+            close_old_connections()
+            try:
+                handled = process_checkout_batch(options["batch_size"])
+            except Exception as e:
+                if options["once"]:
+                    raise
+                # Claimed transactions are taken again after CHECKOUT_QUEUE_TIMEOUT
+                logger.error(f"Checkout batch failed: {e}", exc_info=True)
+                close_old_connections()
+                time.sleep(options["error_sleep"])
+                continue
+            total += handled
+
+            if handled:
+                self.stdout.write(f"  -> {handled} transactions processed")
+                continue
+
+            if options["once"]:
+                break
+            time.sleep(options["sleep"])
+
+        self.stdout.write(self.style.SUCCESS(f"Queue drained. {total} transactions processed."))
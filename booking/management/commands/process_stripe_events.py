@@ -0,0 +1,71 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from booking.stripe_events import process_events
+
+
+logger = logging.getLogger("booking")
+
+
+class Command(BaseCommand):
+    help = "Applies stored Stripe webhook events to orders and transactions in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Events per transaction",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when the inbox is empty",
+        )
+        parser.add_argument(
+            "--error-sleep",
+            type=float,
+            default=5.0,
+            help="Seconds to wait after a failed batch, doubled up to a minute",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Drain the inbox and exit instead of polling",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        self.stdout.write("Processing Stripe events...")
+
+        total = 0
+        error_sleep = options["error_sleep"]
+        while True:
+            close_old_connections()
+            try:
+                handled = process_events(batch_size)
+            except Exception as e:
+                if options["once"]:
+                    raise
+                # Database or cache unreachable: wait and try again
+                logger.error(f"Stripe event worker failed: {e}", exc_info=True)
+                close_old_connections()
+                time.sleep(error_sleep)
+                error_sleep = min(error_sleep * 2, 60)
+                continue
+            error_sleep = options["error_sleep"]
+            total += handled
+
+            if handled:
+                self.stdout.write(f"  -> {handled} events applied")
+                continue
+
+            if options["once"]:
+                break
+            time.sleep(options["sleep"])
+
+        self.stdout.write(self.style.SUCCESS(f"Inbox drained. {total} events applied."))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from airport.models import Flight
+from booking.inventory import reconcile_inventory
+
+
+class Command(BaseCommand):
+    help = "Rebuilds flight inventory counters (total/sold/held) from seats and tickets."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--flight",
+            type=int,
+            action="append",
+            dest="flight_ids",
+            help="Only this flight id (can be repeated)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Flights per transaction",
+        )
+
+    def handle(self, *args, **options):
+        flights = Flight.objects.order_by("id")
+        if options["flight_ids"]:
+            flights = flights.filter(id__in=options["flight_ids"])
+
+        flight_ids = list(flights.values_list("id", flat=True))
+        batch_size = options["batch_size"]
+        total_rows = 0
+
+        self.stdout.write(f"Reconciling inventory of {len(flight_ids)} flights...")
+
+        for start in range(0, len(flight_ids), batch_size):
+            batch = flight_ids[start:start + batch_size]
+            with transaction.atomic():
+                total_rows += len(reconcile_inventory(batch))
+
+            self.stdout.write(f"  -> {min(start + batch_size, len(flight_ids))} flights done")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Reconcile complete. {total_rows} inventory rows written.")
+        )
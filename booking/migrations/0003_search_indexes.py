@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 04:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport', '0003_search_indexes'),
+        ('booking', '0002_transaction'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['flight', 'status'], name='ticket_flight_status_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-17 04:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport', '0005_airplanetype_seat_counts'),
+        ('booking', '0004_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlightInventory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cabin', models.CharField(choices=[('ECONOMY', 'Economy'), ('BUSINESS', 'Business'), ('FIRST', 'First')], max_length=10)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('sold', models.PositiveIntegerField(default=0)),
+                ('held', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'flight inventories',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='ticket',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='ticket',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'CANCELLED'), _negated=True), fields=('flight', 'seat'), name='unique_active_ticket_seat'),
+        ),
+        migrations.AddField(
+            model_name='flightinventory',
+            name='flight',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory', to='airport.flight'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='flightinventory',
+            unique_together={('flight', 'cabin')},
+        ),
+    ]
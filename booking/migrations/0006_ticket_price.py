@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-17 05:02
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_flight_prices(apps, schema_editor):
+    """
+    Existing tickets get the current flight price, one UPDATE
+    """
+    Flight = apps.get_model('airport', 'Flight')
+    Ticket = apps.get_model('booking', 'Ticket')
+    Ticket.objects.update(
+        price=Subquery(
+            Flight.objects.filter(pk=OuterRef('flight_id')).values('price')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport', '0005_airplanetype_seat_counts'),
+        ('booking', '0005_flight_inventory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='price',
+            field=models.DecimalField(blank=True, decimal_places=2, default=0, max_digits=10),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_flight_prices, migrations.RunPython.noop),
+    ]
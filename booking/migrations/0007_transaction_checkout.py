@@ -0,0 +1,67 @@
+# Generated by Django 5.2.7 on 2026-10-17 04:22
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def prepare_existing_transactions(apps, schema_editor):
+    """
+    Old transactions got their session synchronously: mark them READY.
+    Retries used to create a new PENDING transaction each time,
+    only the newest one per order stays PENDING
+    """
+    Transaction = apps.get_model('booking', 'Transaction')
+    Transaction.objects.update(checkout_status='READY')
+
+    newest_pending = (
+        Transaction.objects
+        .filter(order=OuterRef('order'), status='PENDING')
+        .order_by('-created_at', '-id')
+        .values('id')[:1]
+    )
+    (
+        Transaction.objects
+        .filter(status='PENDING')
+        .exclude(id=Subquery(newest_pending))
+        .update(status='FAILED')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0006_ticket_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='checkout_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='checkout_session_id',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='checkout_status',
+            field=models.CharField(choices=[('QUEUED', 'Queued'), ('READY', 'Ready'), ('FAILED', 'Failed')], default='QUEUED', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='checkout_url',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.RunPython(prepare_existing_transactions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='transaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'PENDING')), fields=('order',), name='unique_pending_transaction_per_order'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airport', '0005_airplanetype_seat_counts'),
+        ('booking', '0009_order_status_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('status', 'CANCELLED'), _negated=True), fields=['flight'], include=('seat', 'order', 'status', 'passenger_first_name', 'passenger_last_name'), name='ticket_manifest_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 05:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0011_transaction_checkout_worker'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='refund_required',
+            field=models.BooleanField(db_default=False),
+        ),
+    ]
@@ -1,9 +1,34 @@
 from django.db import models
+from django.db.models import DecimalField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from airport.models import Flight, Seat
 
 
+class OrderQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Annotate 'total_amount': sum of active ticket prices, one subquery
+        """
+        totals = (
+            Ticket.objects
+            .filter(order=OuterRef('pk'))
+            .exclude(status=Ticket.Status.CANCELLED)
+            .order_by()
+            .values('order')
+            .annotate(total=Sum('price'))
+            .values('total')
+        )
+        return self.annotate(
+            total_amount=Coalesce(
+                Subquery(totals),
+                Value(0),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            )
+        )
+
+
 class Order(models.Model):
     """
     Model order is a container for tickets
@@ -25,8 +50,16 @@ class Order(models.Model):
         default=Status.PENDING
     )
 
+    objects = OrderQuerySet.as_manager()
+
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Keyset pagination (-created_at, -id)
+            models.Index(fields=['created_at', 'id'], name='order_created_id_idx'),
+            # Expiry sweeper: oldest PENDING orders first
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+        ]
 
     def __str__(self):
         return (
@@ -59,6 +92,8 @@ class Ticket(models.Model):
         on_delete=models.CASCADE,
         related_name="tickets"
     )
+    # Flight price at booking time, later price changes do not touch it
+    price = models.DecimalField(max_digits=10, decimal_places=2, blank=True)
 
     status = models.CharField(
         max_length=10,
@@ -67,8 +102,35 @@ class Ticket(models.Model):
     )
 
     class Meta:
-        unique_together = ('flight', 'seat')
         ordering = ["passenger_last_name", "passenger_first_name"]
+        constraints = [
+            # Cancelled tickets give the seat back
+            models.UniqueConstraint(
+                fields=['flight', 'seat'],
+                condition=~Q(status='CANCELLED'),
+                name='unique_active_ticket_seat'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['flight', 'status'], name='ticket_flight_status_idx'),
+            # Flight manifest: index-only scan over active tickets of a flight
+            models.Index(
+                fields=['flight'],
+                include=['seat', 'order', 'status', 'passenger_first_name', 'passenger_last_name'],
+                condition=~Q(status='CANCELLED'),
+                name='ticket_manifest_idx'
+            ),
+            # Keyset pagination (last name, first name, id)
+            models.Index(
+                fields=['passenger_last_name', 'passenger_first_name', 'id'],
+                name='ticket_passenger_id_idx'
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.price is None:
+            self.price = self.flight.price
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return (
@@ -86,6 +148,11 @@ class Transaction(models.Model):
         SUCCESS = "SUCCESS", _("Success")  # Payment successful
         FAILED = "FAILED", _("Failed")  # Payment failed
 
+    class CheckoutStatus(models.TextChoices):
+        QUEUED = "QUEUED", _("Queued")  # Waiting for the checkout worker
+        READY = "READY", _("Ready")  # Stripe session created
+        FAILED = "FAILED", _("Failed")  # Stripe refused or was unreachable
+
     order = models.ForeignKey(
         Order,
         on_delete=models.CASCADE,
@@ -107,14 +174,109 @@ class Transaction(models.Model):
         db_index=True
     )
 
+    # Stripe checkout session, created in the background (payments.py)
+    checkout_status = models.CharField(
+        max_length=10,
+        choices=CheckoutStatus.choices,
+        default=CheckoutStatus.QUEUED
+    )
+    # Same key on every retry: Stripe returns the same session
+    idempotency_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    checkout_session_id = models.CharField(max_length=255, blank=True)
+    checkout_url = models.TextField(blank=True)
+    checkout_error = models.TextField(blank=True)
+    # Taken by a checkout worker at; expiry sent to Stripe, fixed on the first attempt
+    checkout_claimed_at = models.DateTimeField(null=True, blank=True)
+    checkout_expires_at = models.DateTimeField(null=True, blank=True)
+    # Paid at Stripe after it had FAILED (order expired, checkout given up):
+    # the customer was charged for a cancelled order, refund or reconcile
+    refund_required = models.BooleanField(db_default=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["-created_at"]
+        constraints = [
+            # Checkout retries reuse the pending transaction
+            models.UniqueConstraint(
+                fields=['order'],
+                condition=Q(status='PENDING'),
+                name='unique_pending_transaction_per_order'
+            ),
+        ]
+        indexes = [
+            # Keyset pagination (-created_at, -id)
+            models.Index(fields=['created_at', 'id'], name='transaction_created_id_idx'),
+            # Checkout worker queue, only transactions waiting for a session
+            models.Index(
+                fields=['id'],
+                name='transaction_checkout_queue_idx',
+                condition=Q(status='PENDING', checkout_status='QUEUED'),
+            ),
+        ]
 
     def __str__(self):
         return (
             f"Transaction #{self.id} for Order #{self.order.id} "
             f"({self.get_status_display()}) - {self.amount} {self.currency}"
-        )
\ No newline at end of file
+        )
+
+
+class FlightInventory(models.Model):
+    """
+    Seat counters of one cabin on one flight.
+    - sold: tickets of PAID orders
+    - held: tickets of orders waiting for payment
+    """
+    flight = models.ForeignKey(
+        Flight,
+        on_delete=models.CASCADE,
+        related_name="inventory"
+    )
+    cabin = models.CharField(max_length=10, choices=Seat.SeatType.choices)
+    total = models.PositiveIntegerField(default=0)
+    sold = models.PositiveIntegerField(default=0)
+    held = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('flight', 'cabin')
+        verbose_name_plural = "flight inventories"
+
+    def __str__(self):
+        return (
+            f"{self.flight.flight_number} {self.get_cabin_display()}: "
+            f"{self.available}/{self.total}"
+        )
+
+    @property
+    def available(self):
+        return self.total - self.sold - self.held
+
+
+class StripeEvent(models.Model):
+    """
+    Inbox of verified Stripe webhook events.
+    Stored once per event id, applied in batches by process_stripe_events
+    """
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    payload = models.JSONField()
+
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ["received_at"]
+        indexes = [
+            # Worker reads only unprocessed events, oldest first
+            models.Index(
+                fields=['received_at', 'id'],
+                condition=Q(processed_at__isnull=True),
+                name='stripe_event_pending_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.type} ({self.event_id})"
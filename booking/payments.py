@@ -0,0 +1,211 @@
+import logging
+from datetime import timedelta
+
+import stripe
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Order, Ticket, Transaction
+
+
+logger = logging.getLogger("booking")
+stripe.api_key = settings.STRIPE_SECRET_KEY
+
+# Stripe accepts expires_at from 30 minutes to 24 hours after the call
+CHECKOUT_SESSION_MINUTES = 30
+# Fixed on the first attempt, a bit later than the minimum: retries within
+# this window send exactly the same parameters under the same key
+CHECKOUT_RETRY_WINDOW = timedelta(minutes=10)
+# Claimed by a worker but not finished for this long: the worker died,
+# or Stripe could not answer and the same key is sent again
+CHECKOUT_QUEUE_TIMEOUT = timedelta(minutes=1)
+# 4xx answers that may pass on a retry: the same key still in flight, rate limit
+RETRYABLE_STRIPE_STATUSES = (409, 429)
+
+
+def checkout_idempotency_key(tx):
+    return f"checkout-order-{tx.order_id}-tx-{tx.id}"
+
+
+def start_checkout(order):
+    """
+    Pending transaction of the order, created QUEUED on the first call
+    and picked up by the checkout worker (process_checkout_sessions).
+    Repeated calls return the same transaction (and session).
+    None if the order stopped being PENDING (paid, or expired by the sweeper)
+    """
+    with transaction.atomic():
+        # Serializes concurrent retries for the same order
+        locked = Order.objects.select_for_update().get(id=order.id)
+        if locked.status != Order.Status.PENDING:
+            return None
+
+        tx = order.transaction.filter(status=Transaction.Status.PENDING).first()
+        if tx is None:
+            tx = Transaction.objects.create(
+                order=order,
+                amount=order.total_amount,
+                currency="usd",
+                status=Transaction.Status.PENDING,
+            )
+            tx.idempotency_key = checkout_idempotency_key(tx)
+            tx.save(update_fields=["idempotency_key"])
+
+    return tx
+
+
+def claim_checkout_batch(batch_size=10):
+    """
+    QUEUED transactions no worker is busy with, marked as taken.
+    SKIP LOCKED: workers on several nodes claim different transactions.
+    A claim older than CHECKOUT_QUEUE_TIMEOUT is taken again
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        txs = list(
+            Transaction.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                status=Transaction.Status.PENDING,
+                checkout_status=Transaction.CheckoutStatus.QUEUED,
+            )
+            .filter(
+                Q(checkout_claimed_at__isnull=True)
+                | Q(checkout_claimed_at__lt=now - CHECKOUT_QUEUE_TIMEOUT)
+            )
+            .order_by('id')[:batch_size]
+        )
+        for tx in txs:
+            tx.checkout_claimed_at = now
+            if tx.checkout_expires_at is None:
+                tx.checkout_expires_at = (
+                    now + timedelta(minutes=CHECKOUT_SESSION_MINUTES) + CHECKOUT_RETRY_WINDOW
+                )
+        Transaction.objects.bulk_update(txs, ['checkout_claimed_at', 'checkout_expires_at'])
+    return txs
+
+
+def process_checkout_batch(batch_size=10):
+    """
+    Create Stripe sessions of one claimed batch. Returns how many were taken
+    """
+    txs = claim_checkout_batch(batch_size)
+    for tx in txs:
+        create_checkout_session(tx)
+    return len(txs)
+
+
+def _fail_checkout(tx, error):
+    # Next checkout call starts a new transaction with a new key
+    Transaction.objects.filter(id=tx.id, status=Transaction.Status.PENDING).update(
+        status=Transaction.Status.FAILED,
+        checkout_status=Transaction.CheckoutStatus.FAILED,
+        checkout_error=error,
+        updated_at=timezone.now(),
+    )
+
+
+def is_refused(error):
+    """
+    Stripe looked at the request and refused it (4xx): sending it again
+    cannot help. Timeouts, connection errors and 5xx may have created the
+    session already, they are retried with the same idempotency key
+    """
+    status = getattr(error, 'http_status', None)
+    return (
+        isinstance(error, stripe.StripeError)
+        and status is not None
+        and 400 <= status < 500
+        and status not in RETRYABLE_STRIPE_STATUSES
+    )
+
+
+def build_line_items(tickets):
+    return [
+        {
+            'price_data': {
+                'currency': 'usd',
+                'product_data': {
+                    'name': f"Ticket: {ticket.flight.flight_number}",
+                    'description': (
+                        f"Seat {ticket.seat.row}{ticket.seat.seat} for "
+                        f"{ticket.passenger_first_name} {ticket.passenger_last_name}"
+                    ),
+                },
+                'unit_amount': int(ticket.price * 100),
+            },
+            'quantity': 1,
+        }
+        for ticket in tickets
+    ]
+
+
+def create_checkout_session(tx):
+    """
+    Create the Stripe session of a claimed transaction.
+    Result is stored on the transaction for polling
+    """
+    minimum = timezone.now() + timedelta(minutes=CHECKOUT_SESSION_MINUTES, seconds=30)
+    if tx.checkout_expires_at < minimum:
+        # Retried too late: Stripe would refuse the expiry it was first sent
+        logger.warning(
+            f"Checkout session for Order {tx.order_id} (Transaction: {tx.id}) "
+            f"was not created in time, giving up."
+        )
+        _fail_checkout(tx, "Checkout session could not be created in time.")
+        return
+
+    tickets = (
+        tx.order.tickets
+        .exclude(status=Ticket.Status.CANCELLED)
+        .select_related("flight", "seat")
+        .order_by("id")
+    )
+
+    try:
+        checkout_session = stripe.checkout.Session.create(
+            line_items=build_line_items(tickets),
+            mode='payment',
+            # Return order id to find it on webhook
+            metadata={'order_id': tx.order_id, 'transaction_id': tx.id},
+            # URL, where user is redirected
+            success_url="http://example.com/success?session_id={CHECKOUT_SESSION_ID}",
+            cancel_url="http://example.com/cancel",
+            # Stored on the first attempt: a retry sends the same parameters
+            expires_at=int(tx.checkout_expires_at.timestamp()),
+            idempotency_key=tx.idempotency_key,
+        )
+    except Exception as e:
+        if not is_refused(e):
+            # Left claimed: taken again after CHECKOUT_QUEUE_TIMEOUT, until
+            # the expiry check above gives up
+            logger.warning(
+                f"Stripe unavailable for Order {tx.order_id} (Transaction: {tx.id}), "
+                f"retrying with the same idempotency key. Error: {e}",
+                exc_info=True
+            )
+            return
+        logger.error(
+            f"Stripe API Error for Order {tx.order_id} (Transaction: {tx.id}). "
+            f"Error: {e}",
+            exc_info=True
+        )
+        _fail_checkout(tx, str(e))
+        return
+
+    # Filtered update: never overwrite what a webhook has already set
+    Transaction.objects.filter(
+        id=tx.id, checkout_status=Transaction.CheckoutStatus.QUEUED
+    ).update(
+        checkout_status=Transaction.CheckoutStatus.READY,
+        checkout_session_id=checkout_session.id,
+        checkout_url=checkout_session.url,
+        updated_at=timezone.now(),
+    )
+    logger.info(
+        f"Stripe checkout session created successfully for Order {tx.order_id} "
+        f"(Transaction: {tx.id}). "
+        f"Stripe Session ID: {checkout_session.id}"
+    )
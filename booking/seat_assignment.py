@@ -0,0 +1,190 @@
+from itertools import groupby
+
+from django.db import connection
+
+from airport.models import Seat
+from airport.seatmap import get_seat_layout
+from .holds import get_held_seat_ids
+from .inventory import NotEnoughSeats
+from .models import Ticket
+
+
+# Seats picked by concurrent bookings are skipped: try the next group,
+# then search again with their committed tickets visible
+MAX_GROUPS_PER_ATTEMPT = 20
+MAX_ASSIGN_ATTEMPTS = 3
+# Advisory lock keys are int4, ids are folded into that range. Two seats
+# sharing a key only make a booking skip one of them
+LOCK_KEY_MODULO = 2 ** 31 - 1
+
+
+class SeatsBusy(Exception):
+    """
+    Enough seats are free, but concurrent bookings kept locking the picked
+    ones: worth retrying, unlike NotEnoughSeats
+    """
+    def __init__(self, flight_id, cabin, requested):
+        self.flight_id = flight_id
+        self.cabin = cabin
+        self.requested = requested
+        super().__init__(
+            f"Free {cabin.lower()} seats on flight {flight_id} are being booked "
+            f"by other customers, try again."
+        )
+
+
+# Seats in every block between aisles by seats in a row,
+# for airplane types without seat_layout
+DEFAULT_AISLE_BLOCKS = {
+    4: (2, 2),
+    5: (2, 3),
+    6: (3, 3),
+    7: (2, 3, 2),
+    8: (2, 4, 2),
+    9: (3, 3, 3),
+    10: (3, 4, 3),
+}
+
+
+def seat_positions(airplane_type):
+    """
+    {letter: (block, place)}, block is the part of the row between aisles.
+    Seats are side by side only in the same block and on neighbouring places
+    """
+    if airplane_type.seat_layout:
+        blocks = airplane_type.seat_layout.split()
+    else:
+        letters = sorted({seat['seat'] for seat in get_seat_layout(airplane_type.id)})
+        blocks, start = [], 0
+        for size in DEFAULT_AISLE_BLOCKS.get(len(letters), (len(letters),)):
+            blocks.append(letters[start:start + size])
+            start += size
+
+    return {
+        letter: (block, place)
+        for block, letters in enumerate(blocks)
+        for place, letter in enumerate(letters)
+    }
+
+
+def _free_seats(flight, cabin, exclude):
+    """
+    (id, row, letter) of free seats in a cabin, front to back
+    """
+    taken = (
+        Ticket.objects
+        .filter(flight_id=flight.id)
+        .exclude(status=Ticket.Status.CANCELLED)
+        .values('seat_id')
+    )
+    seats = list(
+        Seat.objects
+        .filter(airplane_type_id=flight.airplane.airplane_type_id, seat_type=cabin)
+        .exclude(id__in=taken)
+        .exclude(id__in=exclude)
+        .order_by('row', 'seat')
+        .values_list('id', 'row', 'seat')
+    )
+    held = get_held_seat_ids(flight.id, [seat_id for seat_id, _, _ in seats])
+    return [seat for seat in seats if seat[0] not in held]
+
+
+def _blocks(seats, positions):
+    """
+    Runs of side-by-side free seats: same row, same block between aisles,
+    neighbouring places
+    """
+    blocks = []
+    for _, row_seats in groupby(seats, key=lambda seat: seat[1]):
+        block = []
+        for seat in row_seats:
+            if block:
+                block_before, place_before = positions.get(block[-1][2], (None, None))
+                block_now, place_now = positions.get(seat[2], (None, None))
+                if block_now is None or block_now != block_before or place_now - place_before != 1:
+                    blocks.append(block)
+                    block = []
+            block.append(seat)
+        blocks.append(block)
+    return blocks
+
+
+def candidate_groups(seats, count, together, positions=None):
+    """
+    Seat groups in order of preference, adjacency-aware on the row/aisle grid.
+    Not together: the first free seats front to back.
+    Together: side-by-side blocks in one row first, then the shortest row spans
+    """
+    if not together:
+        yield seats[:count]
+        return
+
+    for block in _blocks(seats, positions or {}):
+        for start in range(0, len(block) - count + 1):
+            yield block[start:start + count]
+
+    # Nothing fits in one row, keep the group in the fewest rows
+    windows = [seats[start:start + count] for start in range(len(seats) - count + 1)]
+    yield from sorted(windows, key=lambda window: window[-1][1] - window[0][1])
+
+
+def _lock_group(flight, group):
+    """
+    Transaction-level advisory lock on every (flight, seat) of the group,
+    pg_try_advisory_xact_lock() does not wait: seats another booking holds
+    are skipped, like SELECT ... FOR UPDATE SKIP LOCKED on a row per flight
+    and seat. Returns seat ids that are not available, empty if all are ours
+    """
+    seat_ids = [seat_id for seat_id, _, _ in group]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT seat_id FROM unnest(%s::bigint[]) AS seat_id "
+            "WHERE NOT pg_try_advisory_xact_lock(%s, (seat_id %% %s)::integer)",
+            [seat_ids, flight.id % LOCK_KEY_MODULO, LOCK_KEY_MODULO],
+        )
+        busy = {row[0] for row in cursor.fetchall()}
+    if busy:
+        return busy
+
+    # Booked by a transaction that committed after the search
+    return set(
+        Ticket.objects
+        .filter(flight_id=flight.id, seat_id__in=seat_ids)
+        .exclude(status=Ticket.Status.CANCELLED)
+        .values_list('seat_id', flat=True)
+    )
+
+
+def assign_seats(flight, cabin, count, together=False, exclude=()):
+    """
+    Pick and lock free seats for an order, must run inside transaction.atomic()
+    and before reserve_seats(). Concurrent bookings of a cabin search in
+    parallel and pick around each other's seats instead of waiting, the
+    locks go away on commit or rollback. The unique_active_ticket_seat
+    constraint stays the last guard against double booking.
+    NotEnoughSeats if the cabin has too few free seats, SeatsBusy if
+    concurrent bookings won every attempt
+    """
+    positions = seat_positions(flight.airplane.airplane_type) if together else None
+    for _ in range(MAX_ASSIGN_ATTEMPTS):
+        seats = _free_seats(flight, cabin, exclude)
+        if len(seats) < count:
+            raise NotEnoughSeats(flight.id, cabin, count, len(seats))
+
+        # Lost to concurrent bookings, tried again by the next search
+        unavailable = set()
+        for _ in range(MAX_GROUPS_PER_ATTEMPT):
+            free = [seat for seat in seats if seat[0] not in unavailable]
+            if len(free) < count:
+                break
+            group = next(candidate_groups(free, count, together, positions))
+            lost = _lock_group(flight, group)
+            if not lost:
+                return list(
+                    Seat.objects
+                    .filter(id__in=[seat_id for seat_id, _, _ in group])
+                    .order_by('row', 'seat')
+                )
+            unavailable |= lost
+
+    raise SeatsBusy(flight.id, cabin, count)
@@ -1,15 +1,30 @@
-from django.db import transaction
-from rest_framework import serializers
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from rest_framework import exceptions, serializers
+from .holds import HoldsBusy, get_hold, get_held_seat_ids, release_hold
+from .inventory import NotEnoughSeats, reserve_seats
+from .seat_assignment import SeatsBusy, assign_seats
 from .models import Ticket, Order, Transaction
 from airport.models import Flight, Seat
 from airport.serializers import FlightSerializer, SeatSerializer
+from core.serializers import SparseFieldsMixin
 import logging
 
 
 logger = logging.getLogger("booking")
 
 
-class TicketSerializer(serializers.ModelSerializer):
+class SeatsConflict(exceptions.APIException):
+    """
+    409: seats were free but taken by concurrent bookings, the client may retry
+    """
+    status_code = 409
+    default_detail = "Seats are being booked by other customers, try again."
+    default_code = "seats_busy"
+
+
+class TicketSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for (GET) tickets
     """
@@ -21,20 +36,47 @@ class TicketSerializer(serializers.ModelSerializer):
         model = Ticket
         fields = (
             'id', 'flight', 'passenger_first_name',
-            'passenger_last_name', 'seat', 'status',
+            'passenger_last_name', 'seat', 'price', 'status',
         )
 
 
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PK field that first looks into objects loaded in bulk by the parent
+    serializer (context['prefetched'][Model]), so N tickets are not N queries
+    """
+    def to_internal_value(self, data):
+        prefetched = self.context.get('prefetched', {}).get(self.queryset.model)
+        if prefetched is None:
+            return super().to_internal_value(data)
+
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return prefetched[int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
 class TicketCreateSerializer(serializers.ModelSerializer):
     """
-    Serializer for (POST) tickets
+    Serializer for (POST) tickets.
+    Either an exact seat, or a cabin and the server assigns the seat
     """
     # 'seat' is waiting for ID
-    seat = serializers.PrimaryKeyRelatedField(
-        queryset=Seat.objects.all()
+    seat = PrefetchedPrimaryKeyRelatedField(
+        queryset=Seat.objects.all(),
+        required=False,
+    )
+    cabin = serializers.ChoiceField(
+        choices=Seat.SeatType.choices,
+        required=False,
+        write_only=True,
     )
 
-    flight = serializers.PrimaryKeyRelatedField(
+    flight = PrefetchedPrimaryKeyRelatedField(
         queryset=Flight.objects.all()
     )
     class Meta:
@@ -44,14 +86,22 @@ class TicketCreateSerializer(serializers.ModelSerializer):
             'passenger_first_name',
             'passenger_last_name',
             'seat',
+            'cabin',
+            'price',
         )
+        read_only_fields = ('price',)
 
     def validate(self, data):
         flight = data['flight']
-        seat = data['seat']
+        seat = data.get('seat')
+
+        if seat is None:
+            if 'cabin' not in data:
+                raise serializers.ValidationError("Either 'seat' or 'cabin' is required.")
+            return data
 
         # Check if the "drawing" of the seat matches the "drawing" of the plane
-        if seat.airplane_type != flight.airplane.airplane_type:
+        if seat.airplane_type_id != flight.airplane.airplane_type_id:
             logger.warning(
                 "Ticket validation failed: Seat type mismatch. "
                 f"Flight {flight.id} (AirplaneType: {flight.airplane.airplane_type.name}) "
@@ -63,10 +113,12 @@ class TicketCreateSerializer(serializers.ModelSerializer):
                 f"({flight.airplane.airplane_type.name})."
             )
 
+        # An exact seat decides the cabin
+        data['cabin'] = seat.seat_type
         return data
 
 
-class TransactionSerializer(serializers.ModelSerializer):
+class TransactionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for transaction
     """
@@ -80,11 +132,35 @@ class TransactionSerializer(serializers.ModelSerializer):
             'amount',
             'currency',
             'provider_transaction_id',
+            'checkout_status',
+            'refund_required',
             'created_at',
         )
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class CheckoutSessionSerializer(serializers.ModelSerializer):
+    """
+    Serializer for checkout status polling
+    """
+    transaction = serializers.IntegerField(source='id')
+    sessionId = serializers.CharField(source='checkout_session_id')
+    url = serializers.CharField(source='checkout_url')
+    error = serializers.CharField(source='checkout_error')
+
+    class Meta:
+        model = Transaction
+        fields = (
+            'transaction',
+            'checkout_status',
+            'amount',
+            'currency',
+            'sessionId',
+            'url',
+            'error',
+        )
+
+
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for (GET) orders
     """
@@ -92,11 +168,48 @@ class OrderSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField()
     status = serializers.CharField(source='get_status_display')
     transactions = TransactionSerializer(many=True, read_only=True)
+    # Annotated by Order.objects.with_totals()
+    total_amount = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
 
 
     class Meta:
         model = Order
-        fields = ('id', 'user', 'created_at', 'status', 'tickets', 'transactions')
+        fields = (
+            'id', 'user', 'created_at', 'status', 'total_amount', 'tickets', 'transactions'
+        )
+
+
+class SeatHoldSerializer(serializers.Serializer):
+    """
+    Serializer for (POST) seat holds
+    """
+    flight = serializers.PrimaryKeyRelatedField(
+        queryset=Flight.objects.select_related('airplane')
+    )
+    seats = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=settings.SEAT_HOLD_MAX_SEATS,
+    )
+    minutes = serializers.IntegerField(
+        min_value=1,
+        max_value=settings.SEAT_HOLD_MAX_MINUTES,
+        required=False,
+    )
+
+    def validate(self, data):
+        flight = data['flight']
+        seat_ids = set(data['seats'])
+        valid = set(
+            Seat.objects
+            .filter(id__in=seat_ids, airplane_type_id=flight.airplane.airplane_type_id)
+            .values_list('id', flat=True)
+        )
+        if seat_ids - valid:
+            raise serializers.ValidationError({
+                'seats': f"Seats {sorted(seat_ids - valid)} do not exist on this flight's airplane."
+            })
+        return data
 
 
 class OrderCreateSerializer(serializers.ModelSerializer):
@@ -104,11 +217,44 @@ class OrderCreateSerializer(serializers.ModelSerializer):
     Serializer for (POST) orders
     """
     tickets = TicketCreateSerializer(many=True)
+    # Tokens of seat holds turned into this order
+    holds = serializers.ListField(
+        child=serializers.CharField(),
+        required=False,
+        write_only=True,
+    )
+    # Assigned seats of one flight and cabin sit side by side
+    seats_together = serializers.BooleanField(default=False, write_only=True)
 
     class Meta:
         model = Order
-        fields = ("tickets",)
+        fields = ("tickets", "holds", "seats_together")
+
+    def to_internal_value(self, data):
+        self.prefetch_ticket_objects(data)
+        return super().to_internal_value(data)
+
+    def prefetch_ticket_objects(self, data):
+        """
+        Load all flights and seats of the order in two queries
+        """
+        tickets = data.get('tickets') if hasattr(data, 'get') else None
+        if not isinstance(tickets, list):
+            return
+
+        def ids(name):
+            result = set()
+            for ticket in tickets:
+                try:
+                    result.add(int(ticket[name]))
+                except (KeyError, TypeError, ValueError):
+                    pass
+            return result
 
+        self.context['prefetched'] = {
+            Flight: Flight.objects.select_related('airplane__airplane_type').in_bulk(ids('flight')),
+            Seat: Seat.objects.select_related('airplane_type').in_bulk(ids('seat')),
+        }
 
     def validate_tickets(self, tickets_data):
         # Is list not empty
@@ -122,6 +268,8 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         # Check for duplicate seats in one order
         seats_on_flight = set()
         for ticket_data in tickets_data:
+            if 'seat' not in ticket_data:
+                continue
             flight_seat = (ticket_data['flight'].id, ticket_data['seat'].id)
             if flight_seat in seats_on_flight:
                 logger.warning(
@@ -138,21 +286,113 @@ class OrderCreateSerializer(serializers.ModelSerializer):
 
         return tickets_data
 
+    def validate_holds(self, tokens):
+        user = self.context['request'].user
+        for token in tokens:
+            hold = get_hold(token)
+            if hold is None or hold['user'] != user.id:
+                raise serializers.ValidationError(f"Hold {token} has expired or does not exist.")
+        return tokens
+
+    def validate(self, data):
+        """
+        Seats held by other customers are rejected here, before any row is locked
+        """
+        tokens = data.get('holds', [])
+        seats_by_flight = defaultdict(set)
+        for ticket_data in data['tickets']:
+            if 'seat' in ticket_data:
+                seats_by_flight[ticket_data['flight'].id].add(ticket_data['seat'].id)
+
+        for flight_id, seat_ids in seats_by_flight.items():
+            held = get_held_seat_ids(flight_id, seat_ids, exclude_tokens=tokens)
+            if held:
+                logger.info(
+                    f"Order validation failed: seats {sorted(held)} "
+                    f"on flight {flight_id} are held by another customer."
+                )
+                raise serializers.ValidationError(
+                    f"Seats {sorted(held)} on flight {flight_id} are held by another customer."
+                )
+        return data
+
+    def assign_missing_seats(self, tickets_data, together):
+        """
+        Fill in seats of tickets that asked only for a cabin,
+        one search per flight and cabin. Drops 'cabin', it is not a Ticket field
+        """
+        requested = defaultdict(list)
+        chosen = defaultdict(set)
+        for ticket_data in tickets_data:
+            key = (ticket_data['flight'], ticket_data.pop('cabin'))
+            if 'seat' in ticket_data:
+                chosen[ticket_data['flight'].id].add(ticket_data['seat'].id)
+            else:
+                requested[key].append(ticket_data)
+
+        for (flight, cabin), group in requested.items():
+            seats = assign_seats(
+                flight, cabin, len(group),
+                together=together,
+                exclude=chosen[flight.id],
+            )
+            for ticket_data, seat in zip(group, seats):
+                ticket_data['seat'] = seat
+            chosen[flight.id].update(seat.id for seat in seats)
+
     # create() to handle nested tickets
     def create(self, validated_data):
         tickets_data = validated_data.pop('tickets')
+        hold_tokens = validated_data.pop('holds', [])
+        together = validated_data.pop('seats_together')
+        seat_counts = Counter(
+            (ticket_data['flight'].id, ticket_data['cabin'])
+            for ticket_data in tickets_data
+        )
         try:
-            order = Order.objects.create(**validated_data)
-            for ticket_data in tickets_data:
-                Ticket.objects.create(order=order, **ticket_data)
+            with transaction.atomic():
+                # Seat search first, it locks only the seats it picks
+                self.assign_missing_seats(tickets_data, together)
+
+                # Locks inventory rows until commit, the oversell guard
+                reserve_seats(seat_counts)
+
+                order = Order.objects.create(**validated_data)
+                # Price snapshot, the flight price may change later
+                Ticket.objects.bulk_create([
+                    Ticket(order=order, price=ticket_data['flight'].price, **ticket_data)
+                    for ticket_data in tickets_data
+                ])
+
+        except NotEnoughSeats as e:
+            logger.warning(f"Order creation rejected: {e}")
+            raise serializers.ValidationError(str(e)) from e
 
-        except Exception as e:
-            user_id = validated_data.get('user', 'unknown_user').id
+        except SeatsBusy as e:
+            logger.warning(f"Order creation rejected, seats busy: {e}")
+            raise SeatsConflict(str(e)) from e
+
+        except IntegrityError as e:
+            # Seat booked without a hold by someone else a moment ago
+            logger.warning(f"Order creation rejected, seat already taken: {e}")
+            raise serializers.ValidationError("One of the seats has just been taken.") from e
+
+        except Exception:
+            # Not the client's fault: a 500, database errors stay in the log
+            user = validated_data.get('user')
             logger.error(
-                f"Atomic creation of Order failed for user {user_id}. Error: {e}",
+                f"Atomic creation of Order failed for user {getattr(user, 'id', None)}.",
                 exc_info=True
             )
-            raise serializers.ValidationError(f"Could not create order: {e}")
+            raise
+
+        # Seats are tickets now, holds are not needed anymore
+        for token in hold_tokens:
+            try:
+                release_hold(token)
+            except HoldsBusy as e:
+                # The order is saved, the hold just runs out by itself
+                logger.warning(f"Hold {token} not released after order {order.id}: {e}")
 
         return order
 
@@ -0,0 +1,13 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from airport.models import Flight
+from .inventory import refresh_inventory_totals
+
+
+@receiver(post_save, sender=Flight)
+def flight_saved(sender, instance, **kwargs):
+    """
+    Create inventory of new flights, update totals if the airplane changed
+    """
+    refresh_inventory_totals(Flight.objects.filter(pk=instance.pk))
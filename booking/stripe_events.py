@@ -0,0 +1,162 @@
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+from .inventory import confirm_tickets, release_tickets
+from .models import Order, StripeEvent, Ticket, Transaction
+
+
+logger = logging.getLogger("booking")
+
+SESSION_COMPLETED = 'checkout.session.completed'
+SESSION_EXPIRED = 'checkout.session.expired'
+HANDLED_EVENT_TYPES = (SESSION_COMPLETED, SESSION_EXPIRED)
+
+
+def _event_refs(event):
+    """
+    (order_id, transaction_id, payment reference) from the session metadata
+    """
+    session = event.payload.get('data', {}).get('object', {})
+    metadata = session.get('metadata') or {}
+    try:
+        order_id = int(metadata.get('order_id'))
+        transaction_id = int(metadata.get('transaction_id'))
+    except (TypeError, ValueError):
+        return None
+    return order_id, transaction_id, session.get('payment_intent') or session.get('id')
+
+
+def process_event_batch(batch_size=100, event_ids=None):
+    """
+    Apply one batch of inbox events: set-based updates of transactions,
+    orders and inventory in one transaction. Several workers can run at once,
+    SKIP LOCKED hands each of them different events.
+    Locks order -> inventory -> transaction, like the order sweeper.
+    Returns number of events handled
+    """
+    with transaction.atomic():
+        events = (
+            StripeEvent.objects
+            .select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True)
+        )
+        if event_ids is not None:
+            events = events.filter(id__in=event_ids)
+        events = list(events.order_by('received_at', 'id')[:batch_size])
+        if not events:
+            return 0
+
+        refs = {event.id: _event_refs(event) for event in events}
+        # Orders first: they keep the sweeper away from these transactions
+        list(
+            Order.objects
+            .select_for_update()
+            .filter(id__in={ref[0] for ref in refs.values() if ref})
+            .order_by('id')
+            .values_list('id', flat=True)
+        )
+        transactions = Transaction.objects.in_bulk({ref[1] for ref in refs.values() if ref})
+
+        paid, expired, refunds, errors = {}, {}, {}, {}
+        for event in events:
+            ref = refs[event.id]
+            if ref is None:
+                errors[event.id] = "Missing order_id/transaction_id in metadata."
+                continue
+
+            order_id, transaction_id, payment_reference = ref
+            tx = transactions.get(transaction_id)
+            if tx is None or tx.order_id != order_id:
+                errors[event.id] = f"Transaction {transaction_id} of Order {order_id} not found."
+                continue
+
+            # Paid after the sweeper or the checkout worker failed it:
+            # the order is cancelled and its seats are gone, money is not
+            if event.type == SESSION_COMPLETED and tx.status == Transaction.Status.FAILED:
+                tx.refund_required = True
+                tx.provider_transaction_id = payment_reference
+                refunds[tx.id] = tx
+                continue
+
+            # Redelivered event or already decided by an earlier event of the batch
+            if tx.status != Transaction.Status.PENDING:
+                logger.info(
+                    f"Stripe event {event.event_id} for Transaction {tx.id} "
+                    f"already processed. Current status: {tx.status}."
+                )
+                continue
+
+            if event.type == SESSION_COMPLETED:
+                tx.status = Transaction.Status.SUCCESS
+                # Save id from Stripe
+                tx.provider_transaction_id = payment_reference
+                paid[tx.order_id] = tx
+            elif event.type == SESSION_EXPIRED:
+                tx.status = Transaction.Status.FAILED
+                expired[tx.order_id] = tx
+
+        # Inventory first: it reads the order status to tell sold from held
+        if paid:
+            confirm_tickets(Ticket.objects.filter(order_id__in=paid))
+            Order.objects.filter(id__in=paid).update(status=Order.Status.PAID)
+        if expired:
+            release_tickets(Ticket.objects.filter(order_id__in=expired))
+            Order.objects.filter(id__in=expired).update(status=Order.Status.CANCELLED)
+
+        now = timezone.now()
+        changed = {tx.id: tx for tx in [*paid.values(), *expired.values(), *refunds.values()]}
+        for tx in changed.values():
+            tx.updated_at = now
+        Transaction.objects.bulk_update(
+            [changed[tx_id] for tx_id in sorted(changed)],
+            ['status', 'provider_transaction_id', 'refund_required', 'updated_at'],
+        )
+
+        StripeEvent.objects.filter(id__in=[event.id for event in events]).update(processed_at=now)
+        for event_id, error in errors.items():
+            StripeEvent.objects.filter(id=event_id).update(error=error)
+
+    for event_id, error in errors.items():
+        logger.error(f"Stripe event {event_id} could not be applied: {error}")
+    for tx in refunds.values():
+        logger.error(
+            f"Order {tx.order_id} (Transaction: {tx.id}) was paid at Stripe after it "
+            f"had failed, payment {tx.provider_transaction_id} needs a refund."
+        )
+    if paid:
+        logger.info(f"Orders {sorted(paid)} PAID via Stripe.")
+    if expired:
+        logger.warning(f"Stripe checkout sessions of Orders {sorted(expired)} EXPIRED.")
+
+    return len(events)
+
+
+def process_events(batch_size=100):
+    """
+    process_event_batch() that does not get stuck on a bad event: a failed
+    batch is retried event by event, an event failing on its own is marked
+    processed with the error and left for a human
+    """
+    try:
+        return process_event_batch(batch_size)
+    except Exception as e:
+        logger.error(f"Stripe event batch failed, retrying one by one: {e}", exc_info=True)
+
+    event_ids = list(
+        StripeEvent.objects
+        .filter(processed_at__isnull=True)
+        .order_by('received_at', 'id')
+        .values_list('id', flat=True)[:batch_size]
+    )
+    handled = 0
+    for event_id in event_ids:
+        try:
+            handled += process_event_batch(1, event_ids=[event_id])
+        except Exception as e:
+            logger.error(f"Stripe event {event_id} failed and is skipped: {e}", exc_info=True)
+            handled += StripeEvent.objects.filter(
+                id=event_id, processed_at__isnull=True
+            ).update(processed_at=timezone.now(), error=f"Failed: {e}")
+    return handled
@@ -1,3 +1,905 @@
-from django.test import TestCase
+import io
+import json
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import stripe
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from airport.models import Airline, Airplane, AirplaneType, Airport, City, Country, Flight, Seat
+from airport.signals import seats_changed
+from users.models import User
+from .expiry import expire_pending_orders
+from .holds import create_hold
+from .inventory import reconcile_inventory, reserve_seats
+from .models import FlightInventory, Order, StripeEvent, Ticket, Transaction
+from .payments import process_checkout_batch, start_checkout
+from .seat_assignment import assign_seats
+from .stripe_events import SESSION_COMPLETED, SESSION_EXPIRED, process_event_batch, process_events
+
+
+def create_flight(rows=1, letters="ABCDEF", seat_layout="", flight_number="PS101"):
+    """
+    Flight in two days on a new airplane type with rows x letters economy seats
+    """
+    country = Country.objects.create(name=f"Country {flight_number}")
+    city = City.objects.create(name="City", country=country)
+    origin = Airport.objects.create(name="Origin", iata_code=f"O{flight_number[-2:]}", city=city)
+    destination = Airport.objects.create(name="Destination", iata_code=f"D{flight_number[-2:]}", city=city)
+    airline = Airline.objects.create(name=f"Airline {flight_number}", home_base=origin)
+
+    airplane_type = AirplaneType.objects.create(name=f"Type {flight_number}", seat_layout=seat_layout)
+    Seat.objects.bulk_create([
+        Seat(airplane_type=airplane_type, row=row, seat=letter)
+        for row in range(1, rows + 1)
+        for letter in letters
+    ])
+    seats_changed(airplane_type.id)
+    airplane = Airplane.objects.create(name="UR-TST", airplane_type=airplane_type, airline=airline)
+
+    departure = timezone.now() + timedelta(days=2)
+    return Flight.objects.create(
+        flight_number=flight_number,
+        departure_airport=origin,
+        arrival_airport=destination,
+        departure_time=departure,
+        arrival_time=departure + timedelta(hours=2),
+        airplane=airplane,
+        price=100,
+    )
+
+
+def ticket(flight, seat=None, cabin=Seat.SeatType.ECONOMY, last_name="Doe"):
+    data = {"flight": flight.id, "passenger_first_name": "John", "passenger_last_name": last_name}
+    if seat is not None:
+        data["seat"] = seat.id
+    else:
+        data["cabin"] = cabin
+    return data
+
+
+def inventory(flight, cabin=Seat.SeatType.ECONOMY):
+    return FlightInventory.objects.get(flight=flight, cabin=cabin)
+
+
+class BookingTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("bob", "bob@example.com", "password")
+        self.other = User.objects.create_user("ann", "ann@example.com", "password")
+        self.client.force_authenticate(self.user)
+
+    def order(self, *tickets, client=None, **extra):
+        return (client or self.client).post(
+            reverse("order-list"), {"tickets": list(tickets), **extra}, format="json"
+        )
+
+
+class InventoryTests(BookingTestCase):
+    def test_new_flight_gets_inventory_of_its_airplane_type(self):
+        flight = create_flight(rows=2)
+
+        row = inventory(flight)
+        self.assertEqual((row.total, row.held, row.sold), (12, 0, 0))
+
+    def test_order_holds_seats_and_oversell_is_rejected(self):
+        flight = create_flight(rows=1, letters="AB")
+
+        response = self.order(ticket(flight), ticket(flight))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(inventory(flight).held, 2)
+
+        response = self.order(ticket(flight))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Ticket.objects.filter(flight=flight).count(), 2)
+        self.assertEqual(inventory(flight).available, 0)
+
+    def test_taken_seat_is_rejected(self):
+        flight = create_flight()
+        seat = Seat.objects.get(airplane_type=flight.airplane.airplane_type, seat="A")
+
+        self.assertEqual(self.order(ticket(flight, seat)).status_code, status.HTTP_201_CREATED)
+        response = self.order(ticket(flight, seat))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(inventory(flight).held, 1)
+
+    def test_unexpected_error_is_a_server_error_without_details(self):
+        flight = create_flight()
+        self.client.raise_request_exception = False
+
+        with mock.patch("booking.serializers.reserve_seats", side_effect=RuntimeError("db secret")):
+            with self.assertLogs("booking", "ERROR"):
+                response = self.order(ticket(flight))
+
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertNotIn(b"db secret", response.content)
+        self.assertFalse(Order.objects.exists())
+
+
+class OrderQueryCountTests(BookingTestCase):
+    """
+    Creating and listing orders costs the same number of queries
+    whatever the number of tickets
+    """
+
+    def test_create_with_chosen_seats(self):
+        for count in (1, 4):
+            with self.subTest(count=count):
+                flight = create_flight(flight_number=f"PS1{count:02}")
+                seats = list(Seat.objects.filter(airplane_type=flight.airplane.airplane_type).order_by("seat"))
+
+                with self.assertNumQueries(10):
+                    response = self.order(*[ticket(flight, seat) for seat in seats[:count]])
+
+                self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_create_with_assigned_seats(self):
+        for count in (1, 4):
+            with self.subTest(count=count):
+                flight = create_flight(flight_number=f"PS2{count:02}")
+
+                with self.assertNumQueries(13):
+                    response = self.order(*[ticket(flight) for _ in range(count)])
+
+                self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_order_list(self):
+        for count in (1, 4):
+            with self.subTest(count=count):
+                # Every ticket on a flight of its own, so nested flights cannot repeat
+                flights = [create_flight(flight_number=f"PS{count}{number}") for number in range(count)]
+                self.order(*[ticket(flight) for flight in flights])
+
+                with self.assertNumQueries(18):
+                    response = self.client.get(reverse("order-list"))
+
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(len(response.data["results"][0]["tickets"]), count)
+
+
+class SeatAssignmentTests(BookingTestCase):
+    @staticmethod
+    def seats_of_last_order():
+        order = Order.objects.latest("id")
+        return sorted(f"{t.seat.row}{t.seat.seat}" for t in order.tickets.select_related("seat"))
+
+    def test_group_does_not_sit_across_the_aisle(self):
+        flight = create_flight(rows=2, letters="ABCDEF")
+        # 1A and 1B are taken: 1C-1E are neighbouring letters, but across the aisle
+        for letter in "AB":
+            seat = Seat.objects.get(airplane_type=flight.airplane.airplane_type, row=1, seat=letter)
+            self.order(ticket(flight, seat))
+
+        response = self.order(*[ticket(flight) for _ in range(3)], seats_together=True)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.seats_of_last_order(), ["1D", "1E", "1F"])
+
+    def test_seat_layout_of_the_type_decides_blocks(self):
+        flight = create_flight(rows=1, letters="ABCD", seat_layout="A BCD")
+
+        response = self.order(*[ticket(flight) for _ in range(3)], seats_together=True)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.seats_of_last_order(), ["1B", "1C", "1D"])
+
+
+class SeatHoldTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.flight = create_flight(rows=2)
+        self.seats = list(
+            Seat.objects.filter(airplane_type=self.flight.airplane.airplane_type).order_by("row", "seat")
+        )
+
+    def hold(self, seats, client=None):
+        return (client or self.client).post(
+            reverse("seat-hold-list"),
+            {"flight": self.flight.id, "seats": [seat.id for seat in seats]},
+            format="json",
+        )
+
+    def test_held_seat_conflicts(self):
+        self.assertEqual(self.hold(self.seats[:2]).status_code, status.HTTP_201_CREATED)
+
+        other = APIClient()
+        other.force_authenticate(self.other)
+        response = self.hold(self.seats[1:3], client=other)
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["seats"], [self.seats[1].id])
+
+    def test_seat_held_by_another_user_cannot_be_ordered(self):
+        create_hold(self.other.id, self.flight.id, [self.seats[0].id])
+
+        response = self.order(ticket(self.flight, self.seats[0]))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_order_with_own_hold_releases_it(self):
+        hold = self.hold(self.seats[:1]).data
+
+        response = self.order(ticket(self.flight, self.seats[0]), holds=[hold["token"]])
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        detail = self.client.get(reverse("seat-hold-detail", args=[hold["token"]]))
+        self.assertEqual(detail.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_holds_per_user_and_flight_are_capped(self):
+        with self.settings(SEAT_HOLD_MAX_SEATS_PER_FLIGHT=3):
+            self.assertEqual(self.hold(self.seats[:2]).status_code, status.HTTP_201_CREATED)
+            response = self.hold(self.seats[2:4])
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["held"], 2)
+
+    def test_busy_holds_lock_is_left_to_its_owner(self):
+        lock_key = f"seat-holds:{self.flight.id}:lock"
+        cache.set(lock_key, "other-request", 60)
+
+        with mock.patch("booking.holds.FLIGHT_HOLDS_LOCK_TIMEOUT", 0.05):
+            response = self.hold(self.seats[:1])
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(cache.get(lock_key), "other-request")
+        self.assertIsNone(cache.get(f"seat-hold:{self.flight.id}:{self.seats[0].id}"))
+
+    def test_held_seats_are_not_available(self):
+        url = reverse("flight-detail", args=[self.flight.id])
+        before = self.client.get(url).data["available_seats"]
+
+        self.hold(self.seats[:3])
+
+        self.assertEqual(self.client.get(url).data["available_seats"], before - 3)
+
+    def test_seat_filters_do_not_count_holds(self):
+        total = len(self.seats)
+        self.hold(self.seats[:1])
+
+        response = self.client.get(reverse("flight-list"), {"available_seats__gte": total})
+
+        self.assertEqual([flight["id"] for flight in response.data["results"]], [self.flight.id])
+        self.assertEqual(response.data["results"][0]["available_seats"], total - 1)
+
+
+class IdempotencyTests(BookingTestCase):
+    def test_retry_replays_the_first_response(self):
+        flight = create_flight()
+        body = {"tickets": [ticket(flight)]}
+
+        first = self.client.post(reverse("order-list"), body, format="json", HTTP_IDEMPOTENCY_KEY="k1")
+        retry = self.client.post(reverse("order-list"), body, format="json", HTTP_IDEMPOTENCY_KEY="k1")
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_same_key_with_another_body_is_422(self):
+        flight = create_flight()
+
+        self.client.post(
+            reverse("order-list"), {"tickets": [ticket(flight)]}, format="json", HTTP_IDEMPOTENCY_KEY="k2"
+        )
+        response = self.client.post(
+            reverse("order-list"), {"tickets": [ticket(flight, last_name="Roe")]},
+            format="json", HTTP_IDEMPOTENCY_KEY="k2",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_keys_are_per_user(self):
+        flight = create_flight()
+        other = APIClient()
+        other.force_authenticate(self.other)
+        body = {"tickets": [ticket(flight)]}
+
+        self.client.post(reverse("order-list"), body, format="json", HTTP_IDEMPOTENCY_KEY="k3")
+        other.post(reverse("order-list"), body, format="json", HTTP_IDEMPOTENCY_KEY="k3")
+
+        self.assertEqual(Order.objects.count(), 2)
+
+
+class ConstraintTests(BookingTestCase):
+    def test_one_active_ticket_per_seat(self):
+        flight = create_flight()
+        seat = Seat.objects.filter(airplane_type=flight.airplane.airplane_type).first()
+        order = Order.objects.create(user=self.user)
+        Ticket.objects.create(order=order, flight=flight, seat=seat, passenger_first_name="A",
+                              passenger_last_name="B", status=Ticket.Status.CANCELLED)
+        Ticket.objects.create(order=order, flight=flight, seat=seat, passenger_first_name="A",
+                              passenger_last_name="B")
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Ticket.objects.create(order=order, flight=flight, seat=seat, passenger_first_name="C",
+                                  passenger_last_name="D")
+
+    def test_one_pending_transaction_per_order(self):
+        order = Order.objects.create(user=self.user)
+        Transaction.objects.create(order=order, amount=100, status=Transaction.Status.FAILED)
+        Transaction.objects.create(order=order, amount=100)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Transaction.objects.create(order=order, amount=100)
+
+
+class PaymentTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.flight = create_flight()
+        self.order(ticket(self.flight), ticket(self.flight))
+        self.paid_order = Order.objects.with_totals().get()
+        self.tx = start_checkout(self.paid_order)
+
+    def event(self, event_id, event_type, tx=None):
+        tx = tx or self.tx
+        return StripeEvent.objects.create(
+            event_id=event_id,
+            type=event_type,
+            payload={"data": {"object": {
+                "id": "cs_test",
+                "payment_intent": "pi_test",
+                "metadata": {"order_id": tx.order_id, "transaction_id": tx.id},
+            }}},
+        )
+
+    def test_checkout_reuses_the_pending_transaction(self):
+        self.assertEqual(start_checkout(self.paid_order).id, self.tx.id)
+        self.assertEqual(self.tx.checkout_status, Transaction.CheckoutStatus.QUEUED)
+
+    def test_completed_event_pays_the_order_once(self):
+        self.event("evt_1", SESSION_COMPLETED)
+        self.event("evt_2", SESSION_COMPLETED)  # redelivery under another id
+
+        self.assertEqual(process_event_batch(), 2)
+
+        self.paid_order.refresh_from_db()
+        self.tx.refresh_from_db()
+        self.assertEqual(self.paid_order.status, Order.Status.PAID)
+        self.assertEqual(self.tx.status, Transaction.Status.SUCCESS)
+        self.assertEqual(self.tx.provider_transaction_id, "pi_test")
+        row = inventory(self.flight)
+        self.assertEqual((row.held, row.sold), (0, 2))
+        self.assertFalse(StripeEvent.objects.filter(processed_at__isnull=True).exists())
+
+    def test_expired_event_cancels_the_order_and_frees_seats(self):
+        self.event("evt_3", SESSION_EXPIRED)
+
+        process_event_batch()
+
+        self.paid_order.refresh_from_db()
+        self.assertEqual(self.paid_order.status, Order.Status.CANCELLED)
+        self.assertEqual(inventory(self.flight).held, 0)
+        self.assertFalse(Ticket.objects.exclude(status=Ticket.Status.CANCELLED).exists())
+
+    def checkout_fails_with(self, error):
+        with mock.patch("stripe.checkout.Session.create", side_effect=error) as create:
+            with self.assertLogs("booking"):
+                process_checkout_batch()
+        self.tx.refresh_from_db()
+        return create
+
+    def test_checkout_is_retried_with_the_same_key_when_stripe_is_unavailable(self):
+        create = self.checkout_fails_with(stripe.APIConnectionError("timed out"))
+
+        self.assertEqual(self.tx.status, Transaction.Status.PENDING)
+        self.assertEqual(self.tx.checkout_status, Transaction.CheckoutStatus.QUEUED)
+        self.assertEqual(create.call_args.kwargs["idempotency_key"], self.tx.idempotency_key)
+
+        Transaction.objects.filter(id=self.tx.id).update(
+            checkout_claimed_at=timezone.now() - timedelta(minutes=2)
+        )
+        create = self.checkout_fails_with(stripe.APIError("bad gateway", http_status=502))
+        self.assertEqual(create.call_args.kwargs["idempotency_key"], self.tx.idempotency_key)
+        self.assertEqual(self.tx.status, Transaction.Status.PENDING)
+
+    def test_checkout_refused_by_stripe_fails_the_transaction(self):
+        self.checkout_fails_with(stripe.InvalidRequestError("bad amount", "amount", http_status=400))
+
+        self.assertEqual(self.tx.status, Transaction.Status.FAILED)
+        self.assertEqual(self.tx.checkout_status, Transaction.CheckoutStatus.FAILED)
+
+    def test_checkout_worker_once_stops_on_error(self):
+        command = "booking.management.commands.process_checkout_sessions"
+        # close_old_connections would close the connection of the test transaction
+        with mock.patch(f"{command}.close_old_connections"), \
+                mock.patch(f"{command}.process_checkout_batch", side_effect=RuntimeError("down")):
+            with self.assertRaises(RuntimeError):
+                call_command("process_checkout_sessions", once=True, stdout=io.StringIO())
+
+    def test_event_worker_once_stops_on_error(self):
+        command = "booking.management.commands.process_stripe_events"
+        with mock.patch(f"{command}.close_old_connections"), \
+                mock.patch(f"{command}.process_events", side_effect=RuntimeError("down")):
+            with self.assertRaises(RuntimeError):
+                call_command("process_stripe_events", once=True, stdout=io.StringIO())
+
+    def test_payment_after_the_order_expired_is_flagged_for_refund(self):
+        Transaction.objects.filter(id=self.tx.id).update(status=Transaction.Status.FAILED)
+        Order.objects.filter(id=self.paid_order.id).update(status=Order.Status.CANCELLED)
+        self.event("evt_5", SESSION_COMPLETED)
+
+        with self.assertLogs("booking", "ERROR") as logs:
+            process_event_batch()
+
+        self.tx.refresh_from_db()
+        self.paid_order.refresh_from_db()
+        self.assertTrue(self.tx.refund_required)
+        self.assertEqual(self.tx.status, Transaction.Status.FAILED)
+        self.assertEqual(self.tx.provider_transaction_id, "pi_test")
+        self.assertEqual(self.paid_order.status, Order.Status.CANCELLED)
+        self.assertIn("needs a refund", logs.output[0])
+
+    def test_event_without_metadata_is_marked_with_an_error(self):
+        StripeEvent.objects.create(event_id="evt_4", type=SESSION_COMPLETED, payload={})
+
+        process_events()
+
+        event = StripeEvent.objects.get(event_id="evt_4")
+        self.assertIsNotNone(event.processed_at)
+        self.assertTrue(event.error)
+
+
+class ExpiryTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.flight = create_flight()
+
+    def old_order(self):
+        self.order(ticket(self.flight))
+        order = Order.objects.latest("id")
+        Order.objects.filter(id=order.id).update(created_at=timezone.now() - timedelta(hours=2))
+        return order
+
+    def test_abandoned_order_is_cancelled_and_seats_released(self):
+        order = self.old_order()
+
+        self.assertEqual(expire_pending_orders(older_than=timedelta(minutes=30)), [order.id])
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.Status.CANCELLED)
+        self.assertEqual(inventory(self.flight).held, 0)
+
+    def test_order_in_checkout_is_kept(self):
+        order = self.old_order()
+        start_checkout(Order.objects.with_totals().get(id=order.id))
+
+        self.assertEqual(expire_pending_orders(older_than=timedelta(minutes=30)), [])
+
+    def test_recent_order_is_kept(self):
+        self.order(ticket(self.flight))
+
+        self.assertEqual(expire_pending_orders(older_than=timedelta(minutes=30)), [])
+
+    def checkout(self, order, expires_in):
+        tx = start_checkout(Order.objects.with_totals().get(id=order.id))
+        Transaction.objects.filter(id=tx.id).update(
+            created_at=timezone.now() - timedelta(hours=3),
+            checkout_expires_at=timezone.now() + expires_in,
+        )
+        return tx
+
+    def test_session_claimed_late_is_kept_until_it_expires(self):
+        # Checkout worker fell behind: the session was created long after the order
+        order = self.old_order()
+        self.checkout(order, expires_in=timedelta(minutes=20))
+
+        self.assertEqual(expire_pending_orders(older_than=timedelta(minutes=30)), [])
+
+    def test_expired_session_past_the_webhook_grace_is_cancelled(self):
+        order = self.old_order()
+        tx = self.checkout(order, expires_in=-timedelta(hours=2))
+
+        self.assertEqual(expire_pending_orders(older_than=timedelta(minutes=30)), [order.id])
+
+        tx.refresh_from_db()
+        self.assertEqual(tx.status, Transaction.Status.FAILED)
+
+    def test_order_with_an_unprocessed_event_is_kept(self):
+        order = self.old_order()
+        tx = self.checkout(order, expires_in=-timedelta(hours=2))
+        # Metadata values are strings in real Stripe payloads
+        StripeEvent.objects.create(
+            event_id="evt_late", type=SESSION_COMPLETED,
+            payload={"data": {"object": {"metadata": {
+                "order_id": str(order.id), "transaction_id": str(tx.id),
+            }}}},
+        )
+
+        self.assertEqual(expire_pending_orders(older_than=timedelta(minutes=30)), [])
+
+        process_event_batch()
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.Status.PAID)
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    """
+    Real concurrent transactions: seat searches of one cabin run side by
+    side, nobody gets a seat twice and nothing is oversold
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.flight = create_flight(rows=1, letters="ABC")
+        self.users = [
+            User.objects.create_user(f"user{number}", f"user{number}@example.com", "password")
+            for number in range(5)
+        ]
+
+    def test_no_seat_is_sold_twice(self):
+        results = []
+        start = threading.Barrier(len(self.users))
+
+        def book(user):
+            client = APIClient()
+            client.force_authenticate(user)
+            start.wait()
+            try:
+                response = client.post(
+                    reverse("order-list"), {"tickets": [ticket(self.flight)]}, format="json"
+                )
+                results.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=book, args=(user,)) for user in self.users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count(status.HTTP_201_CREATED), 3)
+        # Sold out, or lost the race for seats still being booked (retryable)
+        self.assertEqual(
+            results.count(status.HTTP_400_BAD_REQUEST) + results.count(status.HTTP_409_CONFLICT), 2
+        )
+        seats = list(Ticket.objects.filter(flight=self.flight).values_list("seat_id", flat=True))
+        self.assertEqual(len(seats), len(set(seats)))
+        self.assertEqual(inventory(self.flight).held, 3)
+
+    def test_reconcile_counts_a_booking_committed_while_it_waits(self):
+        reserved = threading.Event()
+        seat = Seat.objects.filter(airplane_type=self.flight.airplane.airplane_type).first()
+
+        def booking():
+            try:
+                with transaction.atomic():
+                    reserve_seats({(self.flight.id, seat.seat_type): 1})
+                    order = Order.objects.create(user=self.users[0])
+                    Ticket.objects.create(
+                        order=order, flight=self.flight, seat=seat, price=self.flight.price,
+                        passenger_first_name="Ann", passenger_last_name="Lee",
+                    )
+                    reserved.set()
+                    # Reconcile has started by now and waits for the inventory rows
+                    time.sleep(0.5)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=booking)
+        thread.start()
+        self.assertTrue(reserved.wait(10))
+        reconcile_inventory([self.flight.id])
+        thread.join()
+
+        self.assertEqual(inventory(self.flight).held, 1)
+
+    def test_open_booking_does_not_block_the_next_one(self):
+        picked, finish = threading.Event(), threading.Event()
+        first_seats = []
+
+        def first_booking():
+            try:
+                with transaction.atomic():
+                    first_seats.extend(assign_seats(self.flight, Seat.SeatType.ECONOMY, 1))
+                    picked.set()
+                    finish.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=first_booking)
+        thread.start()
+        self.assertTrue(picked.wait(10))
+
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        try:
+            response = client.post(
+                reverse("order-list"), {"tickets": [ticket(self.flight)]}, format="json"
+            )
+        finally:
+            finish.set()
+            thread.join()
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotEqual(Ticket.objects.get(flight=self.flight).seat, first_seats[0])
+
+    def test_seats_locked_by_open_bookings_are_busy_not_sold_out(self):
+        picked, finish = threading.Event(), threading.Event()
+
+        def first_booking():
+            try:
+                with transaction.atomic():
+                    assign_seats(self.flight, Seat.SeatType.ECONOMY, 3)
+                    picked.set()
+                    finish.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=first_booking)
+        thread.start()
+        self.assertTrue(picked.wait(10))
+
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        try:
+            response = client.post(
+                reverse("order-list"), {"tickets": [ticket(self.flight)]}, format="json"
+            )
+        finally:
+            finish.set()
+            thread.join()
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["detail"].code, "seats_busy")
+
+
+class ExportTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        flight = create_flight()
+        self.order(ticket(flight), ticket(flight))
+        self.own_order = Order.objects.get()
+        other = APIClient()
+        other.force_authenticate(self.other)
+        self.order(ticket(flight), client=other)
+
+    def export(self, **params):
+        return self.client.get(reverse("order-export"), params)
+
+    def test_csv_with_chosen_columns(self):
+        response = self.export(format="csv", columns="id,status,total_amount")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertEqual(
+            b"".join(response.streaming_content).decode().splitlines(),
+            ["id,status,total_amount", f"{self.own_order.id},PENDING,200.00"],
+        )
+
+    def test_ndjson_has_all_columns_by_default(self):
+        response = self.export(format="ndjson")
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(
+            list(rows[0]), ["id", "user_id", "user__email", "status", "created_at", "total_amount"]
+        )
+        self.assertEqual(rows[0]["total_amount"], "200.00")
+
+    def test_unknown_column_is_rejected(self):
+        response = self.export(format="csv", columns="id,password")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertIn("password", response.json()["columns"])
+
+    def test_unknown_format_is_rejected(self):
+        response = self.export(format="xml")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("xml", response.json()["format"])
+
+
+class ManifestTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.flight = create_flight()
+        seats = {seat.seat: seat for seat in Seat.objects.filter(airplane_type=self.flight.airplane.airplane_type)}
+        self.order(ticket(self.flight, seats["C"], last_name="Roe"), ticket(self.flight, seats["A"]))
+        self.order(ticket(self.flight, seats["B"], last_name="Cancelled"))
+        Ticket.objects.filter(passenger_last_name="Cancelled").update(status=Ticket.Status.CANCELLED)
+
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.force_authenticate(self.admin)
+
+    def manifest(self, **params):
+        return self.client.get(reverse("flight-manifest", args=[self.flight.id]), params)
+
+    def test_json_is_sorted_by_seat_without_cancelled_tickets(self):
+        response = self.manifest(format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = json.loads(b"".join(response.streaming_content))
+        self.assertEqual([(row["row"], row["seat"]) for row in rows], [(1, "A"), (1, "C")])
+        self.assertEqual(rows[1]["last_name"], "Roe")
+        self.assertEqual(rows[1]["cabin"], Seat.SeatType.ECONOMY)
+        self.assertEqual(rows[1]["order_status"], Order.Status.PENDING)
+
+    def test_csv(self):
+        response = self.manifest(format="csv")
+
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(
+            lines[0], "row,seat,cabin,first_name,last_name,ticket_status,order,order_status"
+        )
+        self.assertEqual(len(lines), 3)
+
+    def test_only_admins(self):
+        self.client.force_authenticate(self.user)
+
+        self.assertEqual(self.manifest().status_code, status.HTTP_403_FORBIDDEN)
+
+
+class TicketPriceTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.flight = create_flight()
+        self.order(ticket(self.flight), ticket(self.flight))
+        self.booked_order = Order.objects.get()
+
+    def test_ticket_keeps_its_price_after_the_fare_changes(self):
+        self.flight.price = 150
+        self.flight.save()
+
+        self.assertEqual(list(Ticket.objects.values_list("price", flat=True)), [100, 100])
+        response = self.client.get(reverse("order-detail", args=[self.booked_order.id]))
+        self.assertEqual(response.data["total_amount"], "200.00")
+        self.assertEqual(
+            [item["price"] for item in response.data["tickets"]], ["100.00", "100.00"]
+        )
+        self.assertEqual(start_checkout(Order.objects.with_totals().get()).amount, 200)
+
+    def test_cancelled_tickets_are_not_in_the_total(self):
+        Ticket.objects.filter(id=self.booked_order.tickets.first().id).update(
+            status=Ticket.Status.CANCELLED
+        )
+
+        self.assertEqual(Order.objects.with_totals().get().total_amount, 100)
+
+
+class SeatMapTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.flight = create_flight(rows=1, letters="ABC")
+        self.seats = {
+            seat.seat: seat for seat in Seat.objects.filter(airplane_type=self.flight.airplane.airplane_type)
+        }
+
+    def seat_map(self):
+        return self.client.get(reverse("flight-seatmap", args=[self.flight.id]))
+
+    def test_taken_and_held_seats_are_marked(self):
+        self.order(ticket(self.flight, self.seats["A"]))
+        create_hold(self.other.id, self.flight.id, [self.seats["B"].id])
+
+        response = self.seat_map()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(seat["seat"], seat["taken"], seat["held"]) for seat in response.data["seats"]],
+            [("A", True, False), ("B", False, True), ("C", False, False)],
+        )
+        self.assertEqual((response.data["capacity"], response.data["available"]), (3, 1))
+
+    def test_new_seat_shows_up_after_commit(self):
+        self.assertEqual(self.seat_map().data["capacity"], 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Seat.objects.create(airplane_type=self.flight.airplane.airplane_type, row=2, seat="A")
+
+        self.assertEqual(self.seat_map().data["capacity"], 4)
+
+    def test_seat_layout_is_synced_once_per_transaction(self):
+        airplane_type = self.flight.airplane.airplane_type
+        with mock.patch("airport.signals.seats_changed") as synced:
+            with self.captureOnCommitCallbacks(execute=True):
+                for letter in "ABC":
+                    Seat.objects.create(airplane_type=airplane_type, row=2, seat=letter)
+
+        synced.assert_called_once_with(airplane_type.id)
+
+    def test_rolled_back_seat_change_does_not_block_the_sync(self):
+        airplane_type = self.flight.airplane.airplane_type
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                Seat.objects.create(airplane_type=airplane_type, row=2, seat="A")
+                Seat.objects.create(airplane_type=airplane_type, row=1, seat="A")
+            Seat.objects.create(airplane_type=airplane_type, row=3, seat="A")
+
+        self.assertEqual(self.seat_map().data["capacity"], 4)
+
+
+class FlightAvailabilityTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.full = create_flight(rows=1, letters="AB", flight_number="PS101")
+        self.free = create_flight(rows=1, letters="ABC", flight_number="PS102")
+        self.order(ticket(self.full), ticket(self.full), ticket(self.free))
+
+    def flights(self, **params):
+        response = self.client.get(reverse("flight-list"), params)
+        return {flight["id"]: flight["available_seats"] for flight in response.data["results"]}
+
+    def test_available_seats_of_a_page(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(self.flights(), {self.full.id: 0, self.free.id: 2})
+
+    def test_has_seats(self):
+        self.assertEqual(list(self.flights(has_seats="true")), [self.free.id])
+        self.assertEqual(list(self.flights(has_seats="false")), [self.full.id])
+
+    def test_available_seats_gte(self):
+        self.assertEqual(list(self.flights(available_seats__gte=2)), [self.free.id])
+        self.assertEqual(self.flights(available_seats__gte=3), {})
+
+
+class GenerateDatasetTests(TransactionTestCase):
+    """
+    The generator writes with COPY and reserves id ranges from the
+    sequences, so it runs on real transactions
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def generate(self, **options):
+        call_command(
+            "generate_dataset", seed=1, countries=2, cities_per_country=2, airlines=2,
+            fleet_size=2, users=20, days=2, flights_per_day=3, stdout=io.StringIO(), **options,
+        )
+
+    def test_small_dataset(self):
+        self.generate()
+
+        self.assertEqual(Airport.objects.count(), 4)
+        self.assertEqual(Flight.objects.count(), 6)
+        self.assertEqual(User.objects.count(), 20)
+        self.assertTrue(Ticket.objects.exists())
+        # One active ticket per seat and inventory counted from the tickets
+        for flight in Flight.objects.all():
+            active = Ticket.objects.filter(flight=flight).exclude(status=Ticket.Status.CANCELLED)
+            self.assertEqual(active.count(), active.values("seat").distinct().count())
+            rows = FlightInventory.objects.filter(flight=flight)
+            self.assertEqual(sum(row.sold + row.held for row in rows), active.count())
+            self.assertEqual(sum(row.total for row in rows), flight.airplane.airplane_type.capacity)
+        # Flights start tomorrow, their bookings are still made in the past
+        now = timezone.now()
+        self.assertFalse(Order.objects.filter(created_at__gt=now).exists())
+        self.assertFalse(Transaction.objects.filter(updated_at__gt=now).exists())
+        # Order times spread over the booking window, not piled on one instant
+        self.assertGreater(Order.objects.values("created_at").distinct().count(), 1)
+
+    def test_same_seed_and_start_give_the_same_bookings(self):
+        start = timezone.localdate() + timedelta(days=1)
+
+        def snapshot():
+            return [
+                list(model.objects.order_by("id").values_list())
+                for model in (Order, Ticket, Transaction)
+            ]
+
+        runs = []
+        for _ in range(2):
+            # Empty database with sequences from 1, as the first run had
+            call_command("flush", interactive=False, verbosity=0)
+            cache.clear()
+            self.generate(start=start)
+            runs.append(snapshot())
+
+        self.assertTrue(runs[0][0])
+        self.assertEqual(runs[1], runs[0])
@@ -1,13 +1,16 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from .views import TicketViewSet, OrderViewSet, StripeWebhookView, TransactionViewSet
+from .views import (
+    TicketViewSet, OrderViewSet, StripeWebhookView, TransactionViewSet, SeatHoldViewSet
+)
 
 router = DefaultRouter()
 
 router.register(r'tickets', TicketViewSet, basename='ticket')
 router.register(r'orders', OrderViewSet, basename='order')
 router.register(r'transactions', TransactionViewSet, basename='transaction')
+router.register(r'holds', SeatHoldViewSet, basename='seat-hold')
 
 urlpatterns = [
     path('', include(router.urls)),
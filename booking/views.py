@@ -1,33 +1,42 @@
 import os
 
+import json
 import logging
 
 from django.shortcuts import render
-import datetime
 import stripe
-from decimal import Decimal
-from django.conf import settings
-from django.db import transaction
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse
 from rest_framework.views import APIView
 from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 
-from .models import Ticket, Order, Transaction
+from .filters import OrderFilter, TicketFilter, TransactionFilter
+from .holds import (
+    HoldLimitExceeded, HoldsBusy, SeatsUnavailable, create_hold, get_hold, release_hold
+)
+from .models import StripeEvent, Ticket, Order, Transaction
+from .payments import start_checkout
+from .stripe_events import HANDLED_EVENT_TYPES
 from .serializers import (
-    TicketSerializer, OrderSerializer, OrderCreateSerializer, TransactionSerializer
+    TicketSerializer, OrderSerializer, OrderCreateSerializer, TransactionSerializer,
+    SeatHoldSerializer, CheckoutSessionSerializer,
+)
+from core.mixins import (
+    AuditLoggingMixin, IdempotencyMixin, SparseFieldsViewMixin, StreamingExportMixin
 )
-from core.mixins import AuditLoggingMixin
+from core.pagination import OptionalKeysetPagination
 
 
 logger = logging.getLogger("booking")
-stripe.api_key = settings.STRIPE_SECRET_KEY
 
 
 class OrderViewSet(
     AuditLoggingMixin,
+    IdempotencyMixin,               # Idempotency-Key on POST
+    SparseFieldsViewMixin,          # ?fields= / ?expand= on GET
+    StreamingExportMixin,           # GET /export/?format=ndjson|csv
     mixins.CreateModelMixin,        # POST
     mixins.ListModelMixin,          # GET
     mixins.RetrieveModelMixin,      # GET /id/
@@ -35,12 +44,20 @@ class OrderViewSet(
 ):
     """
     ViewSet for Creating and Viewing Orders.
-    - Creates a new order (with tickets).
+    - Creates a new order (with tickets), retries with the same
+      Idempotency-Key header get the first response back.
     - User sees ONLY THEIR orders.
     - Admin sees ALL orders.
+    - export/ streams them as NDJSON or CSV.
     """
 
     permission_classes = [IsAuthenticated]
+    pagination_class = OptionalKeysetPagination
+    keyset_ordering = ('-created_at', '-id')
+    filterset_class = OrderFilter
+    export_fields = (
+        'id', 'user_id', 'user__email', 'status', 'created_at', 'total_amount',
+    )
     logger = logger
 
     def get_queryset(self):
@@ -50,10 +67,11 @@ class OrderViewSet(
         - Admin sees ALL orders.
         """
         user = self.request.user
-        base_queryset = Order.objects.prefetch_related(
+        base_queryset = Order.objects.with_totals().select_related('user').prefetch_related(
             'tickets__seat',
-            'tickets__flight__departure_airport',
-            'tickets__flight__arrival_airport',
+            'tickets__flight__departure_airport__city__country',
+            'tickets__flight__arrival_airport__city__country',
+            'tickets__flight__airplane__airline__home_base__city__country',
             'tickets__flight__airplane__airplane_type',
             'transaction'
         )
@@ -91,6 +109,11 @@ class OrderViewSet(
         permission_classes=[IsAuthenticated],
     )
     def create_checkout_session(self, request, pk=None):
+        """
+        Queue Stripe session creation and return at once (202),
+        process_checkout_sessions creates it, poll checkout-status until it is READY.
+        Retries reuse the pending transaction and its session
+        """
         order = self.get_object()
         user = request.user
 
@@ -110,46 +133,8 @@ class OrderViewSet(
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        expires_at_time = int(
-            (datetime.datetime.now() + datetime.timedelta(minutes=30)).timestamp()
-        )
-
-        line_items = []
-        total_amount = Decimal("0.00")
-
-        for ticket in order.tickets.all():
-            ticket_price = ticket.flight.price
-            total_amount += ticket_price
-
-            logger.debug(
-                f"[Order {order.id}] Processing ticket for flight {ticket.flight.id}. "
-                f"Price found: {ticket_price}"
-            )
-
-            line_items.append({
-                'price_data': {
-                    'currency': 'usd',
-                    'product_data': {
-                        'name': f"Ticket: {ticket.flight.flight_number}",
-                        'description': (
-                            f"Seat {ticket.seat.row}{ticket.seat.seat} for "
-                            f"{ticket.passenger_first_name} {ticket.passenger_last_name}"
-                        ),
-                    },
-                    'unit_amount': int(ticket.flight.price * 100),
-                },
-                'quantity': 1,
-            })
-
-
-        # Create a PENDING transaction before creating a Stripe session
         try:
-            transaction_pending = Transaction.objects.create(
-                order=order,
-                amount=total_amount,
-                currency="usd",
-                status=Transaction.Status.PENDING
-            )
+            transaction_pending = start_checkout(order)
         except Exception as e:
             logger.critical(
                 f"Failed to create PENDING transaction for Order {order.id} (user: {user.id}). "
@@ -161,73 +146,175 @@ class OrderViewSet(
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-        # Create Stripe session
-        try:
-            checkout_session = stripe.checkout.Session.create(
-                line_items=line_items,
-                mode='payment',
-                # Return order id to find it on webhook
-                metadata={'order_id': order.id, 'transaction_id': transaction_pending.id},
-                # URL, where user is redirected
-                success_url="http://example.com/success?session_id={CHECKOUT_SESSION_ID}",
-                cancel_url="http://example.com/cancel",
-
-                expires_at=expires_at_time,
+        if transaction_pending is None:
+            return Response(
+                {"error": "This order cannot be paid. It's already paid or cancelled."},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
-            logger.info(
-                f"Stripe checkout session created successfully for Order {order.id} "
-                f"(Transaction: {transaction_pending.id}). "
-                f"Stripe Session ID: {checkout_session.id}"
+        return self.checkout_response(transaction_pending)
+
+    @action(
+        methods=["GET"],
+        detail=True,
+        url_path="checkout-status",
+        permission_classes=[IsAuthenticated],
+    )
+    def checkout_status(self, request, pk=None):
+        """
+        Latest transaction of the order: QUEUED, READY (with url) or FAILED
+        """
+        order = self.get_object()
+        tx = order.transaction.order_by('-created_at', '-id').first()
+        if tx is None:
+            raise Http404
+        return self.checkout_response(tx)
+
+    def checkout_response(self, tx):
+        response_status = (
+            status.HTTP_202_ACCEPTED
+            if tx.checkout_status == Transaction.CheckoutStatus.QUEUED
+            else status.HTTP_200_OK
+        )
+        return Response(CheckoutSessionSerializer(tx).data, status=response_status)
+
+
+class SeatHoldViewSet(viewsets.ViewSet):
+    """
+    Time-limited seat holds.
+    - POST holds seats for a few minutes (409 if one of them is taken
+      or the user would hold more than SEAT_HOLD_MAX_SEATS_PER_FLIGHT).
+    - The token is passed as "holds" when the order is created.
+    - Holds expire by themselves, DELETE gives seats back earlier.
+    - 503 if the holds of the flight stay locked by other requests too long.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = SeatHoldSerializer
+    lookup_field = 'token'
+
+    def get_own_hold(self, token):
+        hold = get_hold(token)
+        if hold is None or hold['user'] != self.request.user.id:
+            raise Http404
+        return hold
+
+    def busy_response(self, error):
+        logger.warning(f"Seat hold request of user {self.request.user.id} timed out: {error}")
+        return Response(
+            {'error': str(error)},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={'Retry-After': '1'},
+        )
+
+    def create(self, request):
+        serializer = SeatHoldSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        flight = data['flight']
+
+        try:
+            hold = create_hold(request.user.id, flight.id, data['seats'], data.get('minutes'))
+        except SeatsUnavailable as e:
+            logger.info(f"Seat hold rejected for user {request.user.id}: {e}")
+            return Response(
+                {'error': str(e), 'seats': e.seat_ids},
+                status=status.HTTP_409_CONFLICT
             )
-            return Response({'sessionId': checkout_session['id'], 'url': checkout_session.url})
-        except Exception as e:
-            logger.error(
-                f"Stripe API Error for Order {order.id} (Transaction: {transaction_pending.id}). "
-                f"Error: {e}",
-                exc_info=True
+        except HoldLimitExceeded as e:
+            logger.info(f"Seat hold rejected for user {request.user.id}: {e}")
+            return Response(
+                {'error': str(e), 'held': e.held, 'limit': e.limit},
+                status=status.HTTP_409_CONFLICT
             )
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        except HoldsBusy as e:
+            return self.busy_response(e)
+
+        logger.info(
+            f"User {request.user.id} held seats {hold['seats']} "
+            f"on flight {flight.id} until {hold['expires_at']}."
+        )
+        return Response(hold, status=status.HTTP_201_CREATED)
+
+    def retrieve(self, request, token=None):
+        return Response(self.get_own_hold(token))
+
+    def destroy(self, request, token=None):
+        self.get_own_hold(token)
+        try:
+            release_hold(token)
+        except HoldsBusy as e:
+            return self.busy_response(e)
+        logger.info(f"User {request.user.id} released seat hold {token}.")
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 
 class TicketViewSet(
     AuditLoggingMixin,
+    SparseFieldsViewMixin,
+    StreamingExportMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     viewsets.GenericViewSet
 ):
     """
-    (For Admins) Read-Only ViewSet to view ALL tickets in the system
+    (For Admins) Read-Only ViewSet to view ALL tickets in the system,
+    export/ streams them as NDJSON or CSV
     """
     queryset = Ticket.objects.select_related(
         'order__user',
         'seat',
-        'flight__departure_airport',
-        'flight__arrival_airport',
+        'flight__departure_airport__city__country',
+        'flight__arrival_airport__city__country',
+        'flight__airplane__airline__home_base__city__country',
         'flight__airplane__airplane_type'
     )
     serializer_class = TicketSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = OptionalKeysetPagination
+    keyset_ordering = ('passenger_last_name', 'passenger_first_name', 'id')
+    filterset_class = TicketFilter
+    export_fields = (
+        'id', 'order_id', 'order__created_at', 'status', 'price',
+        'passenger_first_name', 'passenger_last_name',
+        'flight_id', 'flight__flight_number', 'flight__departure_time',
+        'seat__row', 'seat__seat', 'seat__seat_type',
+    )
     logger = logger
 
 
-class TransactionViewSet(viewsets.ReadOnlyModelViewSet):
+class TransactionViewSet(
+    SparseFieldsViewMixin,
+    StreamingExportMixin,
+    viewsets.ReadOnlyModelViewSet
+):
     """
-    VeiwSet for Transactions, only for admin
+    VeiwSet for Transactions, only for admin,
+    export/ streams them as NDJSON or CSV
     """
     queryset = Transaction.objects.all().select_related("order__user")
     serializer_class = TransactionSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = OptionalKeysetPagination
+    keyset_ordering = ('-created_at', '-id')
+    filterset_class = TransactionFilter
+    export_fields = (
+        'id', 'order_id', 'order__user_id', 'status', 'amount', 'currency',
+        'provider_transaction_id', 'checkout_status', 'refund_required',
+        'created_at', 'updated_at',
+    )
+    logger = logger
 
 
 class StripeWebhookView(APIView):
     """
-    Get msg from Stripe about success payment and update status
+    Get msg from Stripe about payment, store it in the inbox and acknowledge.
+    Orders and transactions are updated by process_stripe_events
     """
     def post(self, request):
         logger.debug("Stripe webhook received.")
 
         payload = request.body
-        sig_header = request.META['HTTP_STRIPE_SIGNATURE']
+        sig_header = request.META.get('HTTP_STRIPE_SIGNATURE')
         event = None
         webhook_secret = os.getenv("STRIPE_WEBHOOK_SECRET")
 
@@ -247,6 +334,9 @@ class StripeWebhookView(APIView):
             logger.warning(f"Stripe webhook signature verification failed: {e}", exc_info=True)
             return HttpResponse(status=400)
 
+        if event['type'] not in HANDLED_EVENT_TYPES:
+            return HttpResponse(status=200)
+
         session = event['data']['object']
         metadata = session.get('metadata', {})
         order_id = metadata.get('order_id')
@@ -259,75 +349,18 @@ class StripeWebhookView(APIView):
             )
             return HttpResponse("Missing metadata in webhook", status=400)
 
-
-        # Update Order and Transaction  together or not at all
-        try:
-            with transaction.atomic():
-                order = Order.objects.get(id=order_id)
-                tx = Transaction.objects.get(id=transaction_id)
-
-                # Checking if this webhook haven't already processed
-                if tx.status != Transaction.Status.PENDING:
-                    logger.info(
-                        f"Webhook for Transaction {tx.id} (Order {order.id}) "
-                        f"already processed. Current status: {tx.status}."
-                    )
-                    return HttpResponse(f"Transaction {tx.id} already processed.", status=200)
-
-                if event['type'] == 'checkout.session.completed':
-                    # Update transaction
-                    tx.status = Transaction.Status.SUCCESS
-                    # Save id from Stripe
-                    tx.provider_transaction_id = session.get('payment_intent') or session.id
-                    tx.save()
-
-                    # Update order
-                    order.status = Order.Status.PAID
-                    order.save()
-                    logger.info(
-                        f"Order {order_id} PAID via Stripe. "
-                        f"Transaction {tx.id} set to SUCCESS. "
-                        f"Stripe Payment Intent: {tx.provider_transaction_id}"
-                    )
-
-                elif event['type'] == 'checkout.session.expired':
-                    # Update transaction
-                    tx.status = Transaction.Status.FAILED
-                    tx.save()
-
-                    # Update order
-                    order.status = Order.Status.CANCELLED
-                    order.save()
-                    logger.warning(
-                        f"Stripe checkout session for Order {order_id} EXPIRED. "
-                        f"Transaction {tx.id} set to FAILED."
-                    )
-
-        except Order.DoesNotExist:
-            logger.error(
-                f"Stripe Webhook ERROR: Order.DoesNotExist for ID {order_id}. "
-                f"Metadata: {metadata}"
-            )
-            return HttpResponse(status=404)
-        except Transaction.DoesNotExist:
-            logger.error(
-                f"Stripe Webhook ERROR: Transaction.DoesNotExist for ID {transaction_id}. "
-                f"Metadata: {metadata}"
-            )
-            return HttpResponse(status=404)
-        except Exception as e:
-            logger.critical(
-                f"Stripe Webhook CRITICAL unknown error. Metadata: {metadata}. Error: {e}",
-                exc_info=True
-            )
-            return HttpResponse(status=500)
+        # One INSERT, redeliveries of the same event are ignored
+        StripeEvent.objects.bulk_create(
+            [StripeEvent(
+                event_id=event['id'],
+                type=event['type'],
+                payload=json.loads(payload),
+            )],
+            ignore_conflicts=True,
+        )
 
         logger.info(
-            f"Stripe webhook POST success"
+            f"Stripe event {event['id']} ({event['type']}) stored "
+            f"for Order {order_id}, Transaction {transaction_id}."
         )
         return HttpResponse(status=200)
-
-
-
-
-
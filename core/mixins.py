@@ -1,8 +1,22 @@
 # core/mixins.py
 
+import hashlib
 import logging
-from django.http import Http404
-from rest_framework import serializers, exceptions
+import time
+from django.core.cache import cache
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import serializers, exceptions, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .renderers import CSVRenderer, NDJSONRenderer
+from .serializers import (
+    SparseFieldsMixin, get_relation_paths, get_sparse_params, nested_serializer
+)
+from .versioning import get_model_version
 
 
 class AuditLoggingMixin:
@@ -70,7 +84,7 @@ class AuditLoggingMixin:
             # Err 404
             self.logger.warning(
                 f"{user_str} Not Found (404) on {action} "
-                f"in {view_name}: {exc.detail}"
+                f"in {view_name}: {exc}"
             )
 
         else:
@@ -81,4 +95,292 @@ class AuditLoggingMixin:
                 exc_info=True
             )
 
-        return response
\ No newline at end of file
+        return response
+
+
+class ConditionalGetMixin:
+    """
+    Weak ETag and Last-Modified for list/retrieve of rarely changing data.
+    Built from versions of 'etag_models' (bumped by model signals),
+    so a matching If-None-Match gets 304 without touching the database.
+    """
+    # Models whose data is in the response (nested serializers included)
+    etag_models = ()
+
+    def get_etag_models(self):
+        return self.etag_models or (self.queryset.model,)
+
+    def get_validators(self, request):
+        versions = [get_model_version(model) for model in self.get_etag_models()]
+        key = ":".join([
+            self.__class__.__name__,
+            request.get_full_path(),
+            request.accepted_media_type or "",
+            *[repr(version) for version in versions],
+        ])
+        etag = f'W/"{hashlib.md5(key.encode()).hexdigest()}"'
+        return etag, max(versions)
+
+    @staticmethod
+    def is_not_modified(request, etag, last_modified):
+        if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+        if if_none_match:
+            # Weak comparison, W/ prefix does not matter
+            strong = etag.removeprefix("W/")
+            return any(
+                tag == "*" or tag.removeprefix("W/") == strong
+                for tag in parse_etags(if_none_match)
+            )
+
+        if_modified_since = parse_http_date_safe(request.META.get("HTTP_IF_MODIFIED_SINCE", ""))
+        return if_modified_since is not None and last_modified <= if_modified_since
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(request)
+        headers = {"ETag": etag, "Last-Modified": http_date(last_modified)}
+
+        if self.is_not_modified(request, etag, last_modified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            for name, value in headers.items():
+                response[name] = value
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request, *args, **kwargs)
+
+
+IDEMPOTENCY_CACHE_KEY = "idempotency:{view}:{user}:{key}"
+
+
+class IdempotencyMixin:
+    """
+    Idempotency-Key header for create().
+    The first response is stored per user and key and replayed for retries
+    without validation or DB writes. A duplicate that arrives while the first
+    request is still running waits for its response.
+    """
+    # How long a response is replayed
+    idempotency_ttl = 60 * 60 * 24
+    # How long a duplicate waits for the first request, then 409
+    idempotency_wait = 10
+    # Lock safety net if the first request dies
+    idempotency_lock_timeout = 60
+    idempotency_max_key_length = 255
+
+    def get_idempotency_cache_key(self, request, key):
+        return IDEMPOTENCY_CACHE_KEY.format(
+            view=self.__class__.__name__,
+            user=request.user.pk,
+            key=hashlib.sha256(key.encode()).hexdigest(),
+        )
+
+    @staticmethod
+    def replay(stored, fingerprint):
+        if stored["fingerprint"] != fingerprint:
+            return Response(
+                {"error": "Idempotency-Key was already used with a different request."},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        return Response(
+            stored["data"],
+            status=stored["status"],
+            headers={"Idempotent-Replayed": "true"},
+        )
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get("Idempotency-Key")
+        if not key:
+            return super().create(request, *args, **kwargs)
+
+        if len(key) > self.idempotency_max_key_length:
+            return Response(
+                {"error": f"Idempotency-Key is longer than {self.idempotency_max_key_length}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        cache_key = self.get_idempotency_cache_key(request, key)
+        lock_key = f"{cache_key}:lock"
+        fingerprint = hashlib.sha256(request.body).hexdigest()
+
+        deadline = time.monotonic() + self.idempotency_wait
+        while True:
+            stored = cache.get(cache_key)
+            if stored is not None:
+                return self.replay(stored, fingerprint)
+            if cache.add(lock_key, fingerprint, self.idempotency_lock_timeout):
+                break
+            if time.monotonic() > deadline:
+                return Response(
+                    {"error": "A request with this Idempotency-Key is still in progress."},
+                    status=status.HTTP_409_CONFLICT
+                )
+            time.sleep(0.05)
+
+        try:
+            response = self.handle_create(request, *args, **kwargs)
+            # Server errors are not final, the client may retry them
+            if response.status_code < 500:
+                cache.set(cache_key, {
+                    "fingerprint": fingerprint,
+                    "status": response.status_code,
+                    "data": response.data,
+                }, self.idempotency_ttl)
+        finally:
+            cache.delete(lock_key)
+
+        return response
+
+    def handle_create(self, request, *args, **kwargs):
+        """
+        create() with 4xx exceptions turned into responses, so they are stored too
+        """
+        try:
+            return super().create(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return self.handle_exception(exc)
+
+
+def _trim_lookup(lookup, paths):
+    """
+    Longest prefix of a related lookup that is still rendered, else None
+    """
+    parts = lookup.split('__')
+    for end in range(len(parts), 0, -1):
+        prefix = '__'.join(parts[:end])
+        if prefix in paths:
+            return prefix
+    return None
+
+
+def _select_related_lookups(tree, prefix=''):
+    for name, subtree in tree.items():
+        if subtree:
+            yield from _select_related_lookups(subtree, f"{prefix}{name}__")
+        else:
+            yield prefix + name
+
+
+class SparseFieldsViewMixin:
+    """
+    ?fields= and ?expand= (see core/serializers.py) also trim
+    select_related/prefetch_related to relations that are still nested
+    """
+    def filter_queryset(self, queryset):
+        # Here and not in get_queryset(): views often override that one
+        return self.trim_related(super().filter_queryset(queryset))
+
+    def trim_related(self, queryset):
+        only, expand = get_sparse_params(self.request)
+        if only is None and expand is None:
+            return queryset
+
+        serializer = nested_serializer(self.get_serializer()) or self.get_serializer()
+        if not isinstance(serializer, SparseFieldsMixin):
+            return queryset
+        paths = get_relation_paths(serializer)
+
+        select_related = queryset.query.select_related
+        if isinstance(select_related, dict):
+            lookups = {
+                _trim_lookup(lookup, paths)
+                for lookup in _select_related_lookups(select_related)
+            } - {None}
+            queryset = queryset.select_related(None)
+            if lookups:
+                queryset = queryset.select_related(*lookups)
+
+        prefetch = queryset._prefetch_related_lookups
+        if prefetch:
+            lookups = []
+            for lookup in prefetch:
+                if isinstance(lookup, str):
+                    lookup = _trim_lookup(lookup, paths)
+                if lookup is not None and lookup not in lookups:
+                    lookups.append(lookup)
+            queryset = queryset.prefetch_related(None).prefetch_related(*lookups)
+
+        return queryset
+
+
+class StreamingExportMixin:
+    """
+    GET .../export/?format=ndjson|csv streams every row the list endpoint
+    would return (same permissions and filters, no pagination).
+    Rows are values() dicts read from a server-side cursor, memory stays
+    flat however many rows there are.
+
+    The view sets 'export_fields' (values() lookups, the first one must be
+    unique), ?columns= picks a subset of them. ?fields= stays the sparse
+    fieldset of the JSON API and is not used here.
+    """
+    export_fields = ()
+    export_chunk_size = 2000
+    export_name = None
+
+    def perform_content_negotiation(self, request, force=False):
+        try:
+            return super().perform_content_negotiation(request, force)
+        except Http404 as exc:
+            # DRF answers an unknown ?format= with 404
+            if self.action != 'export':
+                raise
+            requested = request.query_params.get(api_settings.URL_FORMAT_OVERRIDE)
+            supported = ', '.join(renderer.format for renderer in self.get_renderers())
+            raise exceptions.ValidationError({
+                'format': f"Unsupported export format '{requested}'. Supported: {supported}."
+            }) from exc
+
+    def get_export_fields(self):
+        requested = self.request.query_params.get('columns')
+        if not requested:
+            return list(self.export_fields)
+
+        fields = [name.strip() for name in requested.split(',') if name.strip()]
+        unknown = [name for name in fields if name not in self.export_fields]
+        if unknown:
+            raise exceptions.ValidationError({
+                'columns': f"Unknown export columns: {', '.join(unknown)}. "
+                           f"Available: {', '.join(self.export_fields)}."
+            })
+        return fields
+
+    def get_export_queryset(self, fields):
+        queryset = self.filter_queryset(self.get_queryset())
+        return (
+            queryset
+            .prefetch_related(None)
+            .order_by(self.export_fields[0])
+            .values(*fields)
+            .iterator(chunk_size=self.export_chunk_size)
+        )
+
+    @action(
+        methods=['GET'],
+        detail=False,
+        renderer_classes=[NDJSONRenderer, CSVRenderer],
+        pagination_class=None,
+    )
+    def export(self, request):
+        fields = self.get_export_fields()
+        renderer = request.accepted_renderer
+        rows = self.get_export_queryset(fields)
+
+        name = self.export_name or self.basename
+        filename = f"{name}-{timezone.now():%Y%m%d-%H%M%S}.{renderer.format}"
+        response = StreamingHttpResponse(
+            renderer.stream(rows, fields),
+            content_type=renderer.media_type,
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+
+        self.logger.info(
+            f"User {request.user.id} exported {name} as {renderer.format} "
+            f"(columns: {', '.join(fields)})"
+        )
+        return response
@@ -0,0 +1,198 @@
+# core/pagination.py
+
+import base64
+import datetime
+import json
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination:
+    WHERE (ordering fields) > (values of the last row) LIMIT page_size.
+
+    The view sets 'keyset_ordering', the last field must be unique (id).
+    Cursor is opaque base64 of the boundary row values and direction.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.model = queryset.model
+        self.ordering = [
+            (name.lstrip('-'), name.startswith('-'))
+            for name in view.keyset_ordering
+        ]
+
+        values, reverse = self.decode_cursor(request)
+
+        # Going back = same seek over the inverted ordering
+        ordering = [
+            (name, descending != reverse)
+            for name, descending in self.ordering
+        ]
+        queryset = queryset.order_by(*[
+            f"-{name}" if descending else name
+            for name, descending in ordering
+        ])
+        if values is not None:
+            queryset = queryset.filter(self.get_seek_filter(ordering, values))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if reverse:
+            rows.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = values is not None
+
+        self.page = rows
+        return rows
+
+    @staticmethod
+    def get_seek_filter(ordering, values):
+        """
+        (a, b, id) > (x, y, z) spelled out with mixed directions:
+        a > x OR (a = x AND b > y) OR (a = x AND b = y AND id > z)
+        """
+        seek = Q()
+        for position, (name, descending) in enumerate(ordering):
+            condition = Q(**{f"{name}__{'lt' if descending else 'gt'}": values[position]})
+            for previous, (previous_name, _) in enumerate(ordering[:position]):
+                condition &= Q(**{previous_name: values[previous]})
+            seek |= condition
+
+        # Redundant range on the leading column lets the planner seek the index
+        first_name, first_descending = ordering[0]
+        bound = Q(**{f"{first_name}__{'lte' if first_descending else 'gte'}": values[0]})
+        return bound & seek
+
+    # --- Cursor ---
+    @staticmethod
+    def encode_value(value):
+        if isinstance(value, (datetime.datetime, datetime.date)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+
+    def encode_cursor(self, instance, reverse):
+        values = [
+            self.encode_value(getattr(instance, name))
+            for name, _ in self.ordering
+        ]
+        data = json.dumps({'v': values, 'r': reverse}, separators=(',', ':'))
+        cursor = base64.urlsafe_b64encode(data.encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            raw_values, reverse = data['v'], bool(data['r'])
+            if len(raw_values) != len(self.ordering):
+                raise ValueError
+            values = [
+                self.model._meta.get_field(name).to_python(value)
+                for (name, _), value in zip(self.ordering, raw_values)
+            ]
+        except (TypeError, ValueError, KeyError, ValidationError) as exc:
+            raise NotFound(self.invalid_cursor_message) from exc
+
+        return values, reverse
+
+    # --- Response ---
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class OptionalKeysetPagination(PageNumberPagination):
+    """
+    Page numbers by default.
+    ?pagination=cursor (and then ?cursor=...) switches to keyset pagination
+    """
+    mode_query_param = 'pagination'
+    keyset_class = KeysetPagination
+
+    def use_keyset(self, request):
+        return (
+            self.keyset_class.cursor_query_param in request.query_params
+            or request.query_params.get(self.mode_query_param) == 'cursor'
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.use_keyset(request):
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters += [
+            {
+                'name': self.mode_query_param,
+                'required': False,
+                'in': 'query',
+                'description': "Set to 'cursor' for keyset pagination.",
+                'schema': {'type': 'string', 'enum': ['cursor']},
+            },
+            {
+                'name': self.keyset_class.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Opaque cursor from next/previous links.',
+                'schema': {'type': 'string'},
+            },
+        ]
+        return parameters
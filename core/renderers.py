@@ -0,0 +1,211 @@
+# core/renderers.py
+
+import csv
+import datetime
+import decimal
+
+import msgpack
+import orjson
+from django.utils.http import parse_header_parameters
+from rest_framework import renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.utils.encoders import JSONEncoder
+
+
+_drf_encoder = JSONEncoder()
+
+
+def encode_default(obj):
+    """
+    Types orjson/msgpack do not know natively (Decimal, lazy strings, ...)
+    are converted the same way DRF's JSONEncoder does
+    """
+    return _drf_encoder.default(obj)
+
+
+class ORJSONRenderer(renderers.BaseRenderer):
+    """
+    Drop-in for DRF's JSONRenderer: same output, serialized by orjson
+    """
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+    # "2026-11-01T10:00:00Z" like DRF, not "+00:00"
+    options = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+    def get_options(self, accepted_media_type, renderer_context):
+        options = self.options
+        # Browsable API and "Accept: application/json; indent=4" ask for pretty output
+        indent = (renderer_context or {}).get('indent')
+        if accepted_media_type:
+            _, params = parse_header_parameters(accepted_media_type)
+            indent = indent or params.get('indent')
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return orjson.dumps(
+            data,
+            default=encode_default,
+            option=self.get_options(accepted_media_type, renderer_context),
+        )
+
+
+class ORJSONParser(BaseParser):
+    media_type = 'application/json'
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}') from exc
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    """
+    Opt-in binary format: "Accept: application/msgpack" or ?format=msgpack
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=encode_default, use_bin_type=True)
+
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.ExtraData, msgpack.FormatError, msgpack.StackError) as exc:
+            raise ParseError(f'MessagePack parse error - {exc}') from exc
+
+
+class StreamingRenderer(renderers.BaseRenderer):
+    """
+    Base for export formats. stream() turns an iterator of values() rows
+    into byte chunks for StreamingHttpResponse, render() is only used for
+    error responses of the export actions
+    """
+    charset = None
+    # Rows per yielded chunk: fewer, larger writes to the socket
+    chunk_rows = 500
+
+    @staticmethod
+    def default(obj):
+        # Money stays exact, "100.00" like DecimalField in the API
+        if isinstance(obj, decimal.Decimal):
+            return str(obj)
+        return encode_default(obj)
+
+    def stream(self, rows, fields):
+        raise NotImplementedError
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """
+        Errors are JSON whatever format was asked for, a client reading
+        CSV or NDJSON should not parse them as rows
+        """
+        if data is None:
+            return b''
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = ORJSONRenderer.media_type
+        return orjson.dumps(data, default=self.default, option=ORJSONRenderer.options)
+
+
+class NDJSONRenderer(StreamingRenderer):
+    """
+    One JSON object per line
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    options = ORJSONRenderer.options
+
+    def stream(self, rows, fields):
+        lines = []
+        for row in rows:
+            lines.append(orjson.dumps(row, default=self.default, option=self.options))
+            if len(lines) >= self.chunk_rows:
+                yield b'\n'.join(lines) + b'\n'
+                lines = []
+        if lines:
+            yield b'\n'.join(lines) + b'\n'
+
+
+class StreamingJSONRenderer(StreamingRenderer):
+    """
+    A single JSON array, written out element by element
+    """
+    media_type = 'application/json'
+    format = 'json'
+    options = ORJSONRenderer.options
+
+    def stream(self, rows, fields):
+        yield b'['
+        items = []
+        separator = b''
+        for row in rows:
+            items.append(orjson.dumps(row, default=self.default, option=self.options))
+            if len(items) >= self.chunk_rows:
+                yield separator + b','.join(items)
+                items, separator = [], b','
+        if items:
+            yield separator + b','.join(items)
+        yield b']'
+
+
+class _LineBuffer:
+    """
+    File-like object for csv.writer that keeps what was written
+    """
+    def __init__(self):
+        self.lines = []
+
+    def write(self, value):
+        self.lines.append(value)
+
+    def flush(self):
+        chunk = ''.join(self.lines).encode('utf-8')
+        self.lines = []
+        return chunk
+
+
+class CSVRenderer(StreamingRenderer):
+    """
+    Header row with the field names, then one line per row
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, rows, fields):
+        buffer = _LineBuffer()
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+
+        for count, row in enumerate(rows, start=1):
+            writer.writerow([self.format_value(row.get(field)) for field in fields])
+            if count % self.chunk_rows == 0:
+                yield buffer.flush()
+        yield buffer.flush()
+
+    @staticmethod
+    def format_value(value):
+        if value is None:
+            return ''
+        if isinstance(value, datetime.datetime):
+            # Same "Z" timestamps as the JSON API
+            return orjson.dumps(value, option=orjson.OPT_UTC_Z).decode()[1:-1]
+        if isinstance(value, (dict, list)):
+            return orjson.dumps(value, default=encode_default).decode()
+        return value
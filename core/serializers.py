@@ -0,0 +1,134 @@
+# core/serializers.py
+
+from rest_framework import exceptions, serializers
+
+
+def parse_field_paths(value):
+    """
+    "id,airplane.airline,airplane.name" -> {'id': {}, 'airplane': {'airline': {}, 'name': {}}}
+    None when the parameter is not given
+    """
+    if value is None:
+        return None
+
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for part in path.strip().split('.'):
+            if part:
+                node = node.setdefault(part, {})
+    return tree
+
+
+def get_sparse_params(request):
+    """
+    (fields, expand) trees from ?fields= and ?expand=, only for reads
+    """
+    if request is None or request.method != 'GET':
+        return None, None
+    params = request.query_params
+    return parse_field_paths(params.get('fields')), parse_field_paths(params.get('expand'))
+
+
+def nested_serializer(field):
+    """
+    Serializer behind a nested field (the child of many=True), else None
+    """
+    if isinstance(field, serializers.ListSerializer):
+        return field.child
+    if isinstance(field, serializers.BaseSerializer):
+        return field
+    return None
+
+
+class SparseFieldsMixin:
+    """
+    ?fields=id,airplane.name keeps only the listed fields (dots go into
+    nested serializers). ?expand=airplane,airplane.airline keeps only the
+    listed relations nested, every other relation is returned as its id.
+    Without the parameters the output is unchanged, unknown names are a 400.
+    """
+    # (fields, expand) set by the parent serializer for nested ones
+    sparse_trees = None
+
+    def get_sparse_trees(self):
+        if self.sparse_trees is not None:
+            return self.sparse_trees
+
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if parent is not None:
+            # Nested in a serializer without the mixin: full output
+            return None, None
+        return get_sparse_params(self.context.get('request'))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        only, expand = self.get_sparse_trees()
+
+        if only:
+            unknown = sorted(set(only) - set(fields))
+            if unknown:
+                raise exceptions.ValidationError(
+                    {'fields': [f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(fields)}."]}
+                )
+            fields = {name: field for name, field in fields.items() if name in only}
+
+        for name, field in list(fields.items()):
+            nested = nested_serializer(field)
+            if nested is None:
+                continue
+
+            source = field.source or name
+            if expand is not None and name not in expand and source != '*':
+                fields[name] = serializers.PrimaryKeyRelatedField(
+                    read_only=True,
+                    many=nested is not field,
+                    **({'source': source} if source != name else {}),
+                )
+                continue
+
+            if isinstance(nested, SparseFieldsMixin):
+                nested.sparse_trees = (
+                    (only or {}).get(name) or None,
+                    expand.get(name, {}) if expand is not None else None,
+                )
+
+        return fields
+
+
+def _source_paths(prefix, source_attrs):
+    """
+    Every relation prefix of a dotted source: 'flight.airplane.name' -> flight, flight__airplane
+    """
+    return {
+        prefix + '__'.join(source_attrs[:end])
+        for end in range(1, len(source_attrs))
+    }
+
+
+def get_relation_paths(serializer, prefix=''):
+    """
+    ORM paths ('airplane__airline') of every relation that will be
+    rendered, used to trim select_related/prefetch_related
+    """
+    paths = set()
+    for field in serializer.fields.values():
+        if field.source == '*':
+            continue
+        paths |= _source_paths(prefix, field.source_attrs)
+
+        nested = nested_serializer(field)
+        if nested is not None:
+            path = prefix + '__'.join(field.source_attrs)
+            paths.add(path)
+            paths |= get_relation_paths(nested, path + '__')
+
+        # str(), slug etc. read the related object, a bare pk does not
+        elif isinstance(field, serializers.ManyRelatedField) or (
+            isinstance(field, serializers.RelatedField)
+            and not isinstance(field, serializers.PrimaryKeyRelatedField)
+        ):
+            paths.add(prefix + '__'.join(field.source_attrs))
+    return paths
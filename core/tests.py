@@ -1,3 +1,53 @@
-from django.test import TestCase
+import datetime
+import decimal
+import io
+import uuid
 
-# Create your tests here.
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+
+from .renderers import MessagePackParser, MessagePackRenderer, ORJSONRenderer
+
+
+DATA = {
+    "id": 1,
+    "name": "Київ",
+    "price": decimal.Decimal("100.50"),
+    "paid": True,
+    "seat": None,
+    "ratio": 0.25,
+    "departure_time": datetime.datetime(2026, 11, 1, 10, 0, tzinfo=datetime.timezone.utc),
+    "created_at": datetime.datetime(2026, 11, 1, 10, 0, 0, 123456, tzinfo=datetime.timezone.utc),
+    "date": datetime.date(2026, 11, 1),
+    "token": uuid.UUID(int=5),
+    "status": gettext_lazy("Scheduled"),
+    "results": [{"seats": [1, 2]}, "last"],
+}
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    def test_same_bytes_as_drf(self):
+        self.assertEqual(ORJSONRenderer().render(DATA), JSONRenderer().render(DATA))
+
+    def test_same_bytes_as_drf_with_indent(self):
+        media_type = "application/json; indent=2"
+
+        self.assertEqual(
+            ORJSONRenderer().render(DATA, media_type), JSONRenderer().render(DATA, media_type)
+        )
+
+    def test_empty_body(self):
+        self.assertEqual(ORJSONRenderer().render(None), b"")
+
+
+class MessagePackRendererTests(SimpleTestCase):
+    def test_round_trip(self):
+        body = MessagePackRenderer().render(DATA)
+
+        data = MessagePackParser().parse(io.BytesIO(body))
+
+        self.assertEqual(data["name"], "Київ")
+        self.assertEqual(data["price"], 100.5)
+        self.assertEqual(data["departure_time"], "2026-11-01T10:00:00Z")
+        self.assertEqual(data["results"], [{"seats": [1, 2]}, "last"])
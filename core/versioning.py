@@ -0,0 +1,36 @@
+# core/versioning.py
+
+import math
+import time
+
+from django.core.cache import cache
+
+
+MODEL_VERSION_CACHE_KEY = "model-version:{label}"
+
+
+def get_model_version(model):
+    """
+    Current version of the model data: whole-second timestamp of the last
+    write, also sent as Last-Modified. If the cache lost it, a new version
+    starts now.
+    """
+    key = MODEL_VERSION_CACHE_KEY.format(label=model._meta.label_lower)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, math.ceil(time.time()), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_model_version(model):
+    """
+    Every bump moves the version at least one second forward, so a second
+    write within the same second still changes Last-Modified
+    """
+    key = MODEL_VERSION_CACHE_KEY.format(label=model._meta.label_lower)
+    version = math.ceil(time.time())
+    previous = cache.get(key)
+    if previous is not None:
+        version = max(version, math.floor(previous) + 1)
+    cache.set(key, version, None)